@@ -0,0 +1,73 @@
+"""
+Time for the file watcher to follow a bulk move of notebooks under a watched directory
+
+    pytest benchmarks/bench_file_watcher.py -s
+"""
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from jupyter_kernel_executor.file_watcher import FileWatcher
+from jupyter_kernel_executor.fileid import FileIDWrapper
+from jupyter_kernel_executor.locks import KeyedLock
+
+FILES = 10000
+
+
+async def test_bulk_move(jp_serverapp, jp_root_dir, is_file_id_manager):
+    if not is_file_id_manager:
+        return pytest.skip('no file id manager, nothing to follow')
+    file_id_manager = jp_serverapp.web_app.settings['file_id_manager']
+    watcher: FileWatcher = jp_serverapp.web_app.settings['kernel_executor_file_watcher']
+    watcher.file_id_manager = FileIDWrapper(file_id_manager, KeyedLock())
+    root = Path(jp_root_dir) / 'bulk'
+    root.mkdir()
+    for i in range(FILES):
+        (root / f'{i}.ipynb').write_text('{}')
+        file_id_manager.index(f'bulk/{i}.ipynb', commit=False)
+    file_id_manager.con.commit()
+
+    handling = []
+    handle_changes = watcher.handle_changes
+
+    def timed_handle_changes(changes):
+        start = time.perf_counter()
+        handle_changes(changes)
+        handling.append((len(changes), time.perf_counter() - start))
+
+    watcher.handle_changes = timed_handle_changes
+    watcher.watch(str(root / '0.ipynb'))
+    # let the watcher start
+    await asyncio.sleep(1)
+
+    start = time.perf_counter()
+    for i in range(FILES):
+        os.rename(root / f'{i}.ipynb', root / f'moved-{i}.ipynb')
+    renamed = time.perf_counter() - start
+
+    moved = 0
+    while time.perf_counter() - start < 120:
+        await asyncio.sleep(0.5)
+        moved = file_id_manager.con.execute(
+            "SELECT COUNT(*) FROM Files WHERE path GLOB ?", (str(root / 'moved-*'),)
+        ).fetchone()[0]
+        if moved == FILES:
+            break
+    followed = time.perf_counter() - start
+    watcher.unwatch(str(root / '0.ipynb'))
+
+    print(json.dumps({
+        "benchmark": "file_watcher_bulk_move",
+        "files": FILES,
+        "moved": moved,
+        "rename_s": renamed,
+        "followed_s": followed,
+        "batches": len(handling),
+        "events": sum(events for events, _ in handling),
+        "handle_s": sum(seconds for _, seconds in handling),
+    }))
+    assert moved == FILES
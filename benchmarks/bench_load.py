@@ -0,0 +1,232 @@
+"""
+Load scenarios against in-process echo kernels(see echo_kernel.py), so the extension's own overhead is measured
+
+    pytest benchmarks/bench_load.py -s
+
+Every scenario prints one JSON line with p50/p99 latency, requests per second and peak RSS of the process(server and
+kernels), set BENCHMARK_OUTPUT to a file to append them there too, e.g. to compare two commits:
+
+    BENCHMARK_OUTPUT=before.jsonl pytest benchmarks/bench_load.py
+"""
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import time
+from pathlib import Path
+
+import nbformat
+import pytest
+
+# a few kernels, as executions of one kernel run one at a time
+KERNELS = 8
+CONCURRENT_REQUESTS = 2000
+CONCURRENCY = 64
+LARGE_NOTEBOOK_CELLS = 1000
+NOTEBOOKS = 50
+NOTEBOOK_CELLS = 20
+CHURN_FILES = 2000
+CHURN_ROUNDS = 5
+
+
+@pytest.fixture
+def jp_server_config(jp_server_config):
+    return {
+        **jp_server_config,
+        "MappingKernelManager": {
+            "kernel_manager_class": "echo_kernel.EchoKernelManager",
+        },
+        # the load is the point, don't refuse it
+        "KernelScheduler": {
+            "max_queue_depth": 0,
+        },
+    }
+
+
+def peak_rss_mb():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=Path(__file__).parent,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def report(benchmark, latencies, elapsed, **extra):
+    latencies = sorted(latencies)
+    record = {
+        "benchmark": benchmark,
+        "commit": commit(),
+        **extra,
+        "requests": len(latencies),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000,
+        "rps": len(latencies) / elapsed,
+        "elapsed_s": elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    line = json.dumps(record)
+    print(line)
+    if os.environ.get('BENCHMARK_OUTPUT'):
+        with open(os.environ['BENCHMARK_OUTPUT'], 'a') as f:
+            f.write(line + '\n')
+    return record
+
+
+async def start_kernels(jp_fetch, count):
+    kernel_ids = []
+    for _ in range(count):
+        response = await jp_fetch('api', 'kernels', method='POST', body=json.dumps({'name': 'python3'}))
+        kernel_ids.append(json.loads(response.body)['id'])
+    # connect before timing
+    await asyncio.gather(*(execute(jp_fetch, kernel_id, {'code': 'warm up'}) for kernel_id in kernel_ids))
+    return kernel_ids
+
+
+async def execute(jp_fetch, kernel_id, body):
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps(body))
+    return json.loads(response.body)
+
+
+async def run_load(bodies, concurrency, send):
+    """send every (kernel_id, body) with at most concurrency requests in flight, return latencies and elapsed time"""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(kernel_id, body):
+        async with semaphore:
+            start = time.perf_counter()
+            await send(kernel_id, body)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(kernel_id, body) for kernel_id, body in bodies))
+    return latencies, time.perf_counter() - start
+
+
+def write_notebook(filepath, cells):
+    nb = nbformat.v4.new_notebook()
+    nb['cells'] = [nbformat.v4.new_code_cell(f'cell {i}') for i in range(cells)]
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    with open(filepath, 'w') as f:
+        nbformat.write(nb, f)
+    return [cell['id'] for cell in nb['cells']]
+
+
+def read_outputs(filepath):
+    """outputs of every cell, None while the server is rewriting the file"""
+    try:
+        with open(filepath) as f:
+            return [cell['outputs'] for cell in nbformat.read(f, as_version=nbformat.NO_CONVERT)['cells']]
+    except ValueError:
+        return None
+
+
+def all_written(filepath):
+    outputs = read_outputs(filepath)
+    return outputs is not None and all(outputs)
+
+
+@pytest.mark.parametrize('backend', ('websocket', 'zmq'))
+async def test_concurrent_code(jp_fetch, jp_serverapp, backend):
+    jp_serverapp.web_app.settings['kernel_executor_connection_pool'].backend = backend
+    kernel_ids = await start_kernels(jp_fetch, KERNELS)
+    bodies = [(kernel_ids[i % KERNELS], {'code': f'{i}'}) for i in range(CONCURRENT_REQUESTS)]
+
+    async def send(kernel_id, body):
+        result = await execute(jp_fetch, kernel_id, body)
+        assert result['outputs'][0]['text'] == body['code'] + '\n'
+
+    latencies, elapsed = await run_load(bodies, CONCURRENCY, send)
+    report(
+        'concurrent_code', latencies, elapsed, backend=backend, kernels=KERNELS, concurrency=CONCURRENCY,
+    )
+
+
+async def test_large_notebook(jp_fetch, jp_root_dir):
+    filepath = Path(jp_root_dir) / 'large.ipynb'
+    cell_ids = write_notebook(filepath, LARGE_NOTEBOOK_CELLS)
+    kernel_id, = await start_kernels(jp_fetch, 1)
+    bodies = [(kernel_id, {'path': 'large.ipynb', 'cell_id': cell_id}) for cell_id in cell_ids]
+
+    start = time.perf_counter()
+    # responded once queued, results are written behind
+    latencies, _ = await run_load(bodies, CONCURRENCY, lambda kernel_id, body: execute(jp_fetch, kernel_id, body))
+    while not all_written(filepath):
+        await asyncio.sleep(0.1)
+        assert time.perf_counter() - start < 300, 'outputs not written'
+    report('large_notebook', latencies, time.perf_counter() - start, cells=LARGE_NOTEBOOK_CELLS)
+
+
+async def test_many_notebooks(jp_fetch, jp_root_dir):
+    notebooks = {
+        f'many/{i}.ipynb': write_notebook(Path(jp_root_dir) / 'many' / f'{i}.ipynb', NOTEBOOK_CELLS)
+        for i in range(NOTEBOOKS)
+    }
+    kernel_ids = await start_kernels(jp_fetch, KERNELS)
+    bodies = [
+        (kernel_ids[i % KERNELS], {'path': path, 'cell_id': cell_id, 'block': True})
+        for i, (path, cell_ids) in enumerate(notebooks.items()) for cell_id in cell_ids
+    ]
+
+    latencies, elapsed = await run_load(bodies, CONCURRENCY, lambda kernel_id, body: execute(jp_fetch, kernel_id, body))
+    report(
+        'many_notebooks', latencies, elapsed, notebooks=NOTEBOOKS, cells=NOTEBOOK_CELLS, kernels=KERNELS,
+        concurrency=CONCURRENCY,
+    )
+    for path in notebooks:
+        assert all_written(Path(jp_root_dir) / path)
+
+
+async def test_file_watcher_churn(jp_fetch, jp_serverapp, jp_root_dir):
+    """executions of a notebook while files around it are created, modified, moved and deleted in bulk"""
+    watcher = jp_serverapp.web_app.settings['kernel_executor_file_watcher']
+    handling = []
+    handle_changes = watcher.handle_changes
+
+    def timed_handle_changes(changes):
+        start = time.perf_counter()
+        handle_changes(changes)
+        handling.append((len(changes), time.perf_counter() - start))
+
+    watcher.handle_changes = timed_handle_changes
+    root = Path(jp_root_dir) / 'churn'
+    cell_ids = write_notebook(root / 'executed.ipynb', NOTEBOOK_CELLS)
+    kernel_id, = await start_kernels(jp_fetch, 1)
+    # watched throughout, not only while a cell executes
+    watcher.watch(str(root / 'executed.ipynb'))
+    await asyncio.sleep(1)
+
+    def churn():
+        # in a thread, as another process would
+        for _ in range(CHURN_ROUNDS):
+            for i in range(CHURN_FILES):
+                (root / f'{i}.ipynb').write_text('{}')
+            for i in range(CHURN_FILES):
+                os.rename(root / f'{i}.ipynb', root / f'moved-{i}.ipynb')
+            for i in range(CHURN_FILES):
+                os.remove(root / f'moved-{i}.ipynb')
+
+    bodies = [
+        (kernel_id, {'path': 'churn/executed.ipynb', 'cell_id': cell_ids[i % NOTEBOOK_CELLS], 'block': True})
+        for i in range(NOTEBOOK_CELLS * CHURN_ROUNDS)
+    ]
+    churning = asyncio.ensure_future(asyncio.to_thread(churn))
+    latencies, elapsed = await run_load(bodies, 1, lambda kernel_id, body: execute(jp_fetch, kernel_id, body))
+    await churning
+    # let the watcher see the last changes
+    await asyncio.sleep(1)
+    watcher.unwatch(str(root / 'executed.ipynb'))
+    batches = sorted(seconds for _, seconds in handling)
+    report(
+        'file_watcher_churn', latencies, elapsed, files=CHURN_FILES, rounds=CHURN_ROUNDS,
+        batches=len(batches), events=sum(events for events, _ in handling),
+        handle_p50_ms=batches[len(batches) // 2] * 1000 if batches else None,
+        handle_p99_ms=batches[max(int(len(batches) * 0.99) - 1, 0)] * 1000 if batches else None,
+    )
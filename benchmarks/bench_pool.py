@@ -0,0 +1,50 @@
+"""
+Compare execute request latency with and without the kernel connection pool, and over the zmq backend
+
+    pytest benchmarks/bench_pool.py -s
+"""
+import json
+import statistics
+import time
+
+import pytest
+
+REQUESTS = 100
+
+
+async def measure(jp_fetch, kernel_id, requests):
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+            "code": f"{i}"
+        }))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summary(latencies):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+@pytest.mark.parametrize('backend', ('websocket', 'zmq'))
+@pytest.mark.parametrize('pooled', (False, True), ids=('unpooled', 'pooled'))
+async def test_execute_latency(jp_fetch, jp_serverapp, pooled, backend):
+    connection_pool = jp_serverapp.web_app.settings['kernel_executor_connection_pool']
+    connection_pool.enabled = pooled
+    connection_pool.backend = backend
+    kernel_response = await jp_fetch('api', 'kernels', method='POST', body=json.dumps({
+        'name': 'python3',
+    }))
+    kernel_id = json.loads(kernel_response.body)['id']
+    # warm up kernel
+    await measure(jp_fetch, kernel_id, 5)
+
+    result = summary(await measure(jp_fetch, kernel_id, REQUESTS))
+    print(json.dumps({"benchmark": "execute_latency", "pooled": pooled, "backend": backend, **result}))
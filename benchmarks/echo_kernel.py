@@ -0,0 +1,182 @@
+"""
+A stand-in kernel running in the server's process, so kernel time doesn't dominate benchmarks
+
+It speaks the kernel messaging protocol over ZMQ like any kernel, whatever the server talks to it through
+(its websocket or the zmq backend), and answers execute requests right away by echoing the code to stdout.
+Use it in place of every kernel with
+
+    c.MappingKernelManager.kernel_manager_class = "echo_kernel.EchoKernelManager"
+"""
+import asyncio
+import signal
+import uuid
+from typing import Any, Dict, List, Optional
+
+import zmq
+import zmq.asyncio
+from jupyter_client.provisioning import KernelProvisionerBase
+from jupyter_client.session import Session
+from jupyter_server.services.kernels.kernelmanager import ServerKernelManager
+
+PROTOCOL_VERSION = '5.3'
+
+
+class EchoKernel:
+    def __init__(self, session: Session, ip='127.0.0.1', transport='tcp'):
+        self.session = session
+        self.url = f'{transport}://{ip}'
+        self.context = zmq.asyncio.Context()
+        self.sockets: Dict[str, zmq.asyncio.Socket] = dict()
+        self.tasks: List[asyncio.Task] = []
+        self.execution_count = 0
+        self.stopped = asyncio.Event()
+
+    def start(self) -> Dict[str, int]:
+        """bind the kernel's channels on random ports and serve them, return the ports"""
+        ports = dict()
+        for channel, socket_type in (
+                ('shell', zmq.ROUTER), ('control', zmq.ROUTER), ('stdin', zmq.ROUTER),
+                ('iopub', zmq.PUB), ('hb', zmq.REP),
+        ):
+            socket = self.context.socket(socket_type)
+            socket.linger = 0
+            ports[f'{channel}_port'] = socket.bind_to_random_port(self.url)
+            self.sockets[channel] = socket
+        self.tasks = [
+            asyncio.ensure_future(self.serve(self.sockets['shell'])),
+            asyncio.ensure_future(self.serve(self.sockets['control'])),
+            asyncio.ensure_future(self.heartbeat()),
+        ]
+        return ports
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.context.destroy(linger=0)
+        self.stopped.set()
+
+    async def heartbeat(self):
+        socket = self.sockets['hb']
+        while True:
+            await socket.send_multipart(await socket.recv_multipart())
+
+    async def serve(self, socket):
+        while True:
+            frames = await socket.recv_multipart()
+            idents, msg_list = self.session.feed_identities(frames)
+            try:
+                msg = self.session.deserialize(msg_list)
+            except ValueError:
+                continue
+            self.handle(socket, idents, msg)
+
+    def publish(self, msg_type, content, parent):
+        self.session.send(self.sockets['iopub'], msg_type, content, parent=parent)
+
+    def reply(self, socket, idents, msg_type, content, parent):
+        self.session.send(socket, msg_type, content, parent=parent, ident=idents)
+
+    def handle(self, socket, idents, msg):
+        msg_type = msg['header']['msg_type']
+        self.publish('status', {'execution_state': 'busy'}, msg)
+        if msg_type == 'execute_request':
+            self.execute(socket, idents, msg)
+        elif msg_type == 'kernel_info_request':
+            self.reply(socket, idents, 'kernel_info_reply', {
+                'status': 'ok',
+                'protocol_version': PROTOCOL_VERSION,
+                'implementation': 'echo',
+                'implementation_version': '0.1',
+                'language_info': {'name': 'text', 'mimetype': 'text/plain', 'file_extension': '.txt'},
+                'banner': 'echo kernel',
+                'help_links': [],
+            }, msg)
+        elif msg_type == 'comm_info_request':
+            self.reply(socket, idents, 'comm_info_reply', {'status': 'ok', 'comms': {}}, msg)
+        elif msg_type == 'interrupt_request':
+            self.reply(socket, idents, 'interrupt_reply', {'status': 'ok'}, msg)
+        elif msg_type == 'shutdown_request':
+            self.reply(socket, idents, 'shutdown_reply', {'status': 'ok', **msg['content']}, msg)
+        self.publish('status', {'execution_state': 'idle'}, msg)
+        if msg_type == 'shutdown_request':
+            asyncio.get_running_loop().call_soon(self.stop)
+
+    def execute(self, socket, idents, msg):
+        code = msg['content']['code']
+        silent = msg['content'].get('silent', False)
+        if not silent:
+            self.execution_count += 1
+            self.publish('execute_input', {'code': code, 'execution_count': self.execution_count}, msg)
+            if code:
+                self.publish('stream', {'name': 'stdout', 'text': code + '\n'}, msg)
+        self.reply(socket, idents, 'execute_reply', {
+            'status': 'ok',
+            'execution_count': self.execution_count,
+            'user_expressions': {},
+            'payload': [],
+        }, msg)
+
+
+class EchoProvisioner(KernelProvisionerBase):
+    """starts an EchoKernel in this process instead of launching the kernelspec's command"""
+
+    kernel: Optional[EchoKernel] = None
+
+    @property
+    def has_process(self) -> bool:
+        return self.kernel is not None
+
+    async def pre_launch(self, **kwargs: Any) -> Dict[str, Any]:
+        return await super().pre_launch(cmd=[], **kwargs)
+
+    async def launch_kernel(self, cmd: List[str], **kwargs: Any):
+        km = self.parent
+        self.kernel = EchoKernel(
+            Session(key=km.session.key, signature_scheme=km.session.signature_scheme, username='kernel'),
+            ip=km.ip, transport=km.transport,
+        )
+        self.connection_info = {
+            **self.kernel.start(),
+            'ip': km.ip,
+            'transport': km.transport,
+            'key': km.session.key,
+            'signature_scheme': km.session.signature_scheme,
+            'kernel_name': km.kernel_name,
+        }
+        return self.connection_info
+
+    async def poll(self) -> Optional[int]:
+        if self.kernel is None or self.kernel.stopped.is_set():
+            return 0
+        return None
+
+    async def wait(self) -> Optional[int]:
+        if self.kernel is not None:
+            await self.kernel.stopped.wait()
+        return 0
+
+    async def send_signal(self, signum: int) -> None:
+        # executions are over before any signal, only termination matters
+        if signum != signal.SIGINT:
+            await self.kill()
+
+    async def kill(self, restart: bool = False) -> None:
+        if self.kernel is not None and not self.kernel.stopped.is_set():
+            self.kernel.stop()
+
+    async def terminate(self, restart: bool = False) -> None:
+        await self.kill(restart)
+
+    async def cleanup(self, restart: bool = False) -> None:
+        if restart:
+            self.kernel = None
+
+
+class EchoKernelManager(ServerKernelManager):
+    """every kernel, whatever its kernelspec, is an EchoKernel"""
+
+    async def _async_pre_start_kernel(self, **kw):
+        self.kernel_id = self.kernel_id or kw.pop('kernel_id', str(uuid.uuid4()))
+        if self.provisioner is None:
+            self.provisioner = EchoProvisioner(kernel_id=self.kernel_id, kernel_spec=self.kernel_spec, parent=self)
+        return await super()._async_pre_start_kernel(**kw)
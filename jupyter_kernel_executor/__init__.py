@@ -1,4 +1,5 @@
 from ._version import __version__
+from .app import KernelExecutorApp
 from .handlers import setup_handlers
 
 
@@ -13,23 +14,10 @@ def _jupyter_labextension_paths():
 
 def _jupyter_server_extension_points():
     return [{
-        "module": "jupyter_kernel_executor"
+        "module": "jupyter_kernel_executor",
+        "app": KernelExecutorApp,
     }]
 
 
-def _load_jupyter_server_extension(server_app):
-    """Registers the API handler to receive HTTP requests from the frontend extension.
-
-    Parameters
-    ----------
-    server_app: jupyterlab.labapp.LabApp
-        JupyterLab application instance
-    """
-    setup_handlers(server_app.web_app)
-    name = "jupyter_kernel_executor"
-    server_app.log.info(f"Registered {name} server extension")
-
-
 # For backward compatibility with notebook server - useful for Binder/JupyterHub
-load_jupyter_server_extension = _load_jupyter_server_extension
-
+load_jupyter_server_extension = KernelExecutorApp.load_classic_server_extension
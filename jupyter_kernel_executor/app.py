@@ -0,0 +1,113 @@
+import asyncio
+
+from jupyter_server.extension.application import ExtensionApp
+from traitlets import Float
+
+from jupyter_kernel_executor import metrics
+from jupyter_kernel_executor.blobs import BlobStore
+from jupyter_kernel_executor.events import ExecutionEvents
+from jupyter_kernel_executor.file_watcher import FileWatcher
+from jupyter_kernel_executor.fileid import FileIDWrapper, FileIdCache
+from jupyter_kernel_executor.handlers import setup_handlers
+from jupyter_kernel_executor.history import ExecutionHistory
+from jupyter_kernel_executor.journal import ExecutionJournal
+from jupyter_kernel_executor.locks import KeyedLock
+from jupyter_kernel_executor.notebook_cache import NotebookCache
+from jupyter_kernel_executor.outputs import OutputLimits
+from jupyter_kernel_executor.pool import KernelConnectionPool
+from jupyter_kernel_executor.registry import ExecutionRegistry
+from jupyter_kernel_executor.result_cache import ResultCache
+from jupyter_kernel_executor.runs import RunRegistry, utcnow
+from jupyter_kernel_executor.scheduler import KernelScheduler
+from jupyter_kernel_executor.warm_pool import WarmKernelPool
+from jupyter_kernel_executor.writer import WriteBehindBuffer, save_results
+
+
+class KernelExecutorApp(ExtensionApp):
+    name = "jupyter_kernel_executor"
+
+    execution_timeout = Float(
+        0, config=True,
+        help="Seconds an execution may run before its kernel is interrupted, "
+             "unless the request sets its own timeout. 0 for no limit"
+    )
+
+    def initialize_settings(self):
+        self.connection_pool = KernelConnectionPool(
+            parent=self,
+            log=self.log,
+            kernel_manager=self.serverapp.kernel_manager,
+        )
+        self.write_buffer = WriteBehindBuffer(parent=self, log=self.log)
+        self.file_watcher = FileWatcher(parent=self, log=self.log)
+        document_locks = KeyedLock()
+        self.journal = ExecutionJournal(parent=self, log=self.log, root_dir=self.serverapp.root_dir)
+        self.history = ExecutionHistory(parent=self, log=self.log)
+        self.output_limits = OutputLimits(parent=self, log=self.log)
+        self.warm_pool = WarmKernelPool(
+            parent=self,
+            log=self.log,
+            kernel_manager=self.serverapp.kernel_manager,
+        )
+        self.settings.update({
+            "kernel_executor_connection_pool": self.connection_pool,
+            "kernel_executor_document_locks": document_locks,
+            "kernel_executor_write_buffer": self.write_buffer,
+            "kernel_executor_file_watcher": self.file_watcher,
+            "kernel_executor_file_id_cache": FileIdCache(parent=self, log=self.log),
+            "kernel_executor_notebook_cache": NotebookCache(parent=self, log=self.log),
+            "kernel_executor_runs": RunRegistry(parent=self, log=self.log, journal=self.journal),
+            "kernel_executor_journal": self.journal,
+            "kernel_executor_history": self.history,
+            "kernel_executor_events": ExecutionEvents(self.log),
+            "kernel_executor_execution_timeout": self.execution_timeout,
+            "kernel_executor_executions": ExecutionRegistry(),
+            "kernel_executor_scheduler": KernelScheduler(parent=self, log=self.log),
+            "kernel_executor_output_limits": self.output_limits,
+            "kernel_executor_blob_store": BlobStore(parent=self, log=self.log),
+            "kernel_executor_result_cache": ResultCache(parent=self, log=self.log),
+            "kernel_executor_warm_pool": self.warm_pool,
+        })
+        self.serverapp.io_loop.add_callback(self.warm_pool.start)
+        self.serverapp.io_loop.add_callback(self.output_limits.start_pruner)
+        self.serverapp.io_loop.add_callback(self.replay_journal)
+        metrics.LOCK_WAITERS.set_function(lambda: document_locks.waiting)
+        metrics.register()
+
+    async def replay_journal(self):
+        """save results the previous server left unsaved, once every extension, e.g. file ids, is loaded"""
+        self.journal.interrupt_runs(utcnow())
+        self.journal.prune_runs()
+        settings = self.serverapp.web_app.settings
+        file_id_manager = FileIDWrapper(
+            settings.get("file_id_manager"), settings["kernel_executor_document_locks"],
+            settings["kernel_executor_file_id_cache"],
+        )
+
+        async def save(document_id, path, updates):
+            # follow the notebook if it moved meanwhile
+            current_path = await file_id_manager.get_path(document_id)
+            if current_path != document_id:
+                path = current_path
+            async with settings["kernel_executor_document_locks"](document_id):
+                await save_results(
+                    self.serverapp.contents_manager, path, updates, settings["kernel_executor_blob_store"],
+                    self.write_buffer.patch_local,
+                )
+            settings["kernel_executor_notebook_cache"].invalidate(document_id)
+
+        await self.journal.replay(save)
+
+    def initialize_handlers(self):
+        setup_handlers(self.serverapp.web_app)
+
+    async def stop_extension(self):
+        self.file_watcher.cancel()
+        self.output_limits.close()
+        await self.warm_pool.close()
+        await self.write_buffer.close()
+        await self.connection_pool.close()
+        # let saves just done drop their entries
+        await asyncio.sleep(0)
+        self.journal.close()
+        await self.history.close()
@@ -0,0 +1,203 @@
+import base64
+import binascii
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Iterable, List, Set
+
+import nbformat
+from jupyter_core.application import JupyterApp
+from jupyter_core.paths import jupyter_data_dir
+from traitlets import Bool, Float, Integer, List as ListTrait, Unicode, default
+from traitlets.config import LoggingConfigurable
+
+from jupyter_kernel_executor.outputs import MARKER_KEY
+
+
+class BlobStore(LoggingConfigurable):
+    """
+    Content-addressed store of binary outputs on local disk
+
+    When enabled, base64 data of `mime_types` above `min_bytes` is written once per sha256 under `root_dir`,
+    and the output written to the notebook keeps a reference in `metadata.kernel_executor.blobs` instead.
+    """
+
+    enabled = Bool(
+        False, config=True,
+        help="Offload binary outputs to the blob store when writing them to notebooks"
+    )
+    min_bytes = Integer(
+        16 * 1024, config=True,
+        help="Decoded size from which a binary output is offloaded"
+    )
+    mime_types = ListTrait(
+        Unicode(), default_value=['image/png', 'image/jpeg', 'image/gif', 'image/webp', 'application/pdf'],
+        config=True,
+        help="Binary mime types to offload, also the content types blobs may be served as"
+    )
+    root_dir = Unicode(
+        config=True,
+        help="Directory of blobs"
+    )
+
+    @default('root_dir')
+    def _default_root_dir(self):
+        return os.path.join(jupyter_data_dir(), 'kernel_executor', 'blobs')
+
+    def relative_path(self, digest) -> str:
+        return os.path.join(digest[:2], digest[2:])
+
+    def path(self, digest) -> str:
+        return os.path.join(self.root_dir, self.relative_path(digest))
+
+    def put(self, data: bytes) -> str:
+        """store data unless already there, return its sha256"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            # in use again, keep it out of reach of gc grace period
+            os.utime(path)
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return digest
+
+    def offload(self, outputs: List[nbformat.NotebookNode]) -> List[nbformat.NotebookNode]:
+        """outputs with binary data replaced by blob references, outputs are left as they are"""
+        if not self.enabled:
+            return outputs
+        return [self.offload_output(output) for output in outputs]
+
+    def offload_output(self, output: nbformat.NotebookNode) -> nbformat.NotebookNode:
+        data = output.get('data')
+        if not data:
+            return output
+        blobs = dict()
+        for mime in self.mime_types:
+            value = data.get(mime)
+            if value is None:
+                continue
+            try:
+                decoded = base64.b64decode(''.join(value) if isinstance(value, list) else value, validate=True)
+            except (binascii.Error, ValueError):
+                continue
+            if len(decoded) < self.min_bytes:
+                continue
+            blobs[mime] = {'sha256': self.put(decoded), 'bytes': len(decoded)}
+        if not blobs:
+            return output
+
+        offloaded = nbformat.from_dict(json.loads(json.dumps(output)))
+        for mime in blobs:
+            del offloaded['data'][mime]
+        offloaded['metadata'].setdefault(MARKER_KEY, dict())['blobs'] = blobs
+        return offloaded
+
+    def digests(self) -> Iterable[str]:
+        if not os.path.isdir(self.root_dir):
+            return
+        for prefix in os.listdir(self.root_dir):
+            directory = os.path.join(self.root_dir, prefix)
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if not name.startswith('.'):
+                    yield prefix + name
+
+    def collect(self, referenced: Set[str], grace_period=0, dry_run=False) -> List[str]:
+        """remove blobs not referenced and untouched for grace_period seconds, return their digests"""
+        deadline = time.time() - grace_period
+        removed = []
+        for digest in list(self.digests()):
+            if digest in referenced:
+                continue
+            path = self.path(digest)
+            try:
+                if os.stat(path).st_mtime > deadline:
+                    continue
+                if not dry_run:
+                    os.unlink(path)
+            except FileNotFoundError:
+                continue
+            removed.append(digest)
+        return removed
+
+
+def referenced_blobs(notebook) -> Set[str]:
+    digests = set()
+    for cell in notebook.get('cells', []):
+        for output in cell.get('outputs', []):
+            blobs = output.get('metadata', dict()).get(MARKER_KEY, dict()).get('blobs', dict())
+            digests.update(blob['sha256'] for blob in blobs.values())
+    return digests
+
+
+class BlobGCApp(JupyterApp):
+    """remove blobs no notebook under root_dir refers to"""
+
+    name = 'jupyter-kernel-executor-gc'
+    description = "Remove blobs of jupyter_kernel_executor no notebook refers to anymore"
+    # share BlobStore config with the server
+    config_file_name = Unicode('jupyter_server_config')
+
+    root_dir = Unicode(
+        config=True,
+        help="Directory of the notebooks referring to blobs, searched recursively. Default to the current directory"
+    )
+    grace_period = Float(
+        3600, config=True,
+        help="Seconds a blob is kept after it was last written, so notebooks being saved don't lose theirs"
+    )
+    dry_run = Bool(
+        False, config=True,
+        help="Only print the blobs to remove"
+    )
+
+    aliases = {
+        **JupyterApp.aliases,
+        'root-dir': 'BlobGCApp.root_dir',
+        'blob-dir': 'BlobStore.root_dir',
+        'grace-period': 'BlobGCApp.grace_period',
+    }
+    flags = {
+        **JupyterApp.flags,
+        'dry-run': ({'BlobGCApp': {'dry_run': True}}, "Only print the blobs to remove"),
+    }
+    classes = [BlobStore]
+
+    @default('root_dir')
+    def _default_root_dir(self):
+        return os.getcwd()
+
+    def referenced(self) -> Set[str]:
+        digests = set()
+        for directory, _, files in os.walk(self.root_dir):
+            for name in files:
+                if not name.endswith('.ipynb'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        digests.update(referenced_blobs(json.load(f)))
+                except (OSError, ValueError) as e:
+                    self.log.warning(f'skip {path}: {e}')
+        return digests
+
+    def start(self):
+        store = BlobStore(parent=self, log=self.log)
+        removed = store.collect(self.referenced(), grace_period=self.grace_period, dry_run=self.dry_run)
+        for digest in removed:
+            print(store.path(digest))
+        self.log.info(f"{'would remove' if self.dry_run else 'removed'} {len(removed)} blobs from {store.root_dir}")
+
+
+main = BlobGCApp.launch_instance
@@ -0,0 +1,85 @@
+import json
+from typing import Callable, List, Optional, Tuple
+
+import nbformat
+
+from jupyter_kernel_client.client import KernelWebsocketClient
+from jupyter_kernel_executor.outputs import OutputLimits, OutputCollector
+
+
+class LimitedKernelClient(KernelWebsocketClient):
+    """
+    KernelWebsocketClient keeping outputs within OutputLimits, consecutive stream messages are merged
+
+    Without output_limits, outputs are kept as they arrive.
+    output_listener is called with what is shown of every output, e.g. to journal it.
+    """
+
+    def __init__(self, *args, output_limits: Optional[OutputLimits] = None, keep_outputs=True,
+                 output_listener: Optional[Callable[[nbformat.NotebookNode], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_listener = output_listener
+        self.collector: Optional[OutputCollector] = None
+        if output_limits is not None:
+            self.collector = output_limits.collector(keep=keep_outputs)
+            self.outputs = self.collector.outputs
+        self.keep_outputs = keep_outputs
+
+    def on_iopub(self, msg) -> bool:
+        content = msg.get("content", dict())
+        if content.get("execution_state") == "idle":
+            return True
+        if msg.get("msg_type") in ["execute_result", "stream", "display_data", "error"]:
+            self.on_output(nbformat.v4.output_from_msg(msg))
+        execution_count = content.get("execution_count")
+        if execution_count:
+            self.execution_count = int(execution_count)
+        return False
+
+    def on_output(self, output) -> List[nbformat.NotebookNode]:
+        """keep output, return what to show of it"""
+        if self.collector is not None:
+            shown = self.collector.add(output)
+        else:
+            if self.keep_outputs:
+                self.outputs.append(output)
+            shown = [output]
+        if self.output_listener is not None:
+            for output in shown:
+                self.output_listener(output)
+        return shown
+
+    def output_sizes(self) -> Tuple[int, int]:
+        """bytes of outputs kept and beyond the output limits"""
+        if self.collector is not None:
+            return self.collector.size, self.collector.truncated_bytes
+        return sum(len(json.dumps(output)) for output in self.outputs), 0
+
+    def close_outputs(self):
+        """close files of outputs beyond the output limits"""
+        if self.collector is not None:
+            self.collector.close()
+
+
+class StreamingKernelClient(LimitedKernelClient):
+    """
+    KernelWebsocketClient handing every output over as soon as it arrives
+
+    New outputs are gathered in `new_outputs` until `pop_new_outputs` is called (e.g. by a registered callback).
+    With keep_outputs=False, outputs are not accumulated for get_result, so memory stays flat for chatty cells.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.new_outputs: List[nbformat.NotebookNode] = []
+        self.has_error = False
+
+    def on_output(self, output) -> List[nbformat.NotebookNode]:
+        shown = super().on_output(output)
+        self.new_outputs.extend(shown)
+        self.has_error = self.has_error or output['output_type'] == 'error'
+        return shown
+
+    def pop_new_outputs(self) -> List[nbformat.NotebookNode]:
+        new_outputs, self.new_outputs = self.new_outputs, []
+        return new_outputs
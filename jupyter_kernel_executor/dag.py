@@ -0,0 +1,146 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+
+from jupyter_kernel_executor.outputs import MARKER_KEY
+
+
+class CellGraph:
+    """
+    Dependencies between cells of a notebook, cells in notebook order
+
+    raise ValueError on dependencies of unknown cells or cycles
+    """
+
+    def __init__(self, cell_ids: List[str], dependencies: Dict[str, List[str]]):
+        self.cell_ids = list(cell_ids)
+        self.order = {cell_id: i for i, cell_id in enumerate(self.cell_ids)}
+        self.dependencies: Dict[str, List[str]] = dict()
+        for cell_id in self.cell_ids:
+            depends_on = dependencies.get(cell_id) or []
+            unknown = [dependency for dependency in depends_on if dependency not in self.order]
+            if unknown:
+                raise ValueError(f"cell {cell_id} depends on unknown cell {', '.join(unknown)}")
+            self.dependencies[cell_id] = sorted(set(depends_on), key=self.order.get)
+        self.ancestors: Dict[str, List[str]] = dict()
+        for cell_id in self.cell_ids:
+            self.ancestors_of(cell_id, [])
+
+    def ancestors_of(self, cell_id, visiting: List[str]) -> List[str]:
+        """cells cell_id needs executed before, dependencies first"""
+        if cell_id in self.ancestors:
+            return self.ancestors[cell_id]
+        if cell_id in visiting:
+            cycle = visiting[visiting.index(cell_id):] + [cell_id]
+            raise ValueError(f"dependency cycle {' -> '.join(cycle)}")
+        ancestors: Set[str] = set()
+        for dependency in self.dependencies[cell_id]:
+            ancestors.add(dependency)
+            ancestors.update(self.ancestors_of(dependency, visiting + [cell_id]))
+        self.ancestors[cell_id] = self.topological(ancestors)
+        return self.ancestors[cell_id]
+
+    def topological(self, cell_ids) -> List[str]:
+        """cell_ids with dependencies first, else in notebook order"""
+        remaining = sorted(cell_ids, key=self.order.get)
+        ordered: List[str] = []
+        done: Set[str] = set()
+        while remaining:
+            for cell_id in remaining:
+                if all(dependency in done or dependency not in remaining for dependency in self.dependencies[cell_id]):
+                    break
+            remaining.remove(cell_id)
+            ordered.append(cell_id)
+            done.add(cell_id)
+        return ordered
+
+    def descendants(self, cell_id) -> List[str]:
+        return [other for other in self.cell_ids if cell_id in self.ancestors[other]]
+
+
+def dependencies_from_metadata(cells) -> Dict[str, List[str]]:
+    """`depends_on` of cells' `kernel_executor` metadata"""
+    dependencies = dict()
+    for cell in cells:
+        depends_on = cell.get('metadata', dict()).get(MARKER_KEY, dict()).get('depends_on')
+        if depends_on:
+            dependencies[cell['id']] = list(depends_on)
+    return dependencies
+
+
+# run cell_id on kernel_id after replaying cells it misses,
+# return whether it succeeded and the cells which ran on the kernel: replays up to a failing one, and cell_id if reached
+RunCell = Callable[[str, List[str], str], Awaitable[Tuple[bool, List[str]]]]
+
+
+class DagScheduler:
+    """
+    Run cells of a CellGraph on identical kernels, each once its dependencies succeeded
+
+    A cell goes to the idle kernel which already executed most of its ancestors,
+    ancestors it misses are replayed there first, so branches of the graph stay on a kernel
+    and wall-clock time follows the critical path. A cell joining branches run on other kernels replays them.
+    Descendants of a cell which failed are skipped.
+    """
+
+    def __init__(self, graph: CellGraph, kernel_ids: List[str], run_cell: RunCell):
+        self.graph = graph
+        self.kernel_ids = list(kernel_ids)
+        self.run_cell = run_cell
+        # cells whose state each kernel holds
+        self.executed: Dict[str, Set[str]] = {kernel_id: set() for kernel_id in self.kernel_ids}
+        self.succeeded: Set[str] = set()
+        self.failed: Set[str] = set()
+        self.skipped: Set[str] = set()
+        self.placement: Dict[str, str] = dict()
+
+    def ready(self, started: Set[str]) -> List[str]:
+        cells = [
+            cell_id for cell_id in self.graph.cell_ids if cell_id not in started and all(
+                dependency in self.succeeded for dependency in self.graph.dependencies[cell_id]
+            )
+        ]
+        # cells with most ancestors pick their kernel first
+        return sorted(cells, key=lambda cell_id: (-len(self.graph.ancestors[cell_id]), self.graph.order[cell_id]))
+
+    def pick_kernel(self, cell_id, idle: List[str]) -> str:
+        ancestors = self.graph.ancestors[cell_id]
+        return max(idle, key=lambda kernel_id: sum(ancestor in self.executed[kernel_id] for ancestor in ancestors))
+
+    async def run(self):
+        idle = list(self.kernel_ids)
+        running: Dict[asyncio.Future, tuple] = dict()
+        started: Set[str] = set()
+        while True:
+            for cell_id in self.ready(started):
+                if not idle:
+                    break
+                kernel_id = self.pick_kernel(cell_id, idle)
+                idle.remove(kernel_id)
+                started.add(cell_id)
+                self.placement[cell_id] = kernel_id
+                replay = [
+                    ancestor for ancestor in self.graph.ancestors[cell_id] if ancestor not in self.executed[kernel_id]
+                ]
+                task = asyncio.ensure_future(self.run_cell(kernel_id, replay, cell_id))
+                running[task] = (kernel_id, cell_id)
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                kernel_id, cell_id = running.pop(task)
+                idle.append(kernel_id)
+                succeeded = False
+                if task.exception() is None:
+                    succeeded, executed = task.result()
+                    # cells after a failing replay never ran, replayed again when needed there
+                    self.executed[kernel_id].update(executed)
+                if succeeded:
+                    self.succeeded.add(cell_id)
+                else:
+                    self.failed.add(cell_id)
+                    for descendant in self.graph.descendants(cell_id):
+                        if descendant not in started:
+                            started.add(descendant)
+                            self.skipped.add(descendant)
+        return self.succeeded, self.failed, self.skipped
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Dict, List, Set, Tuple
+
+
+class ExecutionEvents:
+    """
+    Start/finish notification of tracked executions
+
+    Subscribers get every event through their own queue,
+    waiters get a future resolved when a given cell of a document finishes on a kernel.
+    """
+
+    queue_size = 1000
+
+    def __init__(self, log):
+        self.log = log
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.waiters: Dict[Tuple[str, str, str], List[asyncio.Future]] = dict()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def wait(self, kernel_id, document_id, cell_id) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault((kernel_id, document_id, cell_id), []).append(future)
+        return future
+
+    def cancel_wait(self, kernel_id, document_id, cell_id, future):
+        key = (kernel_id, document_id, cell_id)
+        waiters = self.waiters.get(key, [])
+        if future in waiters:
+            waiters.remove(future)
+        if not waiters:
+            self.waiters.pop(key, None)
+
+    def publish(self, event, kernel_id, document_id, cell_id, **extra):
+        record = {
+            'event': event,
+            'kernel_id': kernel_id,
+            'cell_id': cell_id,
+            **extra,
+        }
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(record)
+            except asyncio.QueueFull:
+                self.log.warning(f'execution event subscriber is too slow, drop event {record}')
+
+        if event == 'finish':
+            for future in self.waiters.pop((kernel_id, document_id, cell_id), []):
+                if not future.done():
+                    future.set_result(record)
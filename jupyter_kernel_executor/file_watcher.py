@@ -1,114 +1,165 @@
 import asyncio
+import fnmatch
+import os
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Dict
 
+from traitlets import Integer, List as ListTrait, Unicode
+from traitlets.config import LoggingConfigurable
 from watchfiles import awatch, Change
 
+from jupyter_kernel_executor import metrics
 from jupyter_kernel_executor.fileid import FileIDWrapper
 
 
-class Singleton(type):
-    _instances = {}
-
-    def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
-        return cls._instances[cls]
-
-
-class FileWatcher(metaclass=Singleton):
-    def __init__(self, file_id_manager):
+class FileWatcher(LoggingConfigurable):
+    """
+    Watch directories of documents being executed, to keep their file ids right when they are moved or modified
+
+    Only the directory of each executing document is watched(not recursively), and only notebook events
+    not matching `ignore_globs` are handled. Watched directories follow executions as they start and finish.
+    A notebook deleted from a watched directory without being added to one may have moved elsewhere,
+    the file id manager then looks for it in the whole tree.
+    """
+
+    ignore_globs = ListTrait(
+        Unicode(),
+        default_value=['.git', 'node_modules', '.ipynb_checkpoints', '__pycache__', '.~*'],
+        config=True,
+        help="Files and directories matching any of these globs are not watched, matched against every path part"
+    )
+    patterns = ListTrait(
+        Unicode(),
+        default_value=['*.ipynb'],
+        config=True,
+        help="Only files matching one of these globs are handled"
+    )
+    debounce = Integer(
+        1600, config=True,
+        help="Milliseconds to gather file changes before handling them together"
+    )
+    step = Integer(
+        50, config=True,
+        help="Milliseconds to wait for new changes while gathering them"
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
         self.task: Optional[asyncio.Task] = None
-        self.file_id_manager: Optional[FileIDWrapper] = file_id_manager
-        self.handlers = []
-
-    @property
-    def log(self):
-        return getattr(self.file_id_manager, 'log')
+        self.file_id_manager: Optional[FileIDWrapper] = None
+        # watched directory -> number of documents executing in it
+        self.roots: Dict[str, int] = dict()
+        self.watching: List[str] = []
+        # callbacks with modified path, e.g. to drop caches of a file
+        self.modified_listeners = []
 
     @property
-    def con(self):
-        return getattr(self.file_id_manager, 'con')
-
-    def add(self, handle):
-        self.handlers.append(handle)
-
-    def remove(self, handle):
-        if handle in self.handlers:
-            self.handlers.remove(handle)
-        # last exit, cleanup
-        if not self.handlers:
-            self.cancel()
+    def enable(self):
+        return bool(self.file_id_manager and self.file_id_manager.enable)
+
+    def on_modified(self, listener):
+        if listener not in self.modified_listeners:
+            self.modified_listeners.append(listener)
+
+    def watch(self, document_path):
+        """watch directory of document while it's executing"""
+        if not self.enable or not document_path:
+            return
+        root = os.path.dirname(os.path.abspath(document_path))
+        self.roots[root] = self.roots.get(root, 0) + 1
+        self.restart_if_changed()
+
+    def unwatch(self, document_path):
+        if not self.enable or not document_path:
+            return
+        root = os.path.dirname(os.path.abspath(document_path))
+        if root not in self.roots:
+            return
+        self.roots[root] -= 1
+        if not self.roots[root]:
+            del self.roots[root]
+        self.restart_if_changed()
+
+    def watch_filter(self, change: Change, path: str) -> bool:
+        parts = Path(path).parts
+        for pattern in self.ignore_globs:
+            if any(fnmatch.fnmatch(part, pattern) for part in parts):
+                return False
+        name = parts[-1] if parts else path
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
 
     def cancel(self):
         if self.task:
             self.task.cancel()
+            self.task = None
+        self.watching = []
 
-    def start_if_not(self, root_dir):
-        if self.task and not self.task.done():
+    def restart_if_changed(self):
+        roots = sorted(root for root in self.roots if os.path.isdir(root))
+        if roots == self.watching and self.task and not self.task.done():
             return self
-        if not self.file_id_manager.enable:
+        self.cancel()
+        if not roots:
             return self
 
-        self.log.info('Start global file watcher')
-        if not root_dir:
-            root_dir = '.'
+        self.log.debug(f'Watch file changes in {roots}')
+        self.watching = roots
 
         async def _():
             # fixme There is this error on server shutdown
             # RuntimeError: Already borrowed
             # https://github.com/samuelcolvin/watchfiles/issues/200
             # https://github.com/PyO3/pyo3/issues/2525
-            async for changes in awatch(root_dir):
-                deleted_paths = []
-                added_paths = []
-                for change, changed_path in changes:
-                    changed_path = Path(changed_path)
-                    if change == Change.deleted:
-                        deleted_paths.append(changed_path)
-                        self.maybe_renamed(changed_path, deleted_paths, added_paths, is_added_path=False)
-                    elif change == Change.added:
-                        added_paths.append(changed_path)
-                        self.maybe_renamed(changed_path, added_paths, deleted_paths, is_added_path=True)
-                    elif change == Change.modified:
-                        # Only modified can use save
-                        self.file_id_manager.save(changed_path)
-
-        # recreate task
-        if self.task:
-            self.task.cancel()
-            del self.task
+            async for changes in awatch(
+                    *roots,
+                    watch_filter=self.watch_filter,
+                    debounce=self.debounce,
+                    step=self.step,
+                    recursive=False,
+            ):
+                with metrics.timed(metrics.PHASE_FILE_WATCHER):
+                    self.handle_changes(changes)
+
         self.task = asyncio.create_task(_())
         return self
 
-    def maybe_renamed(self, changed_path: Path, changed_paths: List[Path], other_paths: List[Path],
-                      is_added_path):
-        if is_added_path:
-            src = None
-            dst = changed_path
-        else:
-            src = changed_path
-            dst = None
-
-        for op in other_paths:
-            if self.get_mtime(changed_path) == self.get_mtime(op):
-                changed_paths.remove(changed_path)
-                if is_added_path:
-                    src = op
-                else:
-                    dst = op
-                self.file_id_manager.move(src.as_posix(), dst.as_posix())
-                return
-
-    def get_mtime(self, path):
-        path = Path(path)
-        if path.exists():
-            return path.stat().st_mtime
-
-        src = self.con.execute(
-            "SELECT mtime FROM Files WHERE path = ?", (path.as_posix(),)
-        ).fetchone()
-        if src:
-            return src[0]
-        else:
-            return None
+    def handle_changes(self, changes):
+        deleted_paths = []
+        added_paths = []
+        for change, changed_path in changes:
+            if change == Change.deleted:
+                deleted_paths.append(changed_path)
+            elif change == Change.added:
+                added_paths.append(changed_path)
+            elif change == Change.modified:
+                # Only modified can use save
+                self.file_id_manager.save(changed_path)
+                for listener in self.modified_listeners:
+                    listener(Path(changed_path))
+        if deleted_paths:
+            self.file_id_manager.forget_paths(deleted_paths)
+            unmatched = self.resolve_renames(deleted_paths, added_paths)
+            if unmatched:
+                # moved out of the watched directories, or deleted
+                self.file_id_manager.resync(unmatched)
+
+    def resolve_renames(self, deleted_paths: List[str], added_paths: List[str]) -> List[str]:
+        """
+        A move shows as a deleted path and an added one, the moved file keeps its inode and mtime:
+        match added files against records of deleted paths by (inode, mtime), return ids of those unmatched
+        """
+        deleted = self.file_id_manager.records_of_paths(deleted_paths)
+        moves = dict()
+        for added_path in added_paths:
+            try:
+                stat_info = os.stat(added_path)
+            except OSError:
+                # moved again or deleted since
+                continue
+            file_id = deleted.pop((stat_info.st_ino, stat_info.st_mtime_ns), None)
+            if file_id:
+                moves[file_id] = added_path
+        if moves:
+            self.log.debug(f'{len(moves)} file(s) moved')
+            self.file_id_manager.move_many(moves)
+        return list(deleted.values())
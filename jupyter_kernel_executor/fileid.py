@@ -1,7 +1,83 @@
+import time
+from typing import Dict, Tuple, Optional, Iterable
+
+from traitlets import Float, Integer
+from traitlets.config import LoggingConfigurable
+
+
+class CachedPath:
+    __slots__ = ('path', 'ino', 'checked')
+
+    def __init__(self, path, ino):
+        self.path = path
+        self.ino = ino
+        self.checked = time.monotonic()
+
+
+class FileIdCache(LoggingConfigurable):
+    """
+    id <-> normalized path of files, shared by FileIDWrappers
+
+    A pair is trusted for `ttl` seconds, then the file's inode is checked again.
+    Moves, deletes and saves seen by the wrapper or the file watcher drop pairs right away.
+    """
+
+    ttl = Float(
+        5, config=True,
+        help="Seconds a cached id-path pair is trusted before checking the file's inode again. 0 to disable the cache"
+    )
+    max_entries = Integer(
+        100000, config=True,
+        help="Number of cached id-path pairs, the oldest ones are dropped beyond"
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.entries: Dict[str, CachedPath] = dict()
+        self.ids: Dict[str, str] = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_id) -> Optional[CachedPath]:
+        return self.entries.get(file_id)
+
+    def put(self, file_id, path, ino):
+        if not self.ttl:
+            return
+        self.invalidate(file_id)
+        self.invalidate_path(path)
+        self.entries[file_id] = CachedPath(path, ino)
+        self.ids[path] = file_id
+        while len(self.entries) > self.max_entries:
+            self.invalidate(next(iter(self.entries)))
+
+    def is_fresh(self, entry: CachedPath):
+        return time.monotonic() - entry.checked < self.ttl
+
+    def invalidate(self, file_id):
+        entry = self.entries.pop(file_id, None)
+        if entry and self.ids.get(entry.path) == file_id:
+            del self.ids[entry.path]
+
+    def invalidate_path(self, path):
+        file_id = self.ids.pop(path, None)
+        if file_id:
+            self.entries.pop(file_id, None)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
 class FileIDWrapper:
-    def __init__(self, file_id_manager, save_lock):
+    def __init__(self, file_id_manager, document_locks, cache: Optional[FileIdCache] = None):
         self.file_id_manager = file_id_manager
-        self.save_lock = save_lock
+        self.document_locks = document_locks
+        # not cached without one
+        self.cache = cache or FileIdCache(ttl=0)
         if file_id_manager:
             try:
                 import jupyter_server_fileid
@@ -37,30 +113,111 @@ class FileIDWrapper:
             return None
 
         if self.enable:
-            return self.file_id_manager.index(path)
+            file_id = self.cached_id(path)
+            if file_id:
+                return file_id
+            file_id = self.file_id_manager.index(path)
+            self.cache_path(file_id, path)
+            return file_id
         else:
             return path
 
+    def cached_entry(self, file_id) -> Optional[CachedPath]:
+        """cached pair of id, checking the inode again once ttl elapsed"""
+        entry = self.cache.get(file_id)
+        if entry is None:
+            self.cache.misses += 1
+            return None
+        if not self.cache.is_fresh(entry):
+            stat_info = self.file_id_manager._stat(entry.path)
+            if not stat_info or stat_info.ino != entry.ino:
+                self.cache.invalidate(file_id)
+                self.cache.misses += 1
+                return None
+            entry.checked = time.monotonic()
+        self.cache.hits += 1
+        return entry
+
+    def cached_id(self, path) -> Optional[str]:
+        file_id = self.cache.ids.get(path)
+        if file_id and self.cached_entry(file_id):
+            return file_id
+        return None
+
+    def cache_path(self, file_id, path, ino=None):
+        if not file_id or not path:
+            return
+        if ino is None:
+            stat_info = self.file_id_manager._stat(path)
+            if not stat_info:
+                return
+            ino = stat_info.ino
+        self.cache.put(file_id, path, ino)
+
     async def get_path(self, file_id):
         if not file_id:
             return None
         if self.enable:
-            async with self.save_lock:
+            entry = self.cached_entry(file_id)
+            if entry:
+                return self.file_id_manager._from_normalized_path(entry.path)
+            async with self.document_locks(file_id):
                 row = self.file_id_manager.con.execute("SELECT path, ino FROM Files WHERE id = ?",
                                                        (file_id,)).fetchone()
-                path, ino = row
-                stat_info = self.file_id_manager._stat(path)
-                # same inode number, consider it as same file
-                if stat_info and ino == stat_info.ino:
-                    return self.file_id_manager._from_normalized_path(path)
+                if row:
+                    path, ino = row
+                    stat_info = self.file_id_manager._stat(path)
+                    # same inode number, consider it as same file
+                    if stat_info and ino == stat_info.ino:
+                        self.cache_path(file_id, path, ino)
+                        return self.file_id_manager._from_normalized_path(path)
                 # inode change, let file_id_manger sync it
                 # finally fallback to file_id itself
-                path = self.file_id_manager.get_path(file_id) or file_id
+                path = self.file_id_manager.get_path(file_id)
+                if path:
+                    # e.g. replaced by an atomic save, it's where the id is recorded anyway
+                    self.cache_path(file_id, self.normalize_path(path))
+                else:
+                    path = file_id
                 self.log.debug(f'convert id {file_id} to file {path}')
         else:
             path = file_id
         return path
 
+    async def get_paths(self, file_ids: Iterable[str]) -> Dict[str, str]:
+        """id -> path of many files, cached ones first, then others in one query per chunk"""
+        paths = dict()
+        if not self.enable:
+            return {file_id: file_id for file_id in file_ids if file_id}
+
+        missing = []
+        for file_id in set(file_ids):
+            if not file_id:
+                continue
+            entry = self.cached_entry(file_id)
+            if entry:
+                paths[file_id] = self.file_id_manager._from_normalized_path(entry.path)
+            else:
+                missing.append(file_id)
+
+        for i in range(0, len(missing), self.query_chunk_size):
+            chunk = missing[i:i + self.query_chunk_size]
+            rows = self.con.execute(
+                f"SELECT id, path, ino FROM Files WHERE id IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            for file_id, path, ino in rows:
+                stat_info = self.file_id_manager._stat(path)
+                if stat_info and ino == stat_info.ino:
+                    self.cache_path(file_id, path, ino)
+                    paths[file_id] = self.file_id_manager._from_normalized_path(path)
+
+        # moved or replaced, resolve them one by one
+        for file_id in missing:
+            if file_id not in paths:
+                paths[file_id] = await self.get_path(file_id)
+        return paths
+
     def get_id(self, path):
         path = self.normalize_path(path)
         if not path:
@@ -74,10 +231,89 @@ class FileIDWrapper:
             file_id = path
         return file_id
 
+    def find_id(self, path):
+        """id recorded for path, without syncing it with the file as get_id/index do"""
+        # as index does, or an absolute path from the api misses what it indexed
+        if path:
+            path = path.lstrip('/')
+        path = self.normalize_path(path)
+        if not path:
+            return None
+
+        if self.enable:
+            row = self.con.execute("SELECT id FROM Files WHERE path = ?", (path,)).fetchone()
+            return row and row[0]
+        else:
+            return path
+
+    # SQLite host parameters per statement, older builds allow 999
+    query_chunk_size = 500
+
+    def records_of_paths(self, paths) -> Dict[Tuple[int, int], str]:
+        """(inode, mtime) -> id of recorded paths, in one query per chunk"""
+        if not self.enable:
+            return dict()
+        paths = list({self.normalize_path(str(path)) for path in paths})
+        records = dict()
+        for i in range(0, len(paths), self.query_chunk_size):
+            chunk = paths[i:i + self.query_chunk_size]
+            rows = self.con.execute(
+                f"SELECT id, ino, mtime FROM Files WHERE path IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            for file_id, ino, mtime in rows:
+                records[(ino, mtime)] = file_id
+        return records
+
+    def move_many(self, moves: Dict[str, str]):
+        """{id: new path} of moved files, updated in one transaction"""
+        if not self.enable or not moves:
+            return
+        for file_id in moves:
+            self.cache.invalidate(file_id)
+        try:
+            self.con.executemany(
+                "UPDATE Files SET path = ? WHERE id = ?",
+                [(self.normalize_path(str(path)), file_id) for file_id, path in moves.items()],
+            )
+        except Exception:
+            self.con.rollback()
+            raise
+        self.con.commit()
+
+    def resync(self, file_ids) -> Dict[str, Optional[str]]:
+        """
+        id -> path of files moved where no watched event told, e.g. to another directory, None once deleted
+
+        the file id manager syncs its records with the file tree when the recorded path is stale
+        """
+        paths = dict()
+        if not self.enable:
+            return paths
+        for file_id in file_ids:
+            self.cache.invalidate(file_id)
+            path = self.file_id_manager.get_path(file_id)
+            if path:
+                self.cache_path(file_id, self.normalize_path(path))
+            paths[file_id] = path
+        return paths
+
+    def forget_paths(self, paths):
+        """drop cached pairs of paths, e.g. deleted"""
+        for path in paths:
+            self.cache.invalidate_path(self.normalize_path(str(path)))
+
     def save(self, path):
         if self.enable:
+            # same file, the inode changes when it's replaced by an atomic save
+            path = self.normalize_path(str(path))
+            file_id = self.cache.ids.get(path)
+            if file_id:
+                self.cache.invalidate(file_id)
+                self.cache_path(file_id, path)
             return self.file_id_manager.save(path)
 
     def move(self, old_path, new_path):
         if self.enable:
+            self.forget_paths([old_path, new_path])
             return self.file_id_manager.move(old_path, new_path)
@@ -1,46 +1,119 @@
 import asyncio
 import json
 import os
-from typing import Optional, Dict, List
-from datetime import datetime
+import time
+from typing import Dict, List, Optional, Tuple
 
+import nbformat
 import tornado.web
-from jupyter_server.base.handlers import APIHandler
+from jupyter_client.kernelspec import NoSuchKernel
+from tornado.iostream import StreamClosedError
+from jupyter_server.base.handlers import APIHandler, AuthenticatedFileHandler, JupyterHandler
 from jupyter_server.utils import ensure_async
 from watchfiles import awatch, Change
 
-from jupyter_kernel_client.client import KernelWebsocketClient
+from jupyter_kernel_executor import metrics
+from jupyter_kernel_executor.blobs import BlobStore
+from jupyter_kernel_executor.client import LimitedKernelClient, StreamingKernelClient
+from jupyter_kernel_executor.dag import CellGraph, DagScheduler, dependencies_from_metadata
+from jupyter_kernel_executor.events import ExecutionEvents
 from jupyter_kernel_executor.file_watcher import FileWatcher
 from jupyter_kernel_executor.fileid import FileIDWrapper
+from jupyter_kernel_executor.history import ExecutionHistory, GROUPS, SUMMARY_ORDERS, to_timestamp
+from jupyter_kernel_executor.journal import ExecutionJournal
+from jupyter_kernel_executor.locks import KeyedLock
+from jupyter_kernel_executor.notebook_cache import NotebookCache
+from jupyter_kernel_executor.pool import KernelConnectionPool
+from jupyter_kernel_executor.registry import ExecutionRegistry, STOP_CANCELLED, STOP_TIMEOUT
+from jupyter_kernel_executor.result_cache import ResultCache
+from jupyter_kernel_executor.runs import Run, RunRegistry
+from jupyter_kernel_executor.scheduler import KernelScheduler, QueueFull, Ticket
+from jupyter_kernel_executor.warm_pool import AFTER_CULL, AFTER_KEEP, AFTER_RECYCLE, WarmKernelPool
+from jupyter_kernel_executor.writer import WriteBehindBuffer, save_results
 
 
-class ExecuteCellHandler(APIHandler):
-    executing_cell: Dict[str, List[
-        Dict[str, str]]
-    ] = dict()
-    save_lock = asyncio.Lock()
+class BaseExecuteHandler(APIHandler):
+    """components of the executor and executing cells, handlers define their own verbs"""
+
+    # seconds for the kernel to end an interrupted execution
+    interrupt_timeout = 5
 
     def initialize(self):
-        self.execution_start_datetime: Optional[datetime] = None
-        self.execution_end_datetime: Optional[datetime] = None
-        self.watch_dir = self.normal_path(self.serverapp.root_dir or '.')
-        self.global_watcher = FileWatcher(self.file_id_manager)
+        # file id manager is set up by its own extension, after this one
+        self.file_watcher.file_id_manager = self.file_id_manager
+        self.file_watcher.on_modified(self.notebook_cache.invalidate_path)
 
     def finish(self, *args, **kwargs):
         return super().finish(*args, **kwargs)
 
     @property
     def file_id_manager(self) -> FileIDWrapper:
-        return FileIDWrapper(self.settings.get("file_id_manager"), self.save_lock)
+        return FileIDWrapper(
+            self.settings.get("file_id_manager"), self.document_locks, self.settings["kernel_executor_file_id_cache"],
+        )
+
+    @property
+    def file_watcher(self) -> FileWatcher:
+        return self.settings["kernel_executor_file_watcher"]
+
+    @property
+    def connection_pool(self) -> KernelConnectionPool:
+        return self.settings["kernel_executor_connection_pool"]
+
+    @property
+    def document_locks(self) -> KeyedLock:
+        return self.settings["kernel_executor_document_locks"]
+
+    @property
+    def notebook_cache(self) -> NotebookCache:
+        return self.settings["kernel_executor_notebook_cache"]
+
+    @property
+    def blob_store(self) -> BlobStore:
+        return self.settings["kernel_executor_blob_store"]
+
+    @property
+    def result_cache(self) -> ResultCache:
+        return self.settings["kernel_executor_result_cache"]
+
+    @property
+    def write_buffer(self) -> WriteBehindBuffer:
+        return self.settings["kernel_executor_write_buffer"]
+
+    @property
+    def journal(self) -> ExecutionJournal:
+        return self.settings["kernel_executor_journal"]
+
+    @property
+    def history(self) -> ExecutionHistory:
+        return self.settings["kernel_executor_history"]
+
+    @property
+    def executions(self) -> ExecutionRegistry:
+        return self.settings["kernel_executor_executions"]
+
+    @property
+    def execution_timeout(self) -> float:
+        return self.settings.get("kernel_executor_execution_timeout", 0)
+
+    @property
+    def scheduler(self) -> KernelScheduler:
+        return self.settings["kernel_executor_scheduler"]
+
+    @property
+    def execution_events(self) -> ExecutionEvents:
+        return self.settings["kernel_executor_events"]
 
     def normal_path(self, path):
         return self.file_id_manager.normalize_path(path)
 
     def index(self, path):
-        return self.file_id_manager.index(path)
+        with metrics.timed(metrics.PHASE_PATH_RESOLUTION):
+            return self.file_id_manager.index(path)
 
     async def get_path(self, document_id):
-        return await self.file_id_manager.get_path(document_id)
+        with metrics.timed(metrics.PHASE_PATH_RESOLUTION):
+            return await self.file_id_manager.get_path(document_id)
 
     def get_document_id(self, path):
         return self.file_id_manager.get_id(path)
@@ -57,43 +130,8 @@ class ExecuteCellHandler(APIHandler):
 
         return {"Authorization": f"token {provider.token}"}
 
-    @tornado.web.authenticated
-    async def get(self, kernel_id):
-        if not self.kernel_manager.get_kernel(kernel_id):
-            raise tornado.web.HTTPError(404, f"No such kernel {kernel_id}")
-
-        records = self.executing_cell.get(kernel_id, [])
-        response = [
-            {
-                "path": await self.get_path(record['document_id']),
-                "cell_id": record['cell_id'],
-            } for record in records
-        ]
-
-        await self.finish(json.dumps(
-            response
-        ))
-
-    def is_executing(self, kernel_id, document_id, cell_id):
-        return self.get_record(document_id, cell_id) in self.executing_cell.get(kernel_id, [])
-
-    @tornado.web.authenticated
-    async def post(self, kernel_id):
-        """
-        Json Body Required:
-            path(str): file path, When file_id_manager(jupyter_server_fileid) available,
-                       tracking path's file id automatically for remove or some other actions
-
-            cell_id(str):  cell to be executed
-            OR
-            code(str): just execute the code here
-
-        Optional:
-            block(bool): execute code sync or not, when path and cell_id available, default to False(not block)
-                         or True(execute code sync), when block is True, response result
-            not_write(bool): default to False, False means try to write result to document's cell
-
-        """
+    async def execute_cell(self, kernel_id):
+        """execute on kernel_id as POST /api/kernels/{kernel_id}/execute tells"""
         if not self.kernel_manager.get_kernel(kernel_id):
             raise tornado.web.HTTPError(404, f"No such kernel {kernel_id}")
 
@@ -104,6 +142,7 @@ class ExecuteCellHandler(APIHandler):
         document_id = self.index(path)
         if self.is_executing(kernel_id, document_id, cell_id):
             self.log.info(f'cell {cell_id} of {path}(id:{document_id}) is executing')
+            metrics.SKIPPED_DUPLICATES.inc()
             return await self.finish(json.dumps(
                 model
             ))
@@ -118,44 +157,76 @@ class ExecuteCellHandler(APIHandler):
         else:
             block = False
 
-        auth_header = self.get_request_auth()
-        if not auth_header:
-            # fallback using app setting, May not be compatible with jupyterhub-singleuser or other singleuser app
-            auth_header = self.get_auth_header()
-
-        client = KernelWebsocketClient(
-            kernel_id=kernel_id,
-            host=self.serverapp.ip,
-            port=self.serverapp.port,
-            base_url=self.base_url,
-            auth_header=auth_header,
-            encoded=True,
-        )
         code = model.get('code') or await self.read_code_from_ipynb(
             document_id,
             cell_id,
         )
-        assert code is not None
+        if code is None:
+            if path and cell_id:
+                # the file id manager indexes existing files only
+                raise tornado.web.HTTPError(404, f"No such file {path}")
+            raise tornado.web.HTTPError(400, "code or path and cell_id required")
+
+        priority = self.get_priority(model)
+        timeout = self.get_timeout(model)
+        if model.get('stream'):
+            return await self.stream_execute(
+                kernel_id, code, document_id, cell_id, not_write, priority=priority, timeout=timeout, path=path,
+            )
+
+        if block and model.get('cache') and self.result_cache.max_bytes:
+            return await self.cached_execute(
+                kernel_id, model, code, document_id, cell_id, not_write, priority=priority, timeout=timeout,
+                path=path,
+            )
 
+        client = self.create_client(kernel_id)
         if not block:
             self.log.debug("async execute code, write result to file")
+            entry_id = None
 
             async def write_callback():
                 try:
-                    await self.write_output(document_id, cell_id, client.get_result())
+                    await self.write_output(document_id, cell_id, client.get_result(), wait=False, partial=True)
                 except Exception as e:
                     self.log.error('Exception when asynchronous writing result to file')
                     self.log.exception(e)
 
-            if not not_write:
-                client.register_callback(write_callback)
-            await self.finish(json.dumps(
-                model
-            ))
-            await self.execute(client, code, document_id, cell_id)
+            # queued and tracked before responding, so a full queue is refused
+            # and waiting right after the response sees it executing
+            ticket = self.enqueue(kernel_id, document_id, cell_id, priority)
+            executing = False
+            try:
+                if not not_write:
+                    client.register_callback(write_callback)
+                    # outputs are journaled as they arrive, replayed into the notebook if the server stops before saving
+                    entry_id = self.journal.start(kernel_id, document_id, path, cell_id, model)
+                    client.output_listener = lambda output: self.journal.output(entry_id, output)
+                await self.pre_execute(kernel_id, document_id, cell_id, path=path, block=False)
+                await self.finish(json.dumps(
+                    model
+                ))
+                executing = True
+                result = await self.execute(client, code, document_id, cell_id, ticket=ticket, timeout=timeout)
+                if not not_write:
+                    # complete the journal entry, and the outputs when stopped before the kernel finished,
+                    # write_callback didn't see the end then
+                    await self.write_output(document_id, cell_id, result, wait=False, entry_id=entry_id)
+            except Exception:
+                # failed as it did without the journal, don't replay it
+                self.journal.written([entry_id])
+                if not executing:
+                    # e.g. the client disconnected before the response, execute won't untrack it,
+                    # left tracked it would be skipped as executing and waited for forever
+                    await self.post_execute(kernel_id, document_id, cell_id)
+                raise
+            finally:
+                ticket.release()
         else:
             self.log.debug("sync execute code, return execution result in response")
-            result = await self.execute(client, code, document_id, cell_id)
+            result = await self.execute(
+                client, code, document_id, cell_id, priority=priority, timeout=timeout, path=path, block=True,
+            )
             if not not_write:
                 await self.write_output(document_id, cell_id, result)
             await self.finish(json.dumps({
@@ -163,82 +234,1048 @@ class ExecuteCellHandler(APIHandler):
                 **result
             }))
 
-    async def execute(self, client, code, document_id, cell_id):
+    def is_executing(self, kernel_id, document_id, cell_id):
+        return self.executions.is_executing(kernel_id, document_id, cell_id)
+
+    async def stream_execute(self, kernel_id, code, document_id, cell_id, not_write, priority=0, timeout=None,
+                             **metadata):
+        self.log.debug("stream execute code, response outputs as they arrive")
+        self.start_stream()
+        # outputs are only kept when they are going to be written
+        keep_outputs = not not_write and bool(document_id and cell_id)
+        client = self.create_client(kernel_id, client_class=StreamingKernelClient, keep_outputs=keep_outputs)
+
+        async def stream_callback():
+            for output in client.pop_new_outputs():
+                await self.send_record({'type': 'output', 'output': output})
+
+        client.register_callback(stream_callback)
+        result = await self.execute(
+            client, code, document_id, cell_id, priority=priority, timeout=timeout, stream=True, **metadata,
+        )
+        if keep_outputs:
+            await self.write_output(document_id, cell_id, result)
+        if 'status' in result:
+            # stopped, tell why as the last output
+            await self.send_record({'type': 'output', 'output': result['outputs'][-1]})
+        await self.send_record({
+            'type': 'result',
+            'execution_count': result['execution_count'],
+            'status': result.get('status') or ('error' if client.has_error else 'ok'),
+        })
+        await self.finish_stream()
+
+    def start_stream(self):
+        """response records as Server-Sent Events when the request accepts them, else as JSON lines"""
+        self.sse = 'text/event-stream' in self.request.headers.get('Accept', '')
+        self.set_header('Content-Type', 'text/event-stream' if self.sse else 'application/x-ndjson')
+        self.set_header('Cache-Control', 'no-cache')
+        self.connected = True
+
+    async def send_record(self, record):
+        if not self.connected:
+            return
+        if self.sse:
+            self.write(f"event: {record['type']}\ndata: {json.dumps(record)}\n\n")
+        else:
+            self.write(json.dumps(record) + '\n')
+        try:
+            await self.flush()
+        except StreamClosedError:
+            # client is gone, keep executing and writing result
+            self.connected = False
+
+    async def finish_stream(self):
+        try:
+            await self.finish()
+        except StreamClosedError:
+            pass
+
+    async def cached_execute(self, kernel_id, model, code, document_id, cell_id, not_write, **kwargs):
+        kernel = self.kernel_manager.get_kernel(kernel_id)
+        state = self.result_cache.state(kernel_id, kernel, model.get('state'))
+        key = self.result_cache.key(kernel_id, state, code)
+        result = self.result_cache.get(key)
+        cached = result is not None
+        if not cached:
+            result = await self.execute(self.create_client(kernel_id), code, document_id, cell_id, pure=True, **kwargs)
+            unchanged = self.result_cache.state(kernel_id, kernel, model.get('state')) == state
+            failed = 'status' in result or any(output['output_type'] == 'error' for output in result['outputs'])
+            if unchanged and not failed:
+                self.result_cache.put(key, result)
+        if not not_write:
+            await self.write_output(document_id, cell_id, result)
+        await self.finish(json.dumps({
+            **model,
+            **result,
+            'cached': cached,
+        }))
+
+    def create_client(self, kernel_id, client_class=LimitedKernelClient, **kwargs):
+        auth_header = self.get_request_auth()
+        if not auth_header:
+            # fallback using app setting, May not be compatible with jupyterhub-singleuser or other singleuser app
+            auth_header = self.get_auth_header()
+
+        return client_class(
+            kernel_id=kernel_id,
+            host=self.serverapp.ip,
+            port=self.serverapp.port,
+            base_url=self.base_url,
+            auth_header=auth_header,
+            encoded=True,
+            output_limits=self.settings["kernel_executor_output_limits"],
+            **kwargs,
+        )
+
+    def get_priority(self, model):
+        try:
+            return int(model.get('priority') or 0)
+        except (TypeError, ValueError):
+            raise tornado.web.HTTPError(400, "priority should be an integer")
+
+    def get_timeout(self, model) -> Optional[float]:
+        if model.get('timeout') is None:
+            return None
+        try:
+            return float(model['timeout'])
+        except (TypeError, ValueError):
+            raise tornado.web.HTTPError(400, "timeout should be a number")
+
+    def enqueue(self, kernel_id, document_id=None, cell_id=None, priority=0) -> Ticket:
+        try:
+            return self.scheduler.enqueue(kernel_id, priority, document_id, cell_id)
+        except QueueFull as e:
+            raise tornado.web.HTTPError(429, str(e))
+
+    async def execute(self, client, code, document_id, cell_id, connection=None, ticket=None, priority=0,
+                      timeout=None, pure=False, **metadata):
+        """
+        execute code with client, over connection if given, else over a connection from the pool
+
+        waits for its turn in the kernel's queue, with ticket if given(caller releases it),
+        else with a new one of priority
+        once running, the kernel is interrupted after timeout seconds(server default when None, 0 for no limit)
+        or when the execution is cancelled, the result then ends with an error output telling so
+        metadata is kept with the execution record, e.g. path of the document
+        unless pure, the kernel's state tracked for ResultCache changes
+        """
         kernel_id = client.kernel_id
-        await self.pre_execute(kernel_id, document_id, cell_id)
+        if timeout is None:
+            timeout = self.execution_timeout
+        own_ticket = ticket is None
+        if own_ticket:
+            ticket = self.enqueue(kernel_id, document_id, cell_id, priority)
+        queued = time.time()
+        started = None
+        status = 'exception'
+        path = metadata.get('path')
         try:
-            result = await client.execute(code)
+            await self.pre_execute(kernel_id, document_id, cell_id, **metadata)
+            record = self.executions.get(kernel_id, document_id, cell_id)
+            if record:
+                path = record.metadata.get('path', path)
+            # untracked executions can't be cancelled, only time out
+            stopped = record.stopped if record else asyncio.Event()
+            waiting = asyncio.ensure_future(ticket.wait())
+            stop_reason = await self.wait_unless_stopped(waiting, stopped)
+            if stop_reason:
+                waiting.cancel()
+            else:
+                started = time.time()
+                stop_reason = await self.run_on_kernel(client, code, connection, stopped, timeout, pure)
+            if stop_reason:
+                result = self.stopped_result(client, stop_reason, timeout)
+            else:
+                result = client.get_result()
+            status = self.result_status(result)
+        except Exception:
+            metrics.count_error('exception')
+            raise
         finally:
+            if own_ticket:
+                ticket.release()
             await self.post_execute(kernel_id, document_id, cell_id)
-        self.log.debug(f'execute time: {self.execution_end_datetime - self.execution_start_datetime}')
+            self.history.add(
+                kernel_id, document_id, cell_id, path, status, client.execution_count, queued, started, time.time(),
+                *client.output_sizes(),
+            )
+            client.close_outputs()
+        if status != 'ok':
+            metrics.count_error(status)
         return result
 
-    async def pre_execute(self, kernel_id, document_id, cell_id):
-        if document_id and cell_id:
-            self.executing_cell.setdefault(kernel_id, []).append(
-                self.get_record(document_id, cell_id)
-            )
-            self.global_watcher.add(self)
-            self.global_watcher.start_if_not(self.watch_dir)
+    async def run_on_kernel(self, client, code, connection, stopped: asyncio.Event, timeout, pure) -> Optional[str]:
+        """execute code once it's the kernel's turn, return why it's stopped, None once done"""
+        kernel_id = client.kernel_id
+        if not pure:
+            self.result_cache.bump(kernel_id)
+        start = time.perf_counter()
+        if connection:
+            running = asyncio.ensure_future(connection.execute(client, code))
+        else:
+            running = asyncio.ensure_future(self.connection_pool.execute(client, code))
+        try:
+            with metrics.running(kernel_id):
+                stop_reason = await self.wait_unless_stopped(running, stopped, timeout)
+                if stop_reason:
+                    await self.interrupt(kernel_id, running, stop_reason)
+                else:
+                    # connection errors
+                    running.result()
+        finally:
+            if not pure:
+                # results of pure code cached meanwhile saw the state before it ended
+                self.result_cache.bump(kernel_id)
+            elapsed = time.perf_counter() - start
+            metrics.PHASE_SECONDS.labels(metrics.PHASE_KERNEL_EXECUTE).observe(elapsed)
+            self.log.debug(f'execute time: {elapsed:.3f}s')
+        return stop_reason
 
-        self.execution_start_datetime = datetime.now()
+    async def wait_unless_stopped(self, task: asyncio.Future, stopped: asyncio.Event, timeout=0) -> Optional[str]:
+        """wait for task until stopped is set or timeout elapses, return why it's stopped, None once task is done"""
+        stopping = asyncio.ensure_future(stopped.wait())
+        try:
+            await asyncio.wait({task, stopping}, timeout=timeout or None, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            stopping.cancel()
+        if task.done():
+            return None
+        return STOP_CANCELLED if stopped.is_set() else STOP_TIMEOUT
 
-    async def post_execute(self, kernel_id, document_id, cell_id):
-        self.execution_end_datetime = datetime.now()
-        records = self.executing_cell.get(kernel_id, [])
-        if document_id and cell_id:
-            # prevent memory leak
-            self.global_watcher.remove(self)
-            record = self.get_record(document_id, cell_id)
-            if record in records:
-                records.remove(record)
-
-    def get_record(self, document_id, cell_id):
+    async def interrupt(self, kernel_id, running: asyncio.Future, reason):
+        self.log.info(f'interrupt kernel {kernel_id}, execution {reason}')
+        await ensure_async(self.kernel_manager.interrupt_kernel(kernel_id))
+        # let the kernel end the interrupted execution, requests it receives meanwhile would be aborted
+        done, _ = await asyncio.wait({running}, timeout=self.interrupt_timeout)
+        if done:
+            # KeyboardInterrupt or connection error, replaced by the stop reason anyway
+            running.cancelled() or running.exception()
+        else:
+            running.cancel()
+
+    def result_status(self, result):
+        if result.get('status'):
+            return result['status']
+        return 'error' if any(output['output_type'] == 'error' for output in result['outputs']) else 'ok'
+
+    def stopped_result(self, client, reason, timeout):
+        if reason == STOP_TIMEOUT:
+            output = nbformat.v4.new_output(
+                'error', ename='ExecutionTimeout', evalue=f'execution timed out after {timeout} seconds', traceback=[],
+            )
+        else:
+            output = nbformat.v4.new_output('error', ename='ExecutionCancelled', evalue='execution cancelled',
+                                            traceback=[])
+        result = client.get_result()
         return {
-            'document_id': document_id,
-            'cell_id': cell_id
+            'outputs': [*result['outputs'], output],
+            'execution_count': result['execution_count'],
+            'status': reason,
         }
 
+    async def pre_execute(self, kernel_id, document_id, cell_id, **metadata):
+        # tracked already when registered before responding
+        record = document_id and cell_id and self.executions.add(kernel_id, document_id, cell_id, **metadata)
+        if record:
+            path = await self.get_path(document_id)
+            record.metadata.setdefault('path', path)
+            record.os_path = self.normal_path(path)
+            self.file_watcher.watch(record.os_path)
+            await self.publish_event('start', kernel_id, document_id, cell_id)
+
+    async def post_execute(self, kernel_id, document_id, cell_id):
+        record = document_id and cell_id and self.executions.remove(kernel_id, document_id, cell_id)
+        if record:
+            # stop watching where it was when it started, even if moved meanwhile
+            self.file_watcher.unwatch(record.os_path)
+            await self.publish_event('finish', kernel_id, document_id, cell_id)
+
+    async def publish_event(self, event, kernel_id, document_id, cell_id):
+        try:
+            path = await self.get_path(document_id)
+        except Exception as e:
+            self.log.debug(f'cannot resolve path of {document_id} for {event} event: {e}')
+            path = document_id
+        self.execution_events.publish(event, kernel_id, document_id, cell_id, path=path)
+
+    async def read_notebook(self, document_id, path):
+        # saving rewrites the file in place, a read meanwhile would see it half written
+        async with self.document_locks(document_id):
+            return await self.notebook_cache.get(document_id, path, self.contents_manager)
+
     async def read_code_from_ipynb(self, document_id, cell_id) -> Optional[str]:
         if not document_id or not cell_id:
             return None
-        cm = self.contents_manager
         path = await self.get_path(document_id)
-        model = await ensure_async(cm.get(path, content=True, type='notebook'))
-        nb = model['content']
-        for cell in nb['cells']:
-            if cell['id'] == cell_id:
-                return cell['source']
+        notebook = await self.read_notebook(document_id, path)
+        cell = notebook.cells.get(cell_id)
+        if cell:
+            return cell['source']
         raise tornado.web.HTTPError(404, f"cell {cell_id} not found in {path}")
 
-    async def write_output(self, document_id, cell_id, result):
+    async def write_output(self, document_id, cell_id, result, wait=True, entry_id=None, partial=False):
+        """
+        buffer result of cell, results of one document are saved together
+
+        wait(bool): save right away and wait for it, or leave it to the write-behind buffer,
+                    the result is then kept in the journal until saved
+        entry_id: journal entry of the execution, when it was journaled as it ran
+        partial(bool): result of an execution still running, its journal entry keeps the outputs meanwhile
+        """
         if not document_id or not cell_id:
             return
-        cm = self.contents_manager
-        path = await self.get_path(document_id)
-        async with self.save_lock:
-            model = await ensure_async(cm.get(path, content=True, type='notebook'))
-            nb = model['content']
-            updated = False
-            for cell in nb['cells']:
-                if cell['id'] == cell_id:
-                    if result['outputs'] != cell["outputs"]:
-                        cell["outputs"] = result['outputs']
-                        updated = True
-                    if result['execution_count']:
-                        cell['execution_count'] = int(result['execution_count'])
-                        updated = True
-                    break
-            if updated:
-                await ensure_async(cm.save(model, path))
-                self.file_id_manager.save(path)
+        if partial:
+            self.write_buffer.put(document_id, cell_id, result, self.save_outputs)
+            return
+        if not wait:
+            entry_id = self.journal.record(document_id, await self.get_path(document_id), cell_id, result, entry_id)
+        saved = self.write_buffer.put(document_id, cell_id, result, self.save_outputs, flush_now=wait)
+        if wait:
+            await saved
+        else:
+            self.forget_when_saved(saved, [entry_id])
+
+    def forget_when_saved(self, saved: asyncio.Future, entry_ids):
+        """drop journal entries once saved, a failed save is retried by the buffer, and replayed on next start"""
+        journal = self.journal
+
+        def done(future):
+            if not future.cancelled() and future.exception() is None:
+                journal.written(entry_ids)
+
+        saved.add_done_callback(done)
+
+    async def save_outputs(self, document_id, updates):
+        with metrics.timed(metrics.PHASE_WRITE_BACK):
+            path = await self.get_path(document_id)
+            async with self.document_locks(document_id):
+                try:
+                    saved = await save_results(
+                        self.contents_manager, path, updates, self.blob_store, self.write_buffer.patch_local,
+                    )
+                except tornado.web.HTTPError as e:
+                    # moved where no watched event told, e.g. to another directory
+                    moved = e.status_code == 404 and self.file_id_manager.resync([document_id]).get(document_id)
+                    if not moved or moved == path:
+                        raise
+                    path = moved
+                    saved = await save_results(
+                        self.contents_manager, path, updates, self.blob_store, self.write_buffer.patch_local,
+                    )
+                if saved:
+                    self.notebook_cache.invalidate(document_id)
+                    self.file_id_manager.save(path)
 
     def executing_document(self):
-        executing_document = []
-        for kernel_records in self.executing_cell.values():
-            for records in kernel_records:
-                executing_document.append(records['document_id'])
-        return executing_document
+        return self.executions.documents()
+
+
+class ExecuteCellHandler(BaseExecuteHandler):
+    @tornado.web.authenticated
+    async def get(self, kernel_id):
+        if not self.kernel_manager.get_kernel(kernel_id):
+            raise tornado.web.HTTPError(404, f"No such kernel {kernel_id}")
+
+        positions = self.scheduler.positions(kernel_id)
+        records = self.executions.on_kernel(kernel_id)
+        paths = await self.file_id_manager.get_paths(record.document_id for record in records)
+        response = [
+            {
+                "path": paths[record.document_id],
+                "cell_id": record.cell_id,
+                "started": record.started.isoformat() + 'Z',
+                # null once it's running on the kernel
+                "queue_position": positions.get((record.document_id, record.cell_id)),
+            } for record in records
+        ]
+
+        await self.finish(json.dumps(
+            response
+        ))
+
+    @tornado.web.authenticated
+    async def delete(self, kernel_id):
+        """
+        Cancel execution of a cell, the kernel is interrupted if it's running it,
+        its outputs end with an ExecutionCancelled error
+
+        Query Required:
+            path(str): file path
+            cell_id(str): the cell to cancel
+        """
+        if not self.kernel_manager.get_kernel(kernel_id):
+            raise tornado.web.HTTPError(404, f"No such kernel {kernel_id}")
+
+        path = self.get_query_argument('path')
+        cell_id = self.get_query_argument('cell_id')
+        record = self.executions.get(kernel_id, self.file_id_manager.find_id(path), cell_id)
+        if not record:
+            raise tornado.web.HTTPError(404, f"cell {cell_id} of {path} is not executing")
+        record.stop(STOP_CANCELLED)
+        await self.finish(json.dumps({
+            "path": path,
+            "cell_id": cell_id,
+            "status": STOP_CANCELLED,
+        }))
+
+    @tornado.web.authenticated
+    async def post(self, kernel_id):
+        """
+        Json Body Required:
+            path(str): file path, When file_id_manager(jupyter_server_fileid) available,
+                       tracking path's file id automatically for remove or some other actions
+
+            cell_id(str):  cell to be executed
+            OR
+            code(str): just execute the code here
+
+        Optional:
+            block(bool): execute code sync or not, when path and cell_id available, default to False(not block)
+                         or True(execute code sync), when block is True, response result
+            not_write(bool): default to False, False means try to write result to document's cell
+            stream(bool): default to False, True means response every output as it arrives,
+                          as Server-Sent Events when request accepts text/event-stream, or as JSON lines,
+                          the last record carries execution_count and status
+            priority(int): default to 0, executions waiting for the kernel run by higher priority first,
+                           then in arrival order
+            timeout(float): seconds the code may run before the kernel is interrupted, default to server's
+                            KernelExecutorApp.execution_timeout, 0 for no limit.
+                            The outputs then end with an ExecutionTimeout error, and status is "timeout"
+            cache(bool): default to False, True means the code doesn't change the kernel's state,
+                         when block is True, its result is reused while the kernel's state is unchanged,
+                         the response then has cached=True
+            state(str): token of the kernel's state for cache, default to the state tracked by server
+
+        Response 429 when too many executions are waiting for the kernel
+        """
+        await self.execute_cell(kernel_id)
+
+
+class ExecuteWaitHandler(BaseExecuteHandler):
+    default_timeout = 30
+    max_timeout = 600
+
+    @tornado.web.authenticated
+    async def get(self, kernel_id):
+        """
+        Wait until a cell finished executing, instead of polling GET /api/kernels/{kernel_id}/execute
+
+        Query Required:
+            path(str): file path
+            cell_id(str): the cell waiting for
+
+        Optional:
+            timeout(float): seconds to wait at most, default to 30
+
+        Response finished=false when timeout, or finished=true once the cell is not executing
+        """
+        if not self.kernel_manager.get_kernel(kernel_id):
+            raise tornado.web.HTTPError(404, f"No such kernel {kernel_id}")
+
+        path = self.get_query_argument('path')
+        cell_id = self.get_query_argument('cell_id')
+        try:
+            timeout = min(float(self.get_query_argument('timeout', self.default_timeout)), self.max_timeout)
+        except ValueError:
+            raise tornado.web.HTTPError(400, "timeout should be a number")
+        # look up without syncing, syncing a file modified meanwhile gives it a new id
+        document_id = self.file_id_manager.find_id(path)
+
+        finished = True
+        if self.is_executing(kernel_id, document_id, cell_id):
+            future = self.execution_events.wait(kernel_id, document_id, cell_id)
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                finished = False
+            finally:
+                self.execution_events.cancel_wait(kernel_id, document_id, cell_id, future)
+
+        await self.finish(json.dumps({
+            "path": path,
+            "cell_id": cell_id,
+            "finished": finished,
+        }))
+
+
+class ExecutionEventsHandler(APIHandler):
+    keepalive_interval = 15
+
+    @tornado.web.authenticated
+    async def get(self):
+        """
+        Server-Sent Events of tracked executions: start and finish of every cell in GET /api/kernels/{kernel_id}/execute
+
+        Optional Query:
+            kernel_id(str): only events of this kernel
+        """
+        kernel_id = self.get_query_argument('kernel_id', None)
+        events: ExecutionEvents = self.settings["kernel_executor_events"]
+        self.set_header('Content-Type', 'text/event-stream')
+        self.set_header('Cache-Control', 'no-cache')
+        queue = events.subscribe()
+        try:
+            # let client know it's subscribed
+            self.write(': connected\n\n')
+            await self.flush()
+            while True:
+                try:
+                    record = await asyncio.wait_for(queue.get(), self.keepalive_interval)
+                except asyncio.TimeoutError:
+                    self.write(': keepalive\n\n')
+                else:
+                    if kernel_id and record['kernel_id'] != kernel_id:
+                        continue
+                    self.write(f"event: {record['event']}\ndata: {json.dumps(record)}\n\n")
+                await self.flush()
+        except StreamClosedError:
+            pass
+        finally:
+            events.unsubscribe(queue)
+
+
+class ExecuteRunHandler(BaseExecuteHandler):
+    @property
+    def runs(self) -> RunRegistry:
+        return self.settings["kernel_executor_runs"]
+
+    @tornado.web.authenticated
+    async def get(self, kernel_id, run_id=None):
+        if run_id is None:
+            return await self.finish(json.dumps(
+                [run.to_model() for run in self.runs.list(kernel_id)]
+            ))
+
+        run = self.runs.get(run_id)
+        if not run or kernel_id not in run.kernel_ids:
+            raise tornado.web.HTTPError(404, f"No such run {run_id}")
+        await self.finish(json.dumps(run.to_model()))
+
+    @tornado.web.authenticated
+    async def post(self, kernel_id, run_id=None):
+        """
+        Execute cells of a notebook in order on one kernel connection, results are saved together
+
+        Json Body Required:
+            path(str): notebook path
+            cell_ids(list[str] or "all"): cells to be executed in order, "all" for every code cell
+
+        Optional:
+            block(bool): default to False, True means response after all cells finished
+            not_write(bool): default to False, False means write results to document's cells
+            stop_on_error(bool): default to True, skip remaining cells once a cell raised
+            priority(int): default to 0, place of the run in the kernel's queue, see POST /api/kernels/{kernel_id}/execute
+            timeout(float): seconds each cell may run, see POST /api/kernels/{kernel_id}/execute
+            parallel(bool): default to False, True means run cells on a pool of identical kernels as soon as
+                            the cells they depend on succeeded, instead of in order,
+                            cells which don't depend on a failed one keep running whatever stop_on_error
+            kernel_ids(list[str]): with parallel, more kernels of the pool besides kernel_id
+            dependencies(dict): with parallel, cell id -> ids of cells it depends on,
+                                default to `depends_on` of cells' `kernel_executor` metadata
+            setup_cell_id(str): with parallel, cell executed first on every kernel, e.g. imports
+
+        Response the run, query it with GET /api/kernels/{kernel_id}/runs/{run_id}
+        Response 429 when too many executions are waiting for the kernel
+        """
+        if run_id is not None:
+            raise tornado.web.HTTPError(405)
+        if not self.kernel_manager.get_kernel(kernel_id):
+            raise tornado.web.HTTPError(404, f"No such kernel {kernel_id}")
+
+        model = self.get_json_body() or dict()
+        path = model.get('path')
+        cell_ids = model.get('cell_ids', 'all')
+        if not path:
+            raise tornado.web.HTTPError(400, "path is required")
+        if cell_ids != 'all' and not (
+                isinstance(cell_ids, list) and all(isinstance(cell_id, str) for cell_id in cell_ids)):
+            raise tornado.web.HTTPError(400, 'cell_ids should be "all" or a list of cell ids')
+        document_id = self.index(path)
+        if not document_id:
+            raise tornado.web.HTTPError(404, f"No such file {path}")
+
+        # read notebook once for every cell
+        notebook = await self.read_notebook(document_id, await self.get_path(document_id))
+        if cell_ids == 'all':
+            cell_ids = [cell['id'] for cell in notebook.notebook['cells'] if cell['cell_type'] == 'code']
+        missing = [cell_id for cell_id in cell_ids if cell_id not in notebook.cells]
+        if missing:
+            raise tornado.web.HTTPError(404, f"cell {', '.join(missing)} not found in {path}")
+        sources = {cell_id: notebook.cells[cell_id]['source'] for cell_id in cell_ids}
+        if model.get('parallel'):
+            return await self.post_parallel(kernel_id, model, document_id, path, notebook, cell_ids)
+
+        # the whole run takes one place in the kernel's queue, its cells run back to back
+        ticket = self.enqueue(kernel_id, document_id, priority=self.get_priority(model))
+        run = self.runs.add(Run(kernel_id, document_id, path, cell_ids))
+        try:
+            run_cells = self.run_cells(
+                run,
+                sources,
+                ticket,
+                timeout=self.get_timeout(model),
+                not_write=model.get('not_write', False),
+                stop_on_error=model.get('stop_on_error', True),
+            )
+            if model.get('block'):
+                await run_cells
+                await self.finish(json.dumps(run.to_model()))
+            else:
+                await self.finish(json.dumps(run.to_model()))
+                await run_cells
+        finally:
+            ticket.release()
+
+    async def post_parallel(self, kernel_id, model, document_id, path, notebook, cell_ids):
+        kernel_ids = list(dict.fromkeys([kernel_id] + (model.get('kernel_ids') or [])))
+        missing = [kernel_id for kernel_id in kernel_ids if not self.kernel_manager.get_kernel(kernel_id)]
+        if missing:
+            raise tornado.web.HTTPError(404, f"No such kernel {', '.join(missing)}")
+        setup_cell_id = model.get('setup_cell_id')
+        if setup_cell_id and setup_cell_id not in notebook.cells:
+            raise tornado.web.HTTPError(404, f"cell {setup_cell_id} not found in {path}")
+        cell_ids = [cell_id for cell_id in cell_ids if cell_id != setup_cell_id]
+        dependencies = model.get('dependencies') or dependencies_from_metadata(notebook.notebook['cells'])
+        try:
+            graph = CellGraph(cell_ids, {
+                # setup cell runs first anyway
+                cell_id: [dependency for dependency in depends_on if dependency != setup_cell_id]
+                for cell_id, depends_on in dependencies.items()
+            })
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, str(e))
+        sources = {cell_id: notebook.cells[cell_id]['source'] for cell_id in cell_ids + [setup_cell_id] if cell_id}
+
+        # the run takes one place in the queue of every kernel of the pool
+        priority = self.get_priority(model)
+        tickets = dict()
+        try:
+            for pool_kernel_id in kernel_ids:
+                tickets[pool_kernel_id] = self.enqueue(pool_kernel_id, document_id, priority=priority)
+            run = self.runs.add(Run(
+                kernel_id, document_id, path, ([setup_cell_id] if setup_cell_id else []) + cell_ids,
+                kernel_ids=kernel_ids,
+            ))
+            run_graph = self.run_graph(
+                run,
+                sources,
+                graph,
+                tickets,
+                setup_cell_id=setup_cell_id,
+                timeout=self.get_timeout(model),
+                not_write=model.get('not_write', False),
+            )
+            if model.get('block'):
+                await run_graph
+                await self.finish(json.dumps(run.to_model()))
+            else:
+                await self.finish(json.dumps(run.to_model()))
+                await run_graph
+        finally:
+            for ticket in tickets.values():
+                ticket.release()
+
+    async def run_graph(self, run: Run, sources, graph: CellGraph, tickets: Dict[str, Ticket], setup_cell_id=None,
+                        timeout=None, not_write=False):
+        cells = {cell['cell_id']: cell for cell in run.cells}
+
+        async def execute(kernel_id, cell_id, replay=False):
+            # replayed cells only restore state, neither tracked nor written
+            document_id = None if replay else run.document_id
+            return await self.execute(
+                self.create_client(kernel_id), sources[cell_id], document_id, cell_id,
+                ticket=tickets[kernel_id], timeout=timeout, path=run.path, run_id=run.run_id,
+            )
+
+        async def finish_cell(kernel_id, cell_id, result) -> bool:
+            status = self.result_status(result)
+            cell = cells[cell_id]
+            cell.update(result)
+            cell['kernel_id'] = kernel_id
+            cell['status'] = 'finished' if status == 'ok' else status
+            if not not_write:
+                await self.write_output(run.document_id, cell_id, result, wait=False)
+            return status == 'ok'
+
+        async def run_cell(kernel_id, replay, cell_id) -> Tuple[bool, List[str]]:
+            cells[cell_id]['status'] = 'running'
+            cells[cell_id]['kernel_id'] = kernel_id
+            executed = []
+            for ancestor in replay:
+                status = self.result_status(await execute(kernel_id, ancestor, replay=True))
+                if status != 'ok':
+                    # the ancestor's result stays its own, the cell never ran
+                    cells[cell_id]['status'] = 'skipped'
+                    cells[cell_id]['error'] = f'replaying cell {ancestor} on kernel {kernel_id} ended with {status}'
+                    return False, executed
+                executed.append(ancestor)
+            succeeded = await finish_cell(kernel_id, cell_id, await execute(kernel_id, cell_id))
+            return succeeded, executed + [cell_id]
+
+        try:
+            await asyncio.gather(*(ticket.wait() for ticket in tickets.values()))
+            run.start()
+            succeeded = True
+            if setup_cell_id:
+                cells[setup_cell_id]['status'] = 'running'
+                results = await asyncio.gather(*(execute(kernel_id, setup_cell_id) for kernel_id in run.kernel_ids))
+                failed = [result for result in results if self.result_status(result) != 'ok']
+                succeeded = await finish_cell(run.kernel_ids[0], setup_cell_id, (failed or results)[0])
+
+            if succeeded:
+                _, failed, _ = await DagScheduler(graph, run.kernel_ids, run_cell).run()
+                succeeded = not failed
+            for cell in run.cells:
+                if cell['status'] == 'pending':
+                    cell['status'] = 'skipped'
+            run.finish('finished' if succeeded else 'error')
+        except Exception as e:
+            self.log.error(f'Exception when running cells of {run.path}')
+            self.log.exception(e)
+            run.finish('failed', str(e))
+        finally:
+            self.runs.save(run)
+
+    async def run_cells(self, run: Run, sources, ticket: Ticket, timeout=None, not_write=False, stop_on_error=True):
+        results = dict()
+        # journal entries of results, until saved
+        entry_ids = []
+        try:
+            await ticket.wait()
+            run.start()
+            async with self.connection_pool.connection(self.create_client(run.kernel_id)) as connection:
+                for cell in run.cells:
+                    cell_id = cell['cell_id']
+                    if run.status != 'running':
+                        cell['status'] = 'skipped'
+                        continue
+
+                    cell['status'] = 'running'
+                    result = await self.execute(
+                        self.create_client(run.kernel_id), sources[cell_id], run.document_id, cell_id,
+                        connection=connection, ticket=ticket, timeout=timeout, path=run.path, run_id=run.run_id,
+                    )
+                    results[cell_id] = result
+                    if not not_write:
+                        entry_ids.append(self.journal.record(run.document_id, run.path, cell_id, result))
+                    cell.update(result)
+                    if any(output.get('output_type') == 'error' for output in result['outputs']):
+                        # timeout or cancelled, else error
+                        cell['status'] = result.get('status', 'error')
+                        if stop_on_error:
+                            run.status = 'error'
+                    else:
+                        cell['status'] = 'finished'
+            run.finish('finished' if run.status == 'running' else run.status)
+        except Exception as e:
+            self.log.error(f'Exception when running cells of {run.path}')
+            self.log.exception(e)
+            run.finish('failed', str(e))
+        finally:
+            if results and not not_write:
+                saved = self.write_buffer.put_many(run.document_id, results, self.save_outputs, flush_now=True)
+                self.forget_when_saved(saved, entry_ids)
+                try:
+                    await saved
+                except Exception as e:
+                    # results stay buffered and are retried
+                    run.error = f'write results failed: {e}'
+            self.runs.save(run)
+
+
+class WarmExecuteHandler(BaseExecuteHandler):
+    # kernel the request went to, told in responses echoing the request
+    checked_out = None
+
+    @property
+    def warm_pool(self) -> WarmKernelPool:
+        return self.settings["kernel_executor_warm_pool"]
+
+    @tornado.web.authenticated
+    async def post(self, kernel_name):
+        """
+        Execute on a warm kernel of kernelspec kernel_name, without starting a kernel beforehand,
+        a cold one is started when none is ready
+
+        Json Body as POST /api/kernels/{kernel_id}/execute, Optional:
+            after(str): keep, recycle or cull, what becomes of the kernel once done, default to WarmKernelPool.after
+
+        Response as POST /api/kernels/{kernel_id}/execute, with kernel_id and warm(bool)
+        """
+        model = self.get_json_body() or dict()
+        after = model.get('after') or self.warm_pool.after
+        if after not in (AFTER_CULL, AFTER_RECYCLE, AFTER_KEEP):
+            raise tornado.web.HTTPError(400, "after should be keep, recycle or cull")
+        try:
+            kernel_id, warm = await self.warm_pool.checkout(kernel_name, after)
+        except NoSuchKernel:
+            raise tornado.web.HTTPError(404, f"No such kernelspec {kernel_name}")
+        self.checked_out = {'kernel_id': kernel_id, 'warm': warm}
+        try:
+            await self.execute_cell(kernel_id)
+        finally:
+            await self.warm_pool.checkin(kernel_name, kernel_id, after)
+
+    def get_json_body(self):
+        model = super().get_json_body()
+        if model is not None and self.checked_out:
+            model.update(self.checked_out)
+        return model
+
+
+class FanOutExecuteHandler(BaseExecuteHandler):
+    @tornado.web.authenticated
+    async def post(self):
+        """
+        Execute one cell or code on many kernels in parallel, the source is read once
+
+        Json Body Required:
+            kernel_ids(list[str]): kernels to execute on
+            path(str) and cell_id(str): cell to be executed
+            OR
+            code(str): just execute the code here
+
+        Optional:
+            parameters(dict): kernel id -> code executed on that kernel right before, e.g. to set parameters
+            targets(dict): kernel id of kernel_ids -> {"path": ..., "cell_id": ...} to write that kernel's result to,
+                           cell_id defaults to the executed cell, kernels without a target write nothing
+            concurrency(int): kernels executing at once, default to all of them
+            stream(bool): default to False, True means response each kernel's result as it finishes,
+                          as Server-Sent Events or JSON lines, see POST /api/kernels/{kernel_id}/execute,
+                          the last record is a done record
+            priority(int): default to 0, see POST /api/kernels/{kernel_id}/execute
+            timeout(float): seconds the code may run on each kernel, see POST /api/kernels/{kernel_id}/execute
+
+        Response results by kernel id, with status ok, error, timeout, cancelled,
+        rejected(too many executions waiting for the kernel) or failed
+        """
+        model = self.get_json_body() or dict()
+        kernel_ids = model.get('kernel_ids')
+        if not isinstance(kernel_ids, list) or not kernel_ids:
+            raise tornado.web.HTTPError(400, "kernel_ids should be a non-empty list")
+        kernel_ids = list(dict.fromkeys(kernel_ids))
+        missing = [kernel_id for kernel_id in kernel_ids if not self.kernel_manager.get_kernel(kernel_id)]
+        if missing:
+            raise tornado.web.HTTPError(404, f"No such kernel {', '.join(missing)}")
+
+        path = model.get('path')
+        cell_id = model.get('cell_id')
+        code = model.get('code') or await self.read_code_from_ipynb(self.index(path), cell_id)
+        if code is None:
+            if path and cell_id:
+                raise tornado.web.HTTPError(404, f"No such file {path} or cell {cell_id}")
+            raise tornado.web.HTTPError(400, "code, or path and cell_id are required")
+        parameters = model.get('parameters') or dict()
+        targets = model.get('targets') or dict()
+        if not isinstance(targets, dict):
+            raise tornado.web.HTTPError(400, "targets should be an object of kernel id -> target")
+        unknown = [kernel_id for kernel_id in targets if kernel_id not in kernel_ids]
+        if unknown:
+            raise tornado.web.HTTPError(400, f"targets of kernels not in kernel_ids: {', '.join(unknown)}")
+        targets = {kernel_id: self.get_target(target, cell_id) for kernel_id, target in targets.items()}
+        concurrency = model.get('concurrency') or len(kernel_ids)
+        if not isinstance(concurrency, int) or concurrency < 1:
+            raise tornado.web.HTTPError(400, "concurrency should be a positive integer")
+        priority = self.get_priority(model)
+        timeout = self.get_timeout(model)
+
+        limit = asyncio.Semaphore(concurrency)
+
+        async def execute_on(kernel_id):
+            async with limit:
+                return kernel_id, await self.execute_on(
+                    kernel_id, code, parameters.get(kernel_id), targets.get(kernel_id), priority, timeout,
+                )
+
+        executions = [execute_on(kernel_id) for kernel_id in kernel_ids]
+        if not model.get('stream'):
+            results = dict(await asyncio.gather(*executions))
+            return await self.finish(json.dumps({'results': results}))
+
+        self.start_stream()
+        statuses = dict()
+        for execution in asyncio.as_completed(executions):
+            kernel_id, result = await execution
+            statuses[result['status']] = statuses.get(result['status'], 0) + 1
+            await self.send_record({'type': 'result', 'kernel_id': kernel_id, **result})
+        await self.send_record({'type': 'done', 'statuses': statuses})
+        await self.finish_stream()
+
+    def get_target(self, target, cell_id):
+        if not isinstance(target, dict) or not target.get('path') or not (target.get('cell_id') or cell_id):
+            raise tornado.web.HTTPError(400, "target should have a path, and a cell_id unless executing a cell")
+        document_id = self.index(target['path'])
+        if not document_id:
+            raise tornado.web.HTTPError(404, f"No such file {target['path']}")
+        return document_id, target.get('cell_id') or cell_id, target['path']
+
+    async def execute_on(self, kernel_id, code, parameters, target, priority, timeout) -> dict:
+        document_id, cell_id, path = target or (None, None, None)
+        try:
+            # parameters and code take one place in the kernel's queue, nothing runs between them
+            ticket = self.scheduler.enqueue(kernel_id, priority, document_id, cell_id)
+        except QueueFull as e:
+            return {'status': 'rejected', 'error': str(e)}
+        try:
+            if parameters:
+                result = await self.execute(
+                    self.create_client(kernel_id), parameters, None, None, ticket=ticket, timeout=timeout,
+                )
+                if self.result_status(result) != 'ok':
+                    return {**result, 'status': self.result_status(result)}
+            result = await self.execute(
+                self.create_client(kernel_id), code, document_id, cell_id, ticket=ticket, timeout=timeout, path=path,
+            )
+            if target:
+                await self.write_output(document_id, cell_id, result, wait=False)
+            return {**result, 'status': self.result_status(result)}
+        except Exception as e:
+            self.log.error(f'Exception when executing on kernel {kernel_id}')
+            self.log.exception(e)
+            return {'status': 'failed', 'error': str(e)}
+        finally:
+            ticket.release()
+
+
+class RunHandler(APIHandler):
+    @tornado.web.authenticated
+    async def get(self, run_id):
+        """a run by id, of this server or of a previous one when journaled, whichever kernel ran it"""
+        run = self.settings["kernel_executor_runs"].get(run_id)
+        if not run:
+            raise tornado.web.HTTPError(404, f"No such run {run_id}")
+        await self.finish(json.dumps(run.to_model()))
+
+
+class ExecutionHistoryHandler(BaseExecuteHandler):
+    max_limit = 1000
+
+    @tornado.web.authenticated
+    async def get(self, summary=None):
+        """
+        finished executions, newest first, filtered by query arguments
+            kernel_id, path or document_id, cell_id, status: equal to
+            since, until(ISO 8601, UTC unless told): finished within
+            min_seconds: executed at least that long
+            limit(int): executions per page, default to 100
+            before(int): `next` of the previous page
+
+        or with /summary, executions grouped by=cell|document|kernel, the top `limit`(default to 20) groups
+        ordered by order=seconds(total execute seconds)|count|max(longest execution)|bytes(outputs)
+        """
+        filters = self.get_filters()
+        if filters is None:
+            # a file never indexed was never executed
+            await self.finish(json.dumps([] if summary else {"executions": [], "next": None}))
+            return
+        if summary:
+            by = self.get_query_argument('by', 'cell')
+            order = self.get_query_argument('order', 'seconds')
+            if by not in GROUPS or order not in SUMMARY_ORDERS:
+                raise tornado.web.HTTPError(400, f"by should be one of {list(GROUPS)}, "
+                                                 f"order one of {list(SUMMARY_ORDERS)}")
+            await self.finish(json.dumps(self.history.summary(
+                by=by, order=order, limit=self.get_limit(20), **filters,
+            )))
+            return
+        executions, next_before = self.history.query(
+            before=self.get_number('before', int), limit=self.get_limit(100), **filters,
+        )
+        await self.finish(json.dumps({"executions": executions, "next": next_before}))
+
+    def get_filters(self) -> Optional[dict]:
+        """filters of the query, None when its path is unknown"""
+        document_id = self.get_query_argument('document_id', None)
+        path = self.get_query_argument('path', None)
+        if path is not None:
+            document_id = self.file_id_manager.find_id(path)
+            if document_id is None:
+                return None
+        filters = {
+            'kernel_id': self.get_query_argument('kernel_id', None),
+            'document_id': document_id,
+            'cell_id': self.get_query_argument('cell_id', None),
+            'status': self.get_query_argument('status', None),
+            'min_seconds': self.get_number('min_seconds', float),
+        }
+        for key in ('since', 'until'):
+            value = self.get_query_argument(key, None)
+            try:
+                filters[key] = to_timestamp(value) if value else None
+            except ValueError:
+                raise tornado.web.HTTPError(400, f"{key} should be an ISO 8601 time")
+        return filters
+
+    def get_number(self, name, number_type, default=None):
+        value = self.get_query_argument(name, None)
+        if value is None:
+            return default
+        try:
+            return number_type(value)
+        except ValueError:
+            raise tornado.web.HTTPError(400, f"{name} should be a number")
+
+    def get_limit(self, default):
+        return max(1, min(self.get_number('limit', int, default), self.max_limit))
+
+
+class ExecutorStatsHandler(APIHandler):
+    @tornado.web.authenticated
+    async def get(self):
+        await self.finish(json.dumps({
+            "document_locks": self.settings["kernel_executor_document_locks"].stats(),
+            "write_buffer": self.settings["kernel_executor_write_buffer"].stats(),
+            "notebook_cache": self.settings["kernel_executor_notebook_cache"].stats(),
+            "scheduler": self.settings["kernel_executor_scheduler"].stats(),
+            "file_id_cache": self.settings["kernel_executor_file_id_cache"].stats(),
+            "result_cache": self.settings["kernel_executor_result_cache"].stats(),
+            "warm_pool": self.settings["kernel_executor_warm_pool"].stats(),
+            "journal": self.settings["kernel_executor_journal"].stats(),
+            "history": self.settings["kernel_executor_history"].stats(),
+        }))
+
+
+class ExecutorMetricsHandler(JupyterHandler):
+    @tornado.web.authenticated
+    def get(self):
+        """Prometheus metrics of the extension, also part of the server's /metrics"""
+        self.set_header('Content-Type', metrics.CONTENT_TYPE)
+        self.write(metrics.latest())
+
+
+class SpilledOutputHandler(AuthenticatedFileHandler):
+    """outputs beyond OutputLimits, Range requests fetch a part of them"""
+
+    def initialize(self):
+        super().initialize(self.settings["kernel_executor_output_limits"].spill_dir)
+
+
+class BlobHandler(AuthenticatedFileHandler):
+    """
+    binary outputs offloaded to the blob store, by sha256
+
+    Served as the content type given by `type` when it's one of BlobStore.mime_types.
+    """
+
+    def initialize(self):
+        super().initialize(self.blob_store.root_dir)
+
+    @property
+    def blob_store(self) -> BlobStore:
+        return self.settings["kernel_executor_blob_store"]
+
+    def get(self, digest, **kwargs):
+        return super().get(self.blob_store.relative_path(digest), **kwargs)
+
+    def get_content_type(self):
+        content_type = self.get_argument('type', None)
+        if content_type in self.blob_store.mime_types:
+            return content_type
+        return 'application/octet-stream'
 
 
 def setup_handlers(web_app):
@@ -248,5 +1285,17 @@ def setup_handlers(web_app):
     _kernel_id_regex = r"(?P<kernel_id>\w+-\w+-\w+-\w+-\w+)"
     handlers = [
         (rf"{base_url}/api/kernels/{_kernel_id_regex}/execute", ExecuteCellHandler),
+        (rf"{base_url}/api/kernels/{_kernel_id_regex}/execute/wait", ExecuteWaitHandler),
+        (rf"{base_url}/api/kernels/{_kernel_id_regex}/runs", ExecuteRunHandler),
+        (rf"{base_url}/api/kernels/{_kernel_id_regex}/runs/(?P<run_id>[\w-]+)", ExecuteRunHandler),
+        (rf"{base_url}/api/kernel_executor/execute", FanOutExecuteHandler),
+        (rf"{base_url}/api/kernel_executor/kernelspecs/(?P<kernel_name>[\w\.\-%]+)/execute", WarmExecuteHandler),
+        (rf"{base_url}/api/kernel_executor/runs/(?P<run_id>[\w-]+)", RunHandler),
+        (rf"{base_url}/api/kernel_executor/events", ExecutionEventsHandler),
+        (rf"{base_url}/api/kernel_executor/history(?P<summary>/summary)?", ExecutionHistoryHandler),
+        (rf"{base_url}/api/kernel_executor/stats", ExecutorStatsHandler),
+        (rf"{base_url}/api/kernel_executor/metrics", ExecutorMetricsHandler),
+        (rf"{base_url}/api/kernel_executor/outputs/(.*)", SpilledOutputHandler),
+        (rf"{base_url}/api/kernel_executor/blobs/([0-9a-f]{{64}})", BlobHandler),
     ]
     web_app.add_handlers(host_pattern, handlers)
@@ -0,0 +1,277 @@
+import asyncio
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from jupyter_core.paths import jupyter_data_dir
+from traitlets import Bool, Float, Integer, Unicode, default
+from traitlets.config import LoggingConfigurable
+
+COLUMNS = (
+    'kernel_id', 'document_id', 'cell_id', 'path', 'status', 'execution_count',
+    'queued', 'started', 'finished', 'queue_seconds', 'execute_seconds', 'output_bytes', 'truncated_bytes',
+)
+TIME_COLUMNS = ('queued', 'started', 'finished')
+
+# summary grouping -> columns grouped by
+GROUPS = {
+    'kernel': ('kernel_id',),
+    'document': ('document_id',),
+    'cell': ('document_id', 'cell_id'),
+}
+# summary order -> aggregate sorted by, descending
+SUMMARY_ORDERS = {
+    'seconds': 'seconds',
+    'count': 'executions',
+    'max': 'max_seconds',
+    'bytes': 'output_bytes',
+}
+
+
+def to_timestamp(value: str) -> float:
+    """seconds since epoch of an ISO 8601 time, UTC unless it tells"""
+    moment = datetime.fromisoformat(value[:-1] if value.endswith('Z') else value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def to_iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.utcfromtimestamp(timestamp).isoformat() + 'Z'
+
+
+class ExecutionHistory(LoggingConfigurable):
+    """
+    SQLite history of finished executions: timings, status, execution_count and output sizes
+
+    Executions are buffered in memory and inserted together once per `flush_delay`,
+    or right away once `max_pending` are waiting, so recording one costs an append to a list.
+    Entries older than `retention` or beyond the newest `max_entries` are pruned on every flush.
+    Queries filter on kernel, document, cell and time, which are indexed, and page from newest to oldest.
+    """
+
+    enabled = Bool(
+        True, config=True,
+        help="Keep a history of finished executions"
+    )
+    db_path = Unicode(
+        config=True,
+        help="Path of the history's SQLite database"
+    )
+    retention = Float(
+        30 * 24 * 3600, config=True,
+        help="Seconds executions are kept in the history, 0 to keep them until max_entries"
+    )
+    max_entries = Integer(
+        1000000, config=True,
+        help="Executions kept in the history, the oldest are pruned beyond, 0 for no limit"
+    )
+    flush_delay = Float(
+        1, config=True,
+        help="Seconds to gather finished executions before inserting them in one transaction"
+    )
+    max_pending = Integer(
+        500, config=True,
+        help="Insert right away once this many finished executions are waiting"
+    )
+
+    @default('db_path')
+    def _default_db_path(self):
+        return os.path.join(jupyter_data_dir(), 'kernel_executor', 'history.db')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.con: Optional[sqlite3.Connection] = None
+        self.pending: List[Tuple] = []
+        self.task: Optional[asyncio.Task] = None
+        self.flush_now: Optional[asyncio.Event] = None
+        self.recorded = 0
+        self.pruned = 0
+        if self.enabled:
+            self.open()
+
+    def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.con = sqlite3.connect(self.db_path, isolation_level=None)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        # losing the last executions on power failure is fine for a history
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS executions ("
+            "id INTEGER PRIMARY KEY, "
+            "kernel_id TEXT NOT NULL, "
+            "document_id TEXT, "
+            "cell_id TEXT, "
+            "path TEXT, "
+            "status TEXT NOT NULL, "
+            "execution_count INTEGER, "
+            "queued REAL NOT NULL, "
+            "started REAL, "
+            "finished REAL NOT NULL, "
+            "queue_seconds REAL NOT NULL, "
+            "execute_seconds REAL NOT NULL, "
+            "output_bytes INTEGER NOT NULL, "
+            "truncated_bytes INTEGER NOT NULL)"
+        )
+        # secondary indexes end with the rowid, so filtering on them still pages by id
+        self.con.execute("CREATE INDEX IF NOT EXISTS ix_history_kernel ON executions (kernel_id)")
+        self.con.execute("CREATE INDEX IF NOT EXISTS ix_history_cell ON executions (document_id, cell_id)")
+        self.con.execute("CREATE INDEX IF NOT EXISTS ix_history_finished ON executions (finished)")
+
+    def add(self, kernel_id, document_id, cell_id, path, status, execution_count, queued, started, finished,
+            output_bytes=0, truncated_bytes=0):
+        """
+        record a finished execution, times in seconds since epoch
+
+        started is None when it never ran, e.g. cancelled while queued
+        """
+        if self.con is None:
+            return
+        queue_seconds = (started if started is not None else finished) - queued
+        execute_seconds = finished - started if started is not None else 0
+        self.pending.append((
+            kernel_id, document_id, cell_id, path, status, execution_count,
+            queued, started, finished, queue_seconds, execute_seconds, output_bytes, truncated_bytes,
+        ))
+        if not self.task or self.task.done():
+            self.flush_now = asyncio.Event()
+            self.task = asyncio.ensure_future(self.run())
+        if len(self.pending) >= self.max_pending:
+            self.flush_now.set()
+
+    async def run(self):
+        while self.pending:
+            try:
+                await asyncio.wait_for(self.flush_now.wait(), self.flush_delay)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_now.clear()
+            self.flush()
+
+    def flush(self):
+        """insert pending executions in one transaction, then prune"""
+        if self.con is None or not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        placeholders = ', '.join('?' * len(COLUMNS))
+        try:
+            with self.con:
+                self.con.execute("BEGIN")
+                self.con.executemany(
+                    f"INSERT INTO executions ({', '.join(COLUMNS)}) VALUES ({placeholders})", pending,
+                )
+                self.prune()
+        except sqlite3.Error as e:
+            # a history is not worth failing executions for
+            self.log.error(f'Exception when recording {len(pending)} execution(s) in the history, dropped: {e}')
+            return
+        self.recorded += len(pending)
+
+    def prune(self):
+        if self.retention:
+            self.pruned += self.con.execute(
+                "DELETE FROM executions WHERE finished < ?", (time.time() - self.retention,),
+            ).rowcount
+        if self.max_entries:
+            self.pruned += self.con.execute(
+                "DELETE FROM executions WHERE id <= (SELECT MAX(id) FROM executions) - ?", (self.max_entries,),
+            ).rowcount
+
+    def where(self, kernel_id=None, document_id=None, cell_id=None, status=None, since=None, until=None,
+              min_seconds=None) -> Tuple[List[str], List]:
+        conditions, parameters = [], []
+        for column, value in (
+                ('kernel_id = ?', kernel_id), ('document_id = ?', document_id), ('cell_id = ?', cell_id),
+                ('status = ?', status), ('finished >= ?', since), ('finished < ?', until),
+                ('execute_seconds >= ?', min_seconds),
+        ):
+            if value is not None:
+                conditions.append(column)
+                parameters.append(value)
+        return conditions, parameters
+
+    def query(self, before=None, limit=100, **filters) -> Tuple[List[dict], Optional[int]]:
+        """
+        executions matching filters, newest first, and the `before` of the next page, None on the last one
+
+        filters: kernel_id, document_id, cell_id, status, since/until(seconds since epoch, on finished),
+        min_seconds(of execute_seconds)
+        """
+        if self.con is None:
+            return [], None
+        # seen as soon as finished
+        self.flush()
+        conditions, parameters = self.where(**filters)
+        if before is not None:
+            conditions.append('id < ?')
+            parameters.append(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self.con.execute(
+            f"SELECT id, {', '.join(COLUMNS)} FROM executions {where} ORDER BY id DESC LIMIT ?",
+            (*parameters, limit + 1),
+        ).fetchall()
+        entries = []
+        for row in rows[:limit]:
+            entry = dict(zip(('id', *COLUMNS), row))
+            for column in TIME_COLUMNS:
+                entry[column] = to_iso(entry[column])
+            entries.append(entry)
+        next_before = entries[-1]['id'] if len(rows) > limit else None
+        return entries, next_before
+
+    def summary(self, by='cell', order='seconds', limit=20, **filters) -> List[dict]:
+        """
+        executions grouped by kernel, document or cell, the top `limit` groups by total execute seconds,
+        count, max execute seconds or output bytes
+        """
+        if self.con is None:
+            return []
+        self.flush()
+        group = GROUPS[by]
+        conditions, parameters = self.where(**filters)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        columns = ', '.join(group)
+        rows = self.con.execute(
+            f"SELECT {columns}, MAX(path), COUNT(*) AS executions, "
+            "SUM(CASE WHEN status = 'ok' THEN 0 ELSE 1 END), "
+            "SUM(execute_seconds) AS seconds, AVG(execute_seconds), MAX(execute_seconds) AS max_seconds, "
+            "SUM(queue_seconds), SUM(output_bytes) AS output_bytes, MAX(finished) "
+            f"FROM executions {where} GROUP BY {columns} ORDER BY {SUMMARY_ORDERS[order]} DESC LIMIT ?",
+            (*parameters, limit),
+        ).fetchall()
+        keys = (
+            *group, 'path', 'executions', 'failures', 'execute_seconds', 'mean_seconds', 'max_seconds',
+            'queue_seconds', 'output_bytes', 'last_finished',
+        )
+        groups = []
+        for row in rows:
+            entry = dict(zip(keys, row))
+            entry['last_finished'] = to_iso(entry['last_finished'])
+            if by == 'kernel':
+                del entry['path']
+            groups.append(entry)
+        return groups
+
+    async def close(self):
+        if self.task and not self.task.done():
+            # flushes what is pending, then ends
+            self.flush_now.set()
+            await self.task
+        self.flush()
+        if self.con is not None:
+            self.con.close()
+            self.con = None
+
+    def stats(self):
+        if self.con is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "pending": len(self.pending),
+            "recorded": self.recorded,
+            "pruned": self.pruned,
+        }
@@ -0,0 +1,299 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import nbformat
+from jupyter_core.paths import jupyter_data_dir
+from traitlets import Bool, Float, Integer, Unicode, default
+from traitlets.config import LoggingConfigurable
+
+from jupyter_kernel_executor.outputs import OutputLimits
+
+RUNNING = 'running'
+COMPLETED = 'completed'
+
+# save(document_id, path, {cell_id: result}) writes results into the notebook
+Save = Callable[[str, str, Dict[str, dict]], Awaitable[None]]
+
+
+class ExecutionJournal(LoggingConfigurable):
+    """
+    Append-only SQLite journal of results written behind, and of runs
+
+    An execution is recorded when it starts, its outputs as they arrive, then its result once complete,
+    and dropped once saved into its notebook. Executions still there on startup are replayed into their notebooks,
+    those cut off while running end with an ExecutionInterrupted error.
+    Runs are kept for `run_retention` to be queried by id after a restart, unfinished ones are marked failed.
+    Entries and runs belong to the server of `root_dir`, servers of other roots sharing the database leave them alone.
+
+    Outputs are buffered and inserted together once per `flush_delay`, or right away once `max_pending` are waiting,
+    so an output costs an append to a list on the event loop.
+    The database is in WAL mode with synchronous=NORMAL: it survives the server crashing,
+    the last transactions, and outputs of the last `flush_delay`, may be lost.
+    """
+
+    enabled = Bool(
+        False, config=True,
+        help="Journal results written behind and runs, to replay and query them after a restart"
+    )
+    db_path = Unicode(
+        config=True,
+        help="Path of the journal's SQLite database"
+    )
+    run_retention = Float(
+        7 * 24 * 3600, config=True,
+        help="Seconds finished runs are kept in the journal, 0 to keep them forever"
+    )
+    flush_delay = Float(
+        0.5, config=True,
+        help="Seconds to gather outputs of executions before inserting them in one transaction"
+    )
+    max_pending = Integer(
+        500, config=True,
+        help="Insert right away once this many outputs are waiting"
+    )
+    root_dir = Unicode(
+        help="Root directory of the server the journal's entries and runs belong to"
+    )
+
+    @default('db_path')
+    def _default_db_path(self):
+        return os.path.join(jupyter_data_dir(), 'kernel_executor', 'journal.db')
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.con: Optional[sqlite3.Connection] = None
+        # (entry id, output) waiting to be inserted
+        self.pending: List[Tuple[int, str]] = []
+        self.task: Optional[asyncio.Task] = None
+        self.flush_now: Optional[asyncio.Event] = None
+        if self.enabled:
+            self.open()
+
+    def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        # autocommit, every statement is a transaction of its own
+        self.con = sqlite3.connect(self.db_path, isolation_level=None)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS executions ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "root_dir TEXT NOT NULL, "
+            "kernel_id TEXT, "
+            "document_id TEXT NOT NULL, "
+            "path TEXT, "
+            "cell_id TEXT NOT NULL, "
+            "request TEXT, "
+            "status TEXT NOT NULL, "
+            "result TEXT, "
+            "created REAL NOT NULL, "
+            "updated REAL NOT NULL)"
+        )
+        self.con.execute("CREATE INDEX IF NOT EXISTS ix_executions_root ON executions (root_dir)")
+        self.con.execute("CREATE INDEX IF NOT EXISTS ix_executions_cell ON executions (document_id, cell_id)")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS outputs (execution_id INTEGER NOT NULL, output TEXT NOT NULL)"
+        )
+        self.con.execute("CREATE INDEX IF NOT EXISTS ix_outputs_execution ON outputs (execution_id)")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, root_dir TEXT NOT NULL, model TEXT NOT NULL, "
+            "finished REAL)"
+        )
+        self.con.execute("CREATE INDEX IF NOT EXISTS ix_runs_finished ON runs (finished)")
+
+    def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        self.flush()
+        if self.con is not None:
+            self.con.close()
+            self.con = None
+
+    def start(self, kernel_id, document_id, path, cell_id, request=None) -> Optional[int]:
+        """record an execution starting, return its entry id"""
+        if self.con is None:
+            return None
+        now = time.time()
+        cursor = self.con.execute(
+            "INSERT INTO executions (root_dir, kernel_id, document_id, path, cell_id, request, status, created, "
+            "updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.root_dir, kernel_id, document_id, path, cell_id, json.dumps(request), RUNNING, now, now),
+        )
+        return cursor.lastrowid
+
+    def output(self, entry_id, output):
+        if self.con is None or entry_id is None:
+            return
+        self.pending.append((entry_id, json.dumps(output)))
+        if not self.task or self.task.done():
+            self.flush_now = asyncio.Event()
+            self.task = asyncio.ensure_future(self.run())
+        if len(self.pending) >= self.max_pending:
+            self.flush_now.set()
+
+    async def run(self):
+        while self.pending:
+            try:
+                await asyncio.wait_for(self.flush_now.wait(), self.flush_delay)
+            except asyncio.TimeoutError:
+                pass
+            self.flush_now.clear()
+            self.flush()
+
+    def flush(self):
+        """insert pending outputs in one transaction"""
+        if self.con is None or not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        with self.con:
+            self.con.execute("BEGIN")
+            self.con.executemany("INSERT INTO outputs (execution_id, output) VALUES (?, ?)", pending)
+
+    def record(self, document_id, path, cell_id, result, entry_id=None) -> Optional[int]:
+        """
+        record the result of a cell waiting to be saved, completing entry_id if given, return its entry id
+
+        older results of the cell waiting to be saved are replaced by this one
+        """
+        if self.con is None:
+            return None
+        now = time.time()
+        result = {'outputs': result['outputs'], 'execution_count': result['execution_count']}
+        # outputs are dropped along, in order
+        self.flush()
+        with self.con:
+            self.con.execute("BEGIN")
+            updated = entry_id is not None and self.con.execute(
+                "UPDATE executions SET status = ?, result = ?, updated = ? WHERE id = ?",
+                (COMPLETED, json.dumps(result), now, entry_id),
+            ).rowcount
+            if not updated:
+                # new, or saved and dropped already
+                entry_id = self.con.execute(
+                    "INSERT INTO executions (id, root_dir, document_id, path, cell_id, status, result, created, "
+                    "updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (entry_id, self.root_dir, document_id, path, cell_id, COMPLETED, json.dumps(result), now, now),
+                ).lastrowid
+            self.con.execute("DELETE FROM outputs WHERE execution_id = ?", (entry_id,))
+            self.con.execute(
+                "DELETE FROM executions WHERE document_id = ? AND cell_id = ? AND id < ? AND status = ?",
+                (document_id, cell_id, entry_id, COMPLETED),
+            )
+        return entry_id
+
+    def written(self, entry_ids: List[int]):
+        """drop entries saved into their notebook, or not to be saved"""
+        entry_ids = [entry_id for entry_id in entry_ids if entry_id is not None]
+        if self.con is None or not entry_ids:
+            return
+        placeholders = ', '.join('?' * len(entry_ids))
+        self.flush()
+        with self.con:
+            self.con.execute("BEGIN")
+            self.con.execute(f"DELETE FROM outputs WHERE execution_id IN ({placeholders})", entry_ids)
+            self.con.execute(f"DELETE FROM executions WHERE id IN ({placeholders})", entry_ids)
+
+    def unwritten(self) -> List[dict]:
+        """entries not saved yet in order, with the result of interrupted ones made of their outputs so far"""
+        if self.con is None:
+            return []
+        self.flush()
+        entries = []
+        rows = self.con.execute(
+            "SELECT id, document_id, path, cell_id, status, result FROM executions WHERE root_dir = ? ORDER BY id",
+            (self.root_dir,),
+        ).fetchall()
+        for entry_id, document_id, path, cell_id, status, result in rows:
+            if status == COMPLETED:
+                result = json.loads(result)
+            else:
+                result = self.interrupted_result(entry_id)
+            entries.append({
+                'id': entry_id,
+                'document_id': document_id,
+                'path': path,
+                'cell_id': cell_id,
+                'result': result,
+            })
+        return entries
+
+    def interrupted_result(self, entry_id):
+        # stream chunks as they arrived, merged again
+        collector = OutputLimits(max_stream_bytes=0, max_output_bytes=0, spill=False).collector()
+        for output, in self.con.execute("SELECT output FROM outputs WHERE execution_id = ? ORDER BY rowid", (entry_id,)):
+            collector.add(nbformat.from_dict(json.loads(output)))
+        return {
+            'outputs': [*collector.outputs, nbformat.v4.new_output(
+                'error', ename='ExecutionInterrupted', evalue='execution interrupted by a server restart',
+                traceback=[],
+            )],
+            'execution_count': None,
+        }
+
+    async def replay(self, save: Save):
+        """save results left unsaved by the previous server into their notebooks, one save per notebook"""
+        documents: Dict[str, List[dict]] = dict()
+        for entry in self.unwritten():
+            documents.setdefault(entry['document_id'], []).append(entry)
+        for document_id, entries in documents.items():
+            # the newest result of a cell wins
+            updates = {entry['cell_id']: entry['result'] for entry in entries}
+            try:
+                await save(document_id, entries[-1]['path'], updates)
+            except Exception as e:
+                self.log.error(f'Exception when replaying {len(updates)} cell(s) into {document_id}, kept for next start')
+                self.log.exception(e)
+                continue
+            self.log.info(f'replayed {len(updates)} cell(s) into {entries[-1]["path"]}')
+            self.written([entry['id'] for entry in entries])
+
+    def save_run(self, model):
+        if self.con is None:
+            return
+        finished = time.time() if model['finished'] else None
+        self.con.execute(
+            "INSERT OR REPLACE INTO runs (run_id, root_dir, model, finished) VALUES (?, ?, ?, ?)",
+            (model['run_id'], self.root_dir, json.dumps(model), finished),
+        )
+
+    def get_run(self, run_id) -> Optional[dict]:
+        if self.con is None:
+            return None
+        row = self.con.execute("SELECT model FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def interrupt_runs(self, finished: str):
+        """mark runs the previous server of root_dir didn't finish as failed"""
+        if self.con is None:
+            return
+        rows = self.con.execute(
+            "SELECT model FROM runs WHERE root_dir = ? AND finished IS NULL", (self.root_dir,),
+        ).fetchall()
+        for model, in rows:
+            model = json.loads(model)
+            model.update(status='failed', error='interrupted by a server restart', finished=finished)
+            for cell in model['cells']:
+                if cell['status'] in ('pending', 'running'):
+                    cell['status'] = 'skipped'
+            self.save_run(model)
+
+    def prune_runs(self):
+        if self.con is None or not self.run_retention:
+            return
+        self.con.execute("DELETE FROM runs WHERE finished < ?", (time.time() - self.run_retention,))
+
+    def stats(self):
+        if self.con is None:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "unwritten": self.con.execute(
+                "SELECT COUNT(*) FROM executions WHERE root_dir = ?", (self.root_dir,),
+            ).fetchone()[0],
+            "runs": self.con.execute("SELECT COUNT(*) FROM runs WHERE root_dir = ?", (self.root_dir,)).fetchone()[0],
+            "pending_outputs": len(self.pending),
+        }
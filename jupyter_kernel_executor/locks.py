@@ -0,0 +1,63 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+
+class KeyedLock:
+    """
+    One asyncio.Lock per key(e.g. document id), so only work on the same key is serialized
+
+    Locks are dropped once nobody holds or waits for them.
+
+    Example:
+        > async with locks(document_id):
+        >     ...
+    """
+
+    def __init__(self):
+        self.locks: Dict[str, asyncio.Lock] = dict()
+        # holders and waiters of each lock
+        self.users: Dict[str, int] = dict()
+        self.waiting = 0
+        self.acquired = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @asynccontextmanager
+    async def __call__(self, key):
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        self.users[key] = self.users.get(key, 0) + 1
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            await lock.acquire()
+        except BaseException:
+            self.waiting -= 1
+            self._release_user(key)
+            raise
+        self.waiting -= 1
+        waited = time.monotonic() - start
+        self.acquired += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        try:
+            yield
+        finally:
+            lock.release()
+            self._release_user(key)
+
+    def _release_user(self, key):
+        self.users[key] -= 1
+        if not self.users[key]:
+            del self.users[key]
+            del self.locks[key]
+
+    def stats(self):
+        return {
+            "locks": len(self.locks),
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
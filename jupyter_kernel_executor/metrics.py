@@ -0,0 +1,99 @@
+"""
+Prometheus metrics of the extension, named after https://prometheus.io/docs/practices/naming/
+
+Collected in their own registry, served at /api/kernel_executor/metrics,
+and registered in the default one the server exposes at /metrics once the extension is loaded.
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+import prometheus_client
+from prometheus_client import CONTENT_TYPE_LATEST as CONTENT_TYPE, CollectorRegistry, Counter, Gauge, Histogram
+
+PHASE_NOTEBOOK_READ = 'notebook_read'
+PHASE_PATH_RESOLUTION = 'path_resolution'
+PHASE_CLIENT_CONNECT = 'client_connect'
+PHASE_KERNEL_EXECUTE = 'kernel_execute'
+PHASE_WRITE_BACK = 'write_back'
+PHASE_FILE_WATCHER = 'file_watcher'
+
+REGISTRY = CollectorRegistry()
+
+PHASE_SECONDS = Histogram(
+    "kernel_executor_phase_seconds",
+    "duration in seconds of each phase of executions, labeled by phase",
+    ["phase"],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300, float('inf')),
+    registry=REGISTRY,
+)
+
+RUNNING_EXECUTIONS = Gauge(
+    "kernel_executor_running_executions",
+    "executions running on each kernel, not waiting in its queue",
+    ["kernel_id"],
+    registry=REGISTRY,
+)
+
+LOCK_WAITERS = Gauge(
+    "kernel_executor_lock_waiters",
+    "executions and writes waiting for a document lock",
+    registry=REGISTRY,
+)
+
+ERRORS = Counter(
+    "kernel_executor_errors",
+    "executions ended by an error output, timeout, cancellation or exception, and failed writes, labeled by kind",
+    ["kind"],
+    registry=REGISTRY,
+)
+
+SKIPPED_DUPLICATES = Counter(
+    "kernel_executor_skipped_duplicates",
+    "requests to execute a cell already executing on the kernel",
+    registry=REGISTRY,
+)
+
+_registered = False
+_running: Dict[str, int] = dict()
+
+
+def register():
+    """expose the extension's metrics at the server's /metrics too, once per process"""
+    global _registered
+    if not _registered:
+        prometheus_client.REGISTRY.register(REGISTRY)
+        _registered = True
+
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.labels(phase).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def running(kernel_id):
+    """count an execution running on kernel_id, its series is dropped once none runs"""
+    _running[kernel_id] = _running.get(kernel_id, 0) + 1
+    RUNNING_EXECUTIONS.labels(kernel_id).inc()
+    try:
+        yield
+    finally:
+        _running[kernel_id] -= 1
+        if _running[kernel_id]:
+            RUNNING_EXECUTIONS.labels(kernel_id).dec()
+        else:
+            del _running[kernel_id]
+            RUNNING_EXECUTIONS.remove(kernel_id)
+
+
+def count_error(kind):
+    ERRORS.labels(kind).inc()
+
+
+def latest() -> bytes:
+    return prometheus_client.generate_latest(REGISTRY)
@@ -0,0 +1,111 @@
+import os
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Any
+
+import tornado.web
+from jupyter_server.utils import ensure_async
+from traitlets import Integer
+from traitlets.config import LoggingConfigurable
+
+from jupyter_kernel_executor import metrics
+
+
+class CachedNotebook:
+    __slots__ = ('path', 'os_path', 'stamp', 'size', 'notebook', 'cells')
+
+    def __init__(self, path, os_path, stamp, size, notebook):
+        self.path = path
+        self.os_path = os_path
+        self.stamp = stamp
+        self.size = size
+        self.notebook = notebook
+        self.cells: Dict[str, Any] = {cell['id']: cell for cell in notebook['cells'] if 'id' in cell}
+
+
+class NotebookCache(LoggingConfigurable):
+    """
+    LRU of parsed notebooks keyed by document id
+
+    An entry is used only while the file's (inode, mtime, size) is unchanged,
+    so a hit costs one stat instead of reading and parsing the notebook.
+    """
+
+    max_bytes = Integer(
+        256 * 1024 * 1024, config=True,
+        help="Memory budget of cached notebooks, estimated by their file size. 0 to disable the cache"
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.entries: "OrderedDict[str, CachedNotebook]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def os_path(self, contents_manager, path) -> Optional[str]:
+        get_os_path = getattr(contents_manager, '_get_os_path', None)
+        if not get_os_path:
+            return None
+        try:
+            return get_os_path(path)
+        except Exception:
+            return None
+
+    async def stamp(self, contents_manager, path, os_path) -> Tuple:
+        if os_path:
+            try:
+                stat_info = os.stat(os_path)
+            except FileNotFoundError:
+                # as the contents manager would tell
+                raise tornado.web.HTTPError(404, f"No such file {path}")
+            return stat_info.st_ino, stat_info.st_mtime_ns, stat_info.st_size
+        # not on local disk, ask contents manager without content
+        model = await ensure_async(contents_manager.get(path, content=False, type='notebook'))
+        return None, model.get('last_modified'), model.get('size')
+
+    async def get(self, document_id, path, contents_manager) -> CachedNotebook:
+        os_path = self.os_path(contents_manager, path)
+        stamp = await self.stamp(contents_manager, path, os_path)
+        entry = self.entries.get(document_id)
+        if entry and entry.path == path and entry.stamp == stamp:
+            self.hits += 1
+            self.entries.move_to_end(document_id)
+            return entry
+
+        self.misses += 1
+        with metrics.timed(metrics.PHASE_NOTEBOOK_READ):
+            model = await ensure_async(contents_manager.get(path, content=True, type='notebook'))
+        entry = CachedNotebook(path, os_path, stamp, stamp[2] or model.get('size') or 0, model['content'])
+        self.invalidate(document_id)
+        if entry.size <= self.max_bytes:
+            self.entries[document_id] = entry
+            self.size += entry.size
+            self.evict()
+        return entry
+
+    def evict(self):
+        while self.size > self.max_bytes and self.entries:
+            _, entry = self.entries.popitem(last=False)
+            self.size -= entry.size
+            self.evictions += 1
+
+    def invalidate(self, document_id):
+        entry = self.entries.pop(document_id, None)
+        if entry:
+            self.size -= entry.size
+
+    def invalidate_path(self, os_path):
+        os_path = os.path.normcase(os.path.abspath(os_path))
+        for document_id, entry in list(self.entries.items()):
+            if entry.os_path and os.path.normcase(entry.os_path) == os_path:
+                self.invalidate(document_id)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
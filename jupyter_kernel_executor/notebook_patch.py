@@ -0,0 +1,192 @@
+"""
+Cell results written into a local .ipynb file without a round trip of the whole notebook through the contents manager
+
+The file is scanned for the spans of `outputs` and `execution_count` of the cells to update, only those are
+serialized again, everything else is copied as it is, then the file is written in place as the file contents manager
+does, keeping its inode, so its file id, symlinks and hard links are kept.
+"""
+import json
+import os
+import re
+from json.decoder import scanstring
+from typing import Any, Dict, List, Optional, Tuple
+
+import nbformat
+from jupyter_core.paths import is_hidden
+from jupyter_server.services.contents.fileio import atomic_writing
+from jupyter_server.services.contents.filemanager import AsyncFileContentsManager, FileContentsManager
+from jupyter_server.services.contents.largefilemanager import AsyncLargeFileManager, LargeFileManager
+from nbformat.v4.rwbase import rejoin_lines, split_lines
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+# save implementations only writing the file, others may write elsewhere too, e.g. paired scripts
+_LOCAL_SAVES = {
+    FileContentsManager.save, AsyncFileContentsManager.save, LargeFileManager.save, AsyncLargeFileManager.save,
+}
+
+# key -> (start of key, start of value, end of value)
+Spans = Dict[str, Tuple[int, int, int]]
+
+
+class PatchError(ValueError):
+    """the file is not a notebook this module can patch, save it through the contents manager"""
+
+
+def local_os_path(contents_manager, path) -> Optional[str]:
+    """path on disk of a notebook saved by writing its file only, None when saving must go through contents_manager"""
+    if not path.endswith('.ipynb') or type(contents_manager).save not in _LOCAL_SAVES:
+        return None
+    if contents_manager.pre_save_hook or contents_manager.post_save_hook:
+        return None
+    if contents_manager._pre_save_hooks or contents_manager._post_save_hooks:
+        return None
+    os_path = contents_manager._get_os_path(path)
+    if not contents_manager.allow_hidden and is_hidden(os_path, contents_manager.root_dir):
+        # refused by the contents manager
+        return None
+    return os_path
+
+
+def _skip_whitespace(text, idx) -> int:
+    return _whitespace.match(text, idx).end()
+
+
+def _expect(text, idx, char):
+    if text[idx:idx + 1] != char:
+        raise PatchError(f'expected {char!r} at {idx}')
+
+
+def _scan_value(text, idx) -> int:
+    try:
+        return _decoder.raw_decode(text, idx)[1]
+    except json.JSONDecodeError as e:
+        raise PatchError(str(e))
+
+
+def _scan_object(text, idx, scan_value=None) -> Tuple[Spans, int]:
+    """spans of the members of the object at idx and its end, scan_value(key, start) -> end of a member's value"""
+    _expect(text, idx, '{')
+    spans: Spans = dict()
+    idx = _skip_whitespace(text, idx + 1)
+    if text[idx:idx + 1] == '}':
+        return spans, idx + 1
+    while True:
+        _expect(text, idx, '"')
+        key_start = idx
+        try:
+            key, idx = scanstring(text, idx + 1)
+        except json.JSONDecodeError as e:
+            raise PatchError(str(e))
+        idx = _skip_whitespace(text, idx)
+        _expect(text, idx, ':')
+        start = _skip_whitespace(text, idx + 1)
+        end = scan_value(key, start) if scan_value else _scan_value(text, start)
+        spans[key] = (key_start, start, end)
+        idx = _skip_whitespace(text, end)
+        if text[idx:idx + 1] == '}':
+            return spans, idx + 1
+        _expect(text, idx, ',')
+        idx = _skip_whitespace(text, idx + 1)
+
+
+def _scan_cells(text, idx, cells: List[Spans]) -> int:
+    _expect(text, idx, '[')
+    idx = _skip_whitespace(text, idx + 1)
+    if text[idx:idx + 1] == ']':
+        return idx + 1
+    while True:
+        spans, idx = _scan_object(text, idx)
+        cells.append(spans)
+        idx = _skip_whitespace(text, idx)
+        if text[idx:idx + 1] == ']':
+            return idx + 1
+        _expect(text, idx, ',')
+        idx = _skip_whitespace(text, idx + 1)
+
+
+def scan_cells(text) -> List[Spans]:
+    """spans of the members of every cell of the notebook"""
+    cells: List[Spans] = []
+
+    def scan_value(key, start):
+        if key == 'cells':
+            return _scan_cells(text, start, cells)
+        return _scan_value(text, start)
+
+    _, end = _scan_object(text, _skip_whitespace(text, 0), scan_value)
+    if text[_skip_whitespace(text, end):].strip():
+        raise PatchError('extra data after the notebook')
+    return cells
+
+
+def _value(text, span) -> Any:
+    return json.loads(text[span[1]:span[2]])
+
+
+def _dumps(value, text, span) -> str:
+    """value serialized as nbformat writes it, indented as its key in the file"""
+    line_start = text.rfind('\n', 0, span[0]) + 1
+    prefix = text[line_start:span[0]]
+    if prefix.strip(' \t'):
+        # not one member per line, the file was not written by nbformat
+        return json.dumps(value, sort_keys=True, ensure_ascii=False)
+    dumped = json.dumps(value, indent=1, sort_keys=True, separators=(',', ': '), ensure_ascii=False)
+    return dumped.replace('\n', '\n' + prefix)
+
+
+def _as_written(outputs) -> List[dict]:
+    # multiline text is written as lists of lines
+    nb = nbformat.from_dict({'cells': [{'cell_type': 'code', 'outputs': outputs}]})
+    return split_lines(nb)['cells'][0]['outputs']
+
+
+def _as_read(outputs) -> List[dict]:
+    nb = nbformat.from_dict({'cells': [{'cell_type': 'code', 'outputs': outputs}]})
+    return rejoin_lines(nb)['cells'][0]['outputs']
+
+
+def patch_text(text, updates: Dict[str, Dict[str, Any]], blob_store) -> Optional[str]:
+    """text of the notebook with {cell_id: result} written in, None when nothing changes"""
+    cells = {}
+    for spans in scan_cells(text):
+        if 'id' in spans:
+            cells[_value(text, spans['id'])] = spans
+    replacements = []
+    for cell_id, result in updates.items():
+        spans = cells.get(cell_id)
+        if spans is None or 'outputs' not in spans or 'execution_count' not in spans:
+            raise PatchError(f'no code cell {cell_id}')
+        outputs = blob_store.offload(result['outputs'])
+        if outputs != _as_read(_value(text, spans['outputs'])):
+            replacements.append((spans['outputs'], _dumps(_as_written(outputs), text, spans['outputs'])))
+        if result['execution_count'] and _value(text, spans['execution_count']) != int(result['execution_count']):
+            replacements.append((spans['execution_count'], str(int(result['execution_count']))))
+    if not replacements:
+        return None
+    parts = []
+    idx = 0
+    for (_, start, end), value in sorted(replacements, key=lambda replacement: replacement[0][1]):
+        parts.append(text[idx:start])
+        parts.append(value)
+        idx = end
+    parts.append(text[idx:])
+    return ''.join(parts)
+
+
+def write_file(os_path, text):
+    """write text over the file at os_path in place, a backup copy restores it when writing fails"""
+    # newline='' writes the line endings of text as they are
+    with atomic_writing(os_path, encoding='utf-8', newline='') as f:
+        f.write(text)
+
+
+def patch_notebook(os_path, updates: Dict[str, Dict[str, Any]], blob_store) -> bool:
+    """write {cell_id: result} into the notebook file at os_path, return whether it changed"""
+    with open(os_path, encoding='utf-8', newline='') as f:
+        text = f.read()
+    patched = patch_text(text, updates, blob_store)
+    if patched is None:
+        return False
+    write_file(os_path, patched)
+    return True
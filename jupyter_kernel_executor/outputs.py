@@ -0,0 +1,256 @@
+import asyncio
+import json
+import os
+import time
+from typing import BinaryIO, Dict, List, Optional
+from uuid import uuid4
+
+import nbformat
+from jupyter_core.paths import jupyter_data_dir
+from traitlets import Bool, Float, Integer, Unicode, default
+from traitlets.config import LoggingConfigurable
+
+# metadata key of truncation markers
+MARKER_KEY = 'kernel_executor'
+
+
+class OutputLimits(LoggingConfigurable):
+    """
+    Caps of outputs kept for a cell, in memory, in the notebook and in responses
+
+    What goes beyond is written to a sidecar file under `spill_dir`, and a marker output tells where.
+    Sidecar files last written more than `spill_retention` ago, then the oldest beyond `max_spill_bytes`,
+    are removed every `prune_interval`.
+    """
+
+    max_stream_bytes = Integer(
+        1024 * 1024, config=True,
+        help="Bytes of each stream(stdout, stderr) kept for a cell. 0 for no limit"
+    )
+    max_output_bytes = Integer(
+        16 * 1024 * 1024, config=True,
+        help="Bytes of all outputs kept for a cell, estimated by their JSON size. 0 for no limit"
+    )
+    spill = Bool(
+        True, config=True,
+        help="Write outputs beyond the caps to files under spill_dir, or drop them"
+    )
+    spill_dir = Unicode(
+        config=True,
+        help="Directory of outputs beyond the caps"
+    )
+    spill_retention = Float(
+        7 * 24 * 3600, config=True,
+        help="Seconds spilled outputs are kept after they were last written, 0 to keep them"
+    )
+    max_spill_bytes = Integer(
+        1024 * 1024 * 1024, config=True,
+        help="Bytes of spilled outputs kept, the oldest are removed beyond, 0 for no limit"
+    )
+    prune_interval = Float(
+        3600, config=True,
+        help="Seconds between removals of spilled outputs beyond spill_retention or max_spill_bytes"
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.pruner: Optional[asyncio.Task] = None
+        self.pruned = 0
+
+    @default('spill_dir')
+    def _default_spill_dir(self):
+        return os.path.join(jupyter_data_dir(), 'kernel_executor', 'outputs')
+
+    def collector(self, keep=True) -> "OutputCollector":
+        return OutputCollector(self, keep=keep)
+
+    def spill_path(self, spill_id) -> str:
+        return os.path.join(self.spill_dir, spill_id)
+
+    def prune(self) -> List[str]:
+        """remove spilled outputs beyond spill_retention, then the oldest beyond max_spill_bytes"""
+        try:
+            names = os.listdir(self.spill_dir)
+        except FileNotFoundError:
+            return []
+        spills = []
+        for name in names:
+            try:
+                stat_info = os.stat(self.spill_path(name))
+            except FileNotFoundError:
+                continue
+            spills.append((stat_info.st_mtime, stat_info.st_size, name))
+        spills.sort()
+        deadline = time.time() - self.spill_retention if self.spill_retention else None
+        total = sum(size for _, size, _ in spills)
+        removed = []
+        for mtime, size, name in spills:
+            expired = deadline is not None and mtime < deadline
+            if not expired and not (self.max_spill_bytes and total > self.max_spill_bytes):
+                continue
+            try:
+                os.unlink(self.spill_path(name))
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed.append(name)
+        self.pruned += len(removed)
+        return removed
+
+    def start_pruner(self):
+        if self.pruner and not self.pruner.done():
+            return
+
+        async def _():
+            while True:
+                try:
+                    # listing and removing files, off the event loop
+                    await asyncio.get_running_loop().run_in_executor(None, self.prune)
+                except Exception as e:
+                    self.log.exception(e)
+                await asyncio.sleep(self.prune_interval)
+
+        self.pruner = asyncio.create_task(_())
+
+    def close(self):
+        if self.pruner:
+            self.pruner.cancel()
+
+
+class Spill:
+    """sidecar file of outputs beyond a cap, created on first write and kept open until closed"""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.file: Optional[BinaryIO] = None
+
+    def write(self, text: str) -> int:
+        data = text.encode('utf-8')
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # unbuffered, what is written can be fetched right away
+            self.file = open(self.path, 'ab', buffering=0)
+        self.file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def truncate_utf8(text: str, max_bytes: int) -> str:
+    """longest prefix of text fitting in max_bytes once encoded"""
+    if max_bytes <= 0:
+        return ''
+    data = text.encode('utf-8')
+    if len(data) <= max_bytes:
+        return text
+    return data[:max_bytes].decode('utf-8', errors='ignore')
+
+
+class OutputCollector:
+    """
+    Outputs of one execution within OutputLimits
+
+    Consecutive messages of a stream are merged into one output.
+    `add` returns what to show of a new output: its part within caps, and a marker when it starts overflowing.
+    With keep=False nothing is kept, caps still apply to what is shown.
+    """
+
+    def __init__(self, limits: OutputLimits, keep=True):
+        self.limits = limits
+        self.keep = keep
+        self.outputs: List[nbformat.NotebookNode] = []
+        self.size = 0
+        self.stream_sizes: Dict[str, int] = dict()
+        self.spill_prefix = uuid4().hex
+        # overflow key(stream name or 'outputs') -> marker, spill
+        self.markers: Dict[str, nbformat.NotebookNode] = dict()
+        self.spills: Dict[str, Spill] = dict()
+
+    def room(self, used, limit):
+        return limit - used if limit else None
+
+    def add(self, output: nbformat.NotebookNode) -> List[nbformat.NotebookNode]:
+        if output['output_type'] == 'stream':
+            return self.add_stream(output['name'], output['text'])
+
+        size = len(json.dumps(output))
+        cell_room = self.room(self.size, self.limits.max_output_bytes)
+        if cell_room is not None and size > cell_room:
+            return self.overflow('outputs', json.dumps(output) + '\n')
+        self.size += size
+        self.store(output)
+        return [output]
+
+    def add_stream(self, name, text) -> List[nbformat.NotebookNode]:
+        stream_room = self.room(self.stream_sizes.get(name, 0), self.limits.max_stream_bytes)
+        cell_room = self.room(self.size, self.limits.max_output_bytes)
+        rooms = [room for room in (stream_room, cell_room) if room is not None]
+        kept = truncate_utf8(text, min(rooms)) if rooms else text
+        shown = []
+        if kept:
+            size = len(kept.encode('utf-8'))
+            self.stream_sizes[name] = self.stream_sizes.get(name, 0) + size
+            self.size += size
+            chunk = nbformat.v4.new_output('stream', name=name, text=kept)
+            self.store_stream(chunk)
+            shown.append(chunk)
+        if len(kept) < len(text):
+            shown.extend(self.overflow(name, text[len(kept):]))
+        return shown
+
+    def store(self, output):
+        if self.keep:
+            self.outputs.append(output)
+
+    def store_stream(self, chunk):
+        if not self.keep:
+            return
+        last = self.outputs[-1] if self.outputs else None
+        if last is not None and last['output_type'] == 'stream' and last['name'] == chunk['name']:
+            last['text'] += chunk['text']
+        else:
+            # copy, merging more text must not change what was shown
+            self.outputs.append(nbformat.v4.new_output('stream', name=chunk['name'], text=chunk['text']))
+
+    def overflow(self, key, text) -> List[nbformat.NotebookNode]:
+        """spill text beyond the cap of key, return the marker when it's new"""
+        spill_id = None
+        if self.limits.spill:
+            spill = self.spills.get(key)
+            if spill is None:
+                extension = 'jsonl' if key == 'outputs' else 'txt'
+                spill_id = f'{self.spill_prefix}-{key}.{extension}'
+                spill = self.spills[key] = Spill(self.limits.spill_path(spill_id))
+            spill.write(text)
+            spill_id = os.path.basename(spill.path)
+
+        marker = self.markers.get(key)
+        is_new = marker is None
+        if is_new:
+            marker = self.markers[key] = nbformat.v4.new_output(
+                'display_data', data={}, metadata={MARKER_KEY: {'truncated': key, 'spill': spill_id, 'bytes': 0}},
+            )
+            self.store(marker)
+        info = marker['metadata'][MARKER_KEY]
+        info['bytes'] += len(text.encode('utf-8'))
+        where = f"kept in {spill_id}" if spill_id else "dropped"
+        marker['data'] = {'text/plain': f"[{key} truncated, {info['bytes']} more bytes {where}]"}
+        return [marker] if is_new else []
+
+    @property
+    def truncated_bytes(self) -> int:
+        """bytes beyond the caps, spilled or dropped"""
+        return sum(marker['metadata'][MARKER_KEY]['bytes'] for marker in self.markers.values())
+
+    def spill_ids(self) -> List[str]:
+        return [os.path.basename(spill.path) for spill in self.spills.values()]
+
+    def close(self):
+        """close files of spilled outputs, once the execution is done"""
+        for spill in self.spills.values():
+            spill.close()
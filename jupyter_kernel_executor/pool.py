@@ -0,0 +1,358 @@
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import aiohttp
+from jupyter_client.asynchronous import AsyncKernelClient
+from traitlets import Bool, Enum, Float, Integer
+from traitlets.config import LoggingConfigurable
+
+from jupyter_kernel_client.client import KernelWebsocketClient
+
+from jupyter_kernel_executor import metrics
+
+
+class KernelConnection(ABC):
+    """
+    A long-lived channel to a kernel, shared by many executions
+
+    Messages are routed back to the execution that sent the request by `parent_header.msg_id`,
+    so several executions can be in flight on one connection at the same time.
+    """
+
+    def __init__(self, kernel_id, log):
+        self.kernel_id = kernel_id
+        self.log = log
+        self.pending: Dict[str, asyncio.Queue] = dict()
+        self.reader: Optional[asyncio.Task] = None
+        self.last_activity = time.monotonic()
+
+    @property
+    def load(self):
+        return len(self.pending)
+
+    def idle_for(self):
+        if self.pending:
+            return 0
+        return time.monotonic() - self.last_activity
+
+    @abstractmethod
+    async def connect(self):
+        """open the connection and start reading messages into `dispatch`"""
+
+    @abstractmethod
+    async def close(self):
+        pass
+
+    def is_healthy(self):
+        return self.reader is not None and not self.reader.done()
+
+    @abstractmethod
+    async def send(self, msg):
+        pass
+
+    def dispatch(self, msg):
+        parent_id = (msg.get('parent_header') or {}).get('msg_id')
+        queue = self.pending.get(parent_id)
+        if queue:
+            queue.put_nowait(msg)
+
+    def fail_pending(self):
+        # None tells waiting executions the connection is gone
+        for queue in self.pending.values():
+            queue.put_nowait(None)
+
+    async def execute(self, client: KernelWebsocketClient, code):
+        msg = client.create_msg("shell", "execute_request", content=client.shell_content(code))
+        msg_id = msg["header"]["msg_id"]
+        queue = self.pending[msg_id] = asyncio.Queue()
+        try:
+            await self.send(msg)
+            while True:
+                msg = await queue.get()
+                if msg is None:
+                    raise ConnectionError(f'connection to kernel {self.kernel_id} closed during execution')
+                if await client.process_msg(msg):
+                    return client.get_result()
+        finally:
+            self.pending.pop(msg_id, None)
+            self.last_activity = time.monotonic()
+
+
+class WebsocketKernelConnection(KernelConnection):
+    """
+    Reusable websocket to the kernel channels endpoint, address and auth are taken from a KernelWebsocketClient
+    """
+
+    def __init__(self, client: KernelWebsocketClient, log):
+        super().__init__(client.kernel_id, log)
+        self.url = client.url
+        self.url_path = client.url_path
+        self.auth_header = client.auth_header
+        self.verify_ssl = client.verify_ssl
+        self.params = client.param
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.ws: Optional[aiohttp.ClientWebSocketResponse] = None
+
+    async def connect(self):
+        self.session = aiohttp.ClientSession(base_url=self.url, headers=self.auth_header)
+        try:
+            self.ws = await self.session.ws_connect(
+                self.url_path,
+                params=self.params,
+                verify_ssl=self.verify_ssl,
+            )
+        except Exception:
+            await self.session.close()
+            raise
+        self.reader = asyncio.create_task(self.read())
+
+    async def read(self):
+        try:
+            async for message in self.ws:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    self.dispatch(json.loads(message.data))
+                elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+        finally:
+            self.fail_pending()
+
+    def is_healthy(self):
+        return super().is_healthy() and self.ws is not None and not self.ws.closed
+
+    async def send(self, msg):
+        await self.ws.send_json(msg)
+
+    async def close(self):
+        if self.reader:
+            self.reader.cancel()
+        if self.ws is not None:
+            await self.ws.close()
+        if self.session is not None:
+            await self.session.close()
+
+
+def async_client(kernel) -> AsyncKernelClient:
+    """client of kernel, as KernelManager.client() makes, but an AsyncKernelClient whatever its client_class"""
+    kwargs = {
+        **kernel.get_connection_info(session=True),
+        'connection_file': kernel.connection_file,
+        'parent': kernel,
+    }
+    for key in ('curve_publickey', 'curve_secretkey'):
+        if isinstance(kwargs.get(key), str):
+            kwargs[key] = kwargs[key].encode('ascii')
+    return AsyncKernelClient(**kwargs)
+
+
+class ZMQKernelConnection(KernelConnection):
+    """
+    In-process connection to the ZMQ channels of a kernel owned by the server's kernel manager,
+    messages skip the loopback websocket, its JSON encoding and authentication
+
+    The client is an AsyncKernelClient whatever the kernel manager's client_class,
+    a blocking client would stall the event loop while waiting for messages.
+    """
+
+    ready_timeout = 60
+
+    def __init__(self, kernel_id, kernel, log):
+        super().__init__(kernel_id, log)
+        self.kernel = kernel
+        self.client: Optional[AsyncKernelClient] = None
+
+    def create_client(self) -> AsyncKernelClient:
+        return async_client(self.kernel)
+
+    async def connect(self):
+        self.client = self.create_client()
+        self.client.start_channels(shell=True, iopub=True, stdin=False, hb=False, control=False)
+        try:
+            # make sure iopub is subscribed before the first execution, or early outputs get lost
+            await self.client.wait_for_ready(timeout=self.ready_timeout)
+        except Exception:
+            self.client.stop_channels()
+            raise
+        self.reader = asyncio.create_task(self.read())
+
+    async def read(self):
+        async def _(channel_name):
+            channel = getattr(self.client, f'{channel_name}_channel')
+            while True:
+                msg = await channel.get_msg()
+                msg['channel'] = channel_name
+                self.dispatch(msg)
+
+        try:
+            await asyncio.gather(_('iopub'), _('shell'))
+        finally:
+            self.fail_pending()
+
+    def is_healthy(self):
+        return super().is_healthy() and self.client.channels_running
+
+    async def send(self, msg):
+        # there is no stdin channel to answer input requests
+        msg['content']['allow_stdin'] = False
+        self.client.shell_channel.send(msg)
+
+    async def close(self):
+        if self.reader:
+            self.reader.cancel()
+        if self.client is not None:
+            self.client.stop_channels()
+
+
+class KernelConnectionPool(LoggingConfigurable):
+    """
+    Per-kernel pool of reusable kernel connections
+
+    Executions are spread over at most `max_connections` connections of a kernel,
+    idle connections are evicted after `idle_timeout` seconds.
+    A connection is dropped as soon as it stops reading, e.g. closed by the server, connections of kernels
+    no longer known by the kernel manager are closed when next acquired, or else by the culler.
+    """
+
+    backend = Enum(
+        ['websocket', 'zmq'], 'websocket', config=True,
+        help="""How executions reach the kernel.
+        websocket: connect to the kernel channels endpoint of the server, works with remote kernels(gateway)
+        zmq: talk to the ZMQ channels of the kernel manager in-process, skip the loopback websocket
+        """
+    )
+    enabled = Bool(
+        True, config=True,
+        help="Reuse kernel connections between executions, or open a new one for every execution"
+    )
+    max_connections = Integer(
+        4, config=True,
+        help="Maximum number of open connections per kernel"
+    )
+    max_executions_per_connection = Integer(
+        8, config=True,
+        help="Number of concurrent executions on one connection before opening another"
+    )
+    idle_timeout = Float(
+        300, config=True,
+        help="Seconds an unused connection stays open before it is evicted"
+    )
+    cull_interval = Float(
+        60, config=True,
+        help="Seconds between checks for idle, broken or orphaned connections"
+    )
+
+    def __init__(self, kernel_manager=None, **kwargs):
+        super().__init__(**kwargs)
+        self.kernel_manager = kernel_manager
+        self.connections: Dict[str, List[KernelConnection]] = dict()
+        self.locks: Dict[str, asyncio.Lock] = dict()
+        self.culler: Optional[asyncio.Task] = None
+
+    def create_connection(self, client) -> KernelConnection:
+        if self.backend == 'zmq':
+            kernel = self.kernel_manager.get_kernel(client.kernel_id)
+            return ZMQKernelConnection(client.kernel_id, kernel, self.log)
+        return WebsocketKernelConnection(client, self.log)
+
+    def is_kernel_alive(self, kernel_id) -> bool:
+        return self.kernel_manager is None or kernel_id in self.kernel_manager
+
+    async def acquire(self, client) -> KernelConnection:
+        kernel_id = client.kernel_id
+        if not self.is_kernel_alive(kernel_id):
+            await self.close_kernel(kernel_id)
+            raise ConnectionError(f'kernel {kernel_id} is gone')
+        async with self.locks.setdefault(kernel_id, asyncio.Lock()):
+            connections = self.connections.setdefault(kernel_id, [])
+            for connection in [c for c in connections if not c.is_healthy()]:
+                self.log.debug(f'drop unhealthy connection to kernel {kernel_id}')
+                connections.remove(connection)
+                await connection.close()
+
+            connection = min(connections, key=lambda c: c.load, default=None)
+            if connection and (
+                    connection.load < self.max_executions_per_connection or len(connections) >= self.max_connections
+            ):
+                return connection
+
+            connection = self.create_connection(client)
+            with metrics.timed(metrics.PHASE_CLIENT_CONNECT):
+                await connection.connect()
+            connections.append(connection)
+            connection.reader.add_done_callback(lambda _, connection=connection: self.discard(kernel_id, connection))
+            self.log.debug(f'open connection {len(connections)}/{self.max_connections} to kernel {kernel_id}')
+            return connection
+
+    @asynccontextmanager
+    async def connection(self, client):
+        """a connection to client's kernel, for several executions in a row"""
+        if not self.enabled:
+            connection = self.create_connection(client)
+            with metrics.timed(metrics.PHASE_CLIENT_CONNECT):
+                await connection.connect()
+            try:
+                yield connection
+            finally:
+                await connection.close()
+            return
+
+        self.start_culler()
+        yield await self.acquire(client)
+
+    async def execute(self, client, code):
+        async with self.connection(client) as connection:
+            return await connection.execute(client, code)
+
+    def discard(self, kernel_id, connection: KernelConnection):
+        """forget a connection which stopped reading, e.g. closed by the server"""
+        connections = self.connections.get(kernel_id)
+        if connections is None or connection not in connections:
+            return
+        self.log.debug(f'connection to kernel {kernel_id} closed, drop it')
+        connections.remove(connection)
+        if not connections:
+            self.connections.pop(kernel_id, None)
+            self.locks.pop(kernel_id, None)
+        asyncio.ensure_future(connection.close())
+
+    async def close_kernel(self, kernel_id):
+        self.locks.pop(kernel_id, None)
+        for connection in self.connections.pop(kernel_id, []):
+            await connection.close()
+
+    async def cull(self):
+        for kernel_id in list(self.connections):
+            if not self.is_kernel_alive(kernel_id):
+                self.log.debug(f'kernel {kernel_id} is gone, close its connections')
+                await self.close_kernel(kernel_id)
+                continue
+            connections = self.connections[kernel_id]
+            for connection in list(connections):
+                if not connection.is_healthy() or connection.idle_for() > self.idle_timeout:
+                    connections.remove(connection)
+                    await connection.close()
+            if not connections:
+                await self.close_kernel(kernel_id)
+
+    def start_culler(self):
+        if self.culler and not self.culler.done():
+            return
+
+        async def _():
+            while True:
+                await asyncio.sleep(self.cull_interval)
+                try:
+                    await self.cull()
+                except Exception as e:
+                    self.log.exception(e)
+
+        self.culler = asyncio.create_task(_())
+
+    async def close(self):
+        if self.culler:
+            self.culler.cancel()
+        for kernel_id in list(self.connections):
+            await self.close_kernel(kernel_id)
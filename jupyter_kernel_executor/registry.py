@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Any
+
+# why an execution stopped before the kernel finished it
+STOP_TIMEOUT = 'timeout'
+STOP_CANCELLED = 'cancelled'
+
+
+class ExecutionRecord:
+    __slots__ = ('kernel_id', 'document_id', 'cell_id', 'started', 'metadata', 'stopped', 'stop_reason', 'os_path')
+
+    def __init__(self, kernel_id, document_id, cell_id, metadata=None):
+        self.kernel_id = kernel_id
+        self.document_id = document_id
+        self.cell_id = cell_id
+        self.started = datetime.utcnow()
+        # request information, e.g. path or whether it's blocking
+        self.metadata: Dict[str, Any] = metadata or dict()
+        # set when the execution is asked to stop early, e.g. cancelled
+        self.stopped = asyncio.Event()
+        self.stop_reason: Optional[str] = None
+        # file watched while executing
+        self.os_path: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return self.kernel_id, self.document_id, self.cell_id
+
+    def stop(self, reason):
+        if not self.stopped.is_set():
+            self.stop_reason = reason
+            self.stopped.set()
+
+
+class ExecutionRegistry:
+    """
+    Cells executing on kernels, indexed by kernel, by document and by (document, cell)
+
+    Every lookup and update is a few dict operations, whatever the number of tracked executions.
+    """
+
+    def __init__(self):
+        self.records: Dict[Tuple[str, str, str], ExecutionRecord] = dict()
+        # index -> {record key -> record}, dicts keep start order
+        self.by_kernel: Dict[str, Dict[Tuple, ExecutionRecord]] = dict()
+        self.by_document: Dict[str, Dict[Tuple, ExecutionRecord]] = dict()
+        self.by_cell: Dict[Tuple[str, str], Dict[Tuple, ExecutionRecord]] = dict()
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, kernel_id, document_id, cell_id, **metadata) -> Optional[ExecutionRecord]:
+        """track execution of cell, None if it's tracked already"""
+        record = ExecutionRecord(kernel_id, document_id, cell_id, metadata)
+        key = record.key
+        if key in self.records:
+            return None
+        self.records[key] = record
+        self.by_kernel.setdefault(kernel_id, dict())[key] = record
+        self.by_document.setdefault(document_id, dict())[key] = record
+        self.by_cell.setdefault((document_id, cell_id), dict())[key] = record
+        return record
+
+    def remove(self, kernel_id, document_id, cell_id) -> Optional[ExecutionRecord]:
+        key = (kernel_id, document_id, cell_id)
+        record = self.records.pop(key, None)
+        if record is None:
+            return None
+        self._unindex(self.by_kernel, kernel_id, key)
+        self._unindex(self.by_document, document_id, key)
+        self._unindex(self.by_cell, (document_id, cell_id), key)
+        return record
+
+    def _unindex(self, index, index_key, key):
+        records = index.get(index_key)
+        if records is None:
+            return
+        records.pop(key, None)
+        # drop empty buckets, so finished kernels and documents don't leak
+        if not records:
+            del index[index_key]
+
+    def get(self, kernel_id, document_id, cell_id) -> Optional[ExecutionRecord]:
+        return self.records.get((kernel_id, document_id, cell_id))
+
+    def is_executing(self, kernel_id, document_id, cell_id) -> bool:
+        return (kernel_id, document_id, cell_id) in self.records
+
+    def on_kernel(self, kernel_id) -> List[ExecutionRecord]:
+        return list(self.by_kernel.get(kernel_id, dict()).values())
+
+    def on_document(self, document_id) -> List[ExecutionRecord]:
+        return list(self.by_document.get(document_id, dict()).values())
+
+    def on_cell(self, document_id, cell_id) -> List[ExecutionRecord]:
+        return list(self.by_cell.get((document_id, cell_id), dict()).values())
+
+    def is_document_executing(self, document_id) -> bool:
+        return document_id in self.by_document
+
+    def documents(self) -> List[str]:
+        return list(self.by_document)
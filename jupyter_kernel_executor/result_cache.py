@@ -0,0 +1,96 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from traitlets import Integer
+from traitlets.config import LoggingConfigurable
+
+
+class CachedResult:
+    __slots__ = ('result', 'size')
+
+    def __init__(self, result, size):
+        self.result = result
+        self.size = size
+
+
+class ResultCache(LoggingConfigurable):
+    """
+    LRU of results of code executed with `cache: true`, keyed by kernel, kernel state and code hash
+
+    The state is the caller's `state` token when given, else a generation tracked by the server:
+    it changes when the kernel restarts, and around every execution not asking for the cache, through this extension.
+    Executions from other clients, e.g. a notebook frontend, are not seen, give a `state` token if they matter.
+    """
+
+    max_bytes = Integer(
+        64 * 1024 * 1024, config=True,
+        help="Memory budget of cached results, estimated by their JSON size. 0 to disable the cache"
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.entries: "OrderedDict[Tuple, CachedResult]" = OrderedDict()
+        self.generations: Dict[str, int] = dict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def state(self, kernel_id, kernel, token: Optional[str] = None) -> Tuple:
+        """state of kernel results are cached for, token from the caller takes over the tracked one"""
+        if token is not None:
+            return 'token', str(token)
+        provisioner = getattr(kernel, 'provisioner', None)
+        # a restart launches the kernel with a new provisioner
+        instance = getattr(provisioner, 'pid', None) or id(provisioner)
+        return 'generation', instance, self.generations.get(kernel_id, 0)
+
+    def bump(self, kernel_id):
+        """the kernel's state may have changed"""
+        self.generations[kernel_id] = self.generations.get(kernel_id, 0) + 1
+
+    def key(self, kernel_id, state, code) -> Tuple:
+        return kernel_id, state, hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+    def get(self, key) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry.result
+
+    def put(self, key, result):
+        if not self.max_bytes:
+            return
+        result = {'outputs': result['outputs'], 'execution_count': result['execution_count']}
+        size = len(json.dumps(result))
+        self.invalidate(key)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = CachedResult(result, size)
+        self.size += size
+        self.evict()
+
+    def evict(self):
+        while self.size > self.max_bytes and self.entries:
+            _, entry = self.entries.popitem(last=False)
+            self.size -= entry.size
+            self.evictions += 1
+
+    def invalidate(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.size -= entry.size
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+from uuid import uuid4
+
+from traitlets import Integer
+from traitlets.config import LoggingConfigurable
+
+from jupyter_kernel_executor.journal import ExecutionJournal
+
+
+def utcnow():
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+class Run:
+    """
+    Execution of several cells of one document, in order on one kernel,
+    or by their dependencies on a pool of kernels `kernel_ids`
+
+    status: pending -> running -> finished(all cells ok) / error(a cell raised) / failed(could not run)
+    """
+
+    def __init__(self, kernel_id, document_id, path, cell_ids: List[str], run_id=None, kernel_ids=None):
+        self.run_id = run_id or str(uuid4())
+        self.kernel_id = kernel_id
+        self.kernel_ids: List[str] = kernel_ids or [kernel_id]
+        self.document_id = document_id
+        self.path = path
+        self.status = 'pending'
+        self.error: Optional[str] = None
+        self.created = utcnow()
+        self.started: Optional[str] = None
+        self.finished: Optional[str] = None
+        self.cells: List[Dict[str, Any]] = [
+            {
+                'cell_id': cell_id,
+                'status': 'pending',
+                'execution_count': None,
+                'outputs': [],
+            } for cell_id in cell_ids
+        ]
+
+    def start(self):
+        self.status = 'running'
+        self.started = utcnow()
+
+    def finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self.finished = utcnow()
+
+    @classmethod
+    def from_model(cls, model) -> 'Run':
+        run = cls(model['kernel_id'], None, model['path'], [], run_id=model['run_id'], kernel_ids=model['kernel_ids'])
+        for key in ('status', 'error', 'created', 'started', 'finished', 'cells'):
+            setattr(run, key, model[key])
+        return run
+
+    def to_model(self):
+        return {
+            'run_id': self.run_id,
+            'kernel_id': self.kernel_id,
+            'kernel_ids': self.kernel_ids,
+            'path': self.path,
+            'status': self.status,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'cells': self.cells,
+        }
+
+
+class RunRegistry(LoggingConfigurable):
+    """
+    Runs of the server, the oldest finished ones are forgotten beyond `max_runs`
+
+    With a journal, runs are saved there as they start and finish, and runs of previous servers are looked up there
+    """
+
+    max_runs = Integer(
+        1000, config=True,
+        help="Number of runs kept for querying"
+    )
+
+    def __init__(self, journal: Optional[ExecutionJournal] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.journal = journal
+        self.runs: "OrderedDict[str, Run]" = OrderedDict()
+
+    def add(self, run: Run):
+        self.runs[run.run_id] = run
+        self.save(run)
+        for run_id in list(self.runs):
+            if len(self.runs) <= self.max_runs:
+                break
+            if self.runs[run_id].finished:
+                del self.runs[run_id]
+        return run
+
+    def save(self, run: Run):
+        if self.journal is not None:
+            self.journal.save_run(run.to_model())
+
+    def get(self, run_id) -> Optional[Run]:
+        run = self.runs.get(run_id)
+        if run is None and self.journal is not None:
+            model = self.journal.get_run(run_id)
+            run = model and Run.from_model(model)
+        return run
+
+    def list(self, kernel_id=None) -> List[Run]:
+        return [run for run in self.runs.values() if kernel_id is None or kernel_id in run.kernel_ids]
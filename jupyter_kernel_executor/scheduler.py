@@ -0,0 +1,137 @@
+import asyncio
+import heapq
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+from traitlets import Integer
+from traitlets.config import LoggingConfigurable
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Ticket:
+    """
+    Place of an execution in the queue of a kernel
+
+    Wait for its turn with `wait`, give the place back with `release`, whether it ran or not.
+    """
+
+    __slots__ = ('queue', 'priority', 'seq', 'document_id', 'cell_id', 'granted', 'released')
+
+    def __init__(self, queue: "KernelQueue", priority, seq, document_id=None, cell_id=None):
+        self.queue = queue
+        self.priority = priority
+        self.seq = seq
+        self.document_id = document_id
+        self.cell_id = cell_id
+        self.granted = asyncio.get_running_loop().create_future()
+        self.released = False
+
+    def __lt__(self, other: "Ticket"):
+        # higher priority first, then first come first served
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+    @property
+    def running(self):
+        return self.granted.done() and not self.released
+
+    async def wait(self):
+        await asyncio.shield(self.granted)
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self.queue.release(self)
+
+
+class KernelQueue:
+    def __init__(self, scheduler: "KernelScheduler", kernel_id):
+        self.scheduler = scheduler
+        self.kernel_id = kernel_id
+        self.running = 0
+        self.waiting: List[Ticket] = []
+
+    def put(self, ticket: Ticket):
+        heapq.heappush(self.waiting, ticket)
+        self.grant()
+
+    def grant(self):
+        while self.waiting and self.running < self.scheduler.max_running:
+            ticket = heapq.heappop(self.waiting)
+            self.running += 1
+            ticket.granted.set_result(None)
+
+    def release(self, ticket: Ticket):
+        if ticket.granted.done():
+            self.running -= 1
+        else:
+            # gave up while waiting
+            self.waiting.remove(ticket)
+            heapq.heapify(self.waiting)
+            ticket.granted.cancel()
+        self.grant()
+        if not self.running and not self.waiting:
+            self.scheduler.queues.pop(self.kernel_id, None)
+
+    def positions(self) -> Dict[Tuple[Optional[str], Optional[str]], int]:
+        """(document_id, cell_id) -> 1-based position of waiting tickets"""
+        return {
+            (ticket.document_id, ticket.cell_id): position
+            for position, ticket in enumerate(sorted(self.waiting), 1)
+        }
+
+
+class KernelScheduler(LoggingConfigurable):
+    """
+    Execution queue per kernel, ordered by priority then arrival
+
+    At most `max_running` executions of a kernel are sent to it at once, the others wait here,
+    and no more than `max_queue_depth` of them, further executions are refused with QueueFull.
+    """
+
+    max_running = Integer(
+        1, config=True,
+        help="Executions sent to a kernel at once, others wait in its queue"
+    )
+    max_queue_depth = Integer(
+        100, config=True,
+        help="Executions waiting for a kernel at most, more are refused. 0 for unbounded"
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.queues: Dict[str, KernelQueue] = dict()
+        self.counter = itertools.count()
+        self.rejected = 0
+
+    def enqueue(self, kernel_id, priority=0, document_id=None, cell_id=None) -> Ticket:
+        """take a place in the queue of kernel, raise QueueFull if it's full"""
+        queue = self.queues.get(kernel_id)
+        if queue is None:
+            queue = self.queues[kernel_id] = KernelQueue(self, kernel_id)
+        if self.max_queue_depth and len(queue.waiting) >= self.max_queue_depth \
+                and queue.running >= self.max_running:
+            self.rejected += 1
+            raise QueueFull(f"{len(queue.waiting)} executions are waiting for kernel {kernel_id}")
+        ticket = Ticket(queue, priority, next(self.counter), document_id, cell_id)
+        queue.put(ticket)
+        return ticket
+
+    def positions(self, kernel_id) -> Dict[Tuple[Optional[str], Optional[str]], int]:
+        queue = self.queues.get(kernel_id)
+        return queue.positions() if queue else dict()
+
+    def depth(self, kernel_id) -> int:
+        queue = self.queues.get(kernel_id)
+        return len(queue.waiting) if queue else 0
+
+    def stats(self):
+        return {
+            "kernels": len(self.queues),
+            "running": sum(queue.running for queue in self.queues.values()),
+            "waiting": sum(len(queue.waiting) for queue in self.queues.values()),
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,119 @@
+import base64
+import json
+import os
+import time
+from pathlib import Path
+
+import nbformat
+import pytest
+
+from jupyter_kernel_executor.blobs import BlobGCApp, BlobStore, referenced_blobs
+from jupyter_kernel_executor.outputs import MARKER_KEY
+from .utils import write_notebook
+
+PNG = bytes(range(256)) * 100
+code = '''
+import base64
+display({'image/png': base64.b64encode(bytes(range(256)) * 100).decode(), 'text/plain': 'figure'}, raw=True)
+'''
+
+
+@pytest.fixture
+def blob_store(jp_serverapp, tmp_path):
+    store = jp_serverapp.web_app.settings['kernel_executor_blob_store']
+    store.enabled = True
+    store.root_dir = str(tmp_path / 'blobs')
+    return store
+
+
+@pytest.fixture
+def notebook(jp_root_dir):
+    path, (cell_id,), filepath = write_notebook(jp_root_dir, 'plot.ipynb', [code])
+    yield path, cell_id, filepath
+
+
+def figure(data=PNG):
+    return nbformat.v4.new_output('display_data', data={
+        'image/png': base64.b64encode(data).decode(),
+        'text/plain': 'figure',
+    })
+
+
+def test_offload_dedup(tmp_path):
+    store = BlobStore(enabled=True, min_bytes=1024, root_dir=str(tmp_path))
+    small = figure(b'tiny')
+    outputs = [figure(), figure(), small]
+
+    offloaded = store.offload(outputs)
+
+    assert offloaded[0] == offloaded[1]
+    assert offloaded[0]['data'] == {'text/plain': 'figure'}
+    blob = offloaded[0]['metadata'][MARKER_KEY]['blobs']['image/png']
+    assert blob['bytes'] == len(PNG)
+    assert Path(store.path(blob['sha256'])).read_bytes() == PNG
+    assert list(store.digests()) == [blob['sha256']]
+    # small ones stay inline, what was given is left as it is
+    assert offloaded[2] is small
+    assert 'image/png' in outputs[0]['data']
+
+
+def test_disabled(tmp_path):
+    store = BlobStore(root_dir=str(tmp_path), min_bytes=0)
+    outputs = [figure()]
+    assert store.offload(outputs) is outputs
+    assert list(store.digests()) == []
+
+
+def test_collect(tmp_path):
+    store = BlobStore(root_dir=str(tmp_path / 'blobs'))
+    kept, unused, recent = store.put(b'kept'), store.put(b'unused'), store.put(b'recent')
+    past = time.time() - 100
+    for digest in (kept, unused):
+        os.utime(store.path(digest), (past, past))
+
+    assert store.collect({kept}, grace_period=10, dry_run=True) == [unused]
+    assert store.collect({kept}, grace_period=10) == [unused]
+    assert sorted(store.digests()) == sorted([kept, recent])
+
+
+def test_gc_app(tmp_path):
+    store = BlobStore(enabled=True, min_bytes=0, root_dir=str(tmp_path / 'blobs'))
+    nb = nbformat.v4.new_notebook()
+    nb['cells'] = [nbformat.v4.new_code_cell('plot()', outputs=store.offload([figure()]))]
+    (tmp_path / 'notebooks').mkdir()
+    with open(tmp_path / 'notebooks' / 'plot.ipynb', 'w') as f:
+        nbformat.write(nb, f)
+    orphan = store.put(b'orphan')
+    referenced, = referenced_blobs(nb)
+
+    app = BlobGCApp()
+    app.initialize([
+        f'--root-dir={tmp_path / "notebooks"}', f'--blob-dir={store.root_dir}', '--grace-period=0',
+    ])
+    app.start()
+
+    assert list(store.digests()) == [referenced]
+    assert orphan != referenced
+
+
+async def test_offload_written_outputs(jp_fetch, blob_store, notebook):
+    path, cell_id, filepath = notebook
+    kernel_response = await jp_fetch('api', 'kernels', method='POST', body=json.dumps({'name': 'python3'}))
+    kernel_id = json.loads(kernel_response.body)['id']
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        'path': path, 'cell_id': cell_id, 'block': True,
+    }))
+    # response is left inline
+    assert json.loads(response.body)['outputs'][0]['data']['image/png'] == base64.b64encode(PNG).decode()
+
+    with open(filepath) as f:
+        output, = nbformat.read(f, as_version=nbformat.NO_CONVERT)['cells'][0]['outputs']
+    assert output['data'] == {'text/plain': 'figure'}
+    digest = output['metadata'][MARKER_KEY]['blobs']['image/png']['sha256']
+
+    response = await jp_fetch('api', 'kernel_executor', 'blobs', digest, params={'type': 'image/png'})
+    assert response.headers['Content-Type'] == 'image/png'
+    assert response.body == PNG
+    response = await jp_fetch('api', 'kernel_executor', 'blobs', digest, params={'type': 'text/html'})
+    assert response.headers['Content-Type'] == 'application/octet-stream'
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+import nbformat
+import pytest
+from tornado.httpclient import HTTPClientError
+
+from .utils import start_kernel, write_notebook
+
+
+@pytest.fixture
+def notebook(jp_root_dir):
+    path, (cell_id,), filepath = write_notebook(jp_root_dir, 'cancel.ipynb', [
+        "import time\nprint('start')\ntime.sleep(10)",
+    ])
+    yield path, cell_id, filepath
+
+
+async def execute_code(jp_fetch, kernel_id, body):
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps(body))
+    return json.loads(response.body)
+
+
+async def test_timeout(jp_fetch):
+    kernel_id = await start_kernel(jp_fetch)
+
+    payload = await execute_code(jp_fetch, kernel_id, {
+        'code': "import time\nprint('start')\ntime.sleep(10)",
+        'timeout': 1,
+    })
+
+    assert payload['status'] == 'timeout'
+    assert payload['outputs'][-1]['ename'] == 'ExecutionTimeout'
+    # kernel is interrupted, free for next execution
+    payload = await execute_code(jp_fetch, kernel_id, {'code': "print('next')", 'timeout': 5})
+    assert payload['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': 'next\n'}]
+
+
+async def test_cancel_cell(jp_fetch, notebook):
+    path, cell_id, filepath = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    await execute_code(jp_fetch, kernel_id, {'path': path, 'cell_id': cell_id})
+    await asyncio.sleep(1)
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='DELETE', params={
+        'path': path,
+        'cell_id': cell_id,
+    })
+    assert json.loads(response.body)['status'] == 'cancelled'
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', 'wait', method='GET', params={
+        'path': path,
+        'cell_id': cell_id,
+        'timeout': 2,
+    })
+    assert json.loads(response.body)['finished']
+
+    for _ in range(10):
+        await asyncio.sleep(0.5)
+        with open(filepath) as f:
+            outputs = nbformat.read(f, as_version=nbformat.NO_CONVERT)['cells'][0]['outputs']
+        if outputs:
+            break
+    assert outputs[-1]['ename'] == 'ExecutionCancelled'
+
+
+async def test_cancel_idle_cell(jp_fetch, notebook):
+    path, cell_id, _ = notebook
+    kernel_id = await start_kernel(jp_fetch)
+
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('api', 'kernels', kernel_id, 'execute', method='DELETE', params={
+            'path': path,
+            'cell_id': cell_id,
+        })
+    assert e.value.code == 404
+
+
+async def test_cancel_cell_abspath(jp_fetch, notebook):
+    path, cell_id, _ = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    await execute_code(jp_fetch, kernel_id, {'path': path, 'cell_id': cell_id})
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='DELETE', params={
+        'path': '/' + path,
+        'cell_id': cell_id,
+    })
+    assert json.loads(response.body)['status'] == 'cancelled'
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import nbformat
+import pytest
+from tornado.httpclient import HTTPClientError
+
+from jupyter_kernel_executor.dag import CellGraph, DagScheduler, dependencies_from_metadata
+from .utils import start_kernel, write_notebook
+
+
+@pytest.fixture
+def notebook(jp_root_dir):
+    cells = [nbformat.v4.new_code_cell(source) for source in (
+        "import time\nbase = 10",
+        "time.sleep(1)\nleft = base + 1",
+        "time.sleep(1)\nright = base + 2",
+        "print(left)",
+        "print(right)",
+        "print(left + right)",
+    )]
+    setup, left, right, show_left, show_right, total = [cell['id'] for cell in cells]
+    for cell, depends_on in zip(cells[3:], ([left], [right], [left, right])):
+        cell['metadata']['kernel_executor'] = {'depends_on': depends_on}
+    yield write_notebook(jp_root_dir, 'wide.ipynb', cells)
+
+
+def test_graph():
+    graph = CellGraph(['a', 'b', 'c', 'd'], {'d': ['c', 'b'], 'c': ['a']})
+
+    assert graph.ancestors['d'] == ['a', 'b', 'c']
+    assert graph.descendants('a') == ['c', 'd']
+    with pytest.raises(ValueError, match='cycle'):
+        CellGraph(['a', 'b'], {'a': ['b'], 'b': ['a']})
+    with pytest.raises(ValueError, match='unknown'):
+        CellGraph(['a'], {'a': ['z']})
+
+
+def test_dependencies_from_metadata():
+    cell = nbformat.v4.new_code_cell('', metadata={'kernel_executor': {'depends_on': ['x']}})
+    assert dependencies_from_metadata([cell, nbformat.v4.new_code_cell('')]) == {cell['id']: ['x']}
+
+
+async def test_scheduler_follows_critical_path():
+    graph = CellGraph(['a', 'b', 'a2', 'b2', 'join', 'fail', 'after_fail'], {
+        'a2': ['a'], 'b2': ['b'], 'join': ['a2', 'b2'], 'after_fail': ['fail'],
+    })
+    calls = []
+
+    async def run_cell(kernel_id, replay, cell_id):
+        calls.append((kernel_id, replay, cell_id))
+        await asyncio.sleep(0.05)
+        return cell_id != 'fail', replay + [cell_id]
+
+    scheduler = DagScheduler(graph, ['k1', 'k2', 'k3'], run_cell)
+    start = time.perf_counter()
+    succeeded, failed, skipped = await scheduler.run()
+
+    # 3 levels, not 6 cells
+    assert time.perf_counter() - start < 0.25
+    assert failed == {'fail'} and skipped == {'after_fail'}
+    assert succeeded == {'a', 'b', 'a2', 'b2', 'join'}
+    # branches stay on their kernel, join replays the other branch
+    assert scheduler.placement['a2'] == scheduler.placement['a']
+    assert scheduler.placement['b2'] == scheduler.placement['b']
+    replay, = [replay for _, replay, cell_id in calls if cell_id == 'join']
+    assert replay in (['a', 'a2'], ['b', 'b2'])
+
+
+async def test_scheduler_keeps_replays_that_ran():
+    graph = CellGraph(['a', 'b', 'c', 'join'], {'join': ['a', 'b', 'c']})
+    replays = []
+
+    async def run_cell(kernel_id, replay, cell_id):
+        if not replay:
+            return True, [cell_id]
+        # the second replay fails, the cell never runs
+        replays.append(replay)
+        return False, replay[:1]
+
+    scheduler = DagScheduler(graph, ['k1', 'k2', 'k3'], run_cell)
+    succeeded, failed, skipped = await scheduler.run()
+
+    assert succeeded == {'a', 'b', 'c'} and failed == {'join'}
+    replay, = replays
+    kernel_id = scheduler.placement['join']
+    own, = [cell_id for cell_id in 'abc' if scheduler.placement[cell_id] == kernel_id]
+    assert scheduler.executed[kernel_id] == {own, replay[0]}
+
+
+async def test_parallel_run(jp_fetch, notebook):
+    path, (setup, left, right, show_left, show_right, total), filepath = notebook
+    kernel_id, other_kernel_id = await start_kernel(jp_fetch), await start_kernel(jp_fetch)
+    # time executions, not kernels starting
+    for warm_kernel_id in (kernel_id, other_kernel_id):
+        await jp_fetch('api', 'kernels', warm_kernel_id, 'execute', method='POST', body=json.dumps({'code': 'pass'}))
+
+    start = time.perf_counter()
+    response = await jp_fetch('api', 'kernels', kernel_id, 'runs', method='POST', body=json.dumps({
+        'path': path,
+        'parallel': True,
+        'kernel_ids': [other_kernel_id],
+        'setup_cell_id': setup,
+        'cell_ids': [setup, left, right, show_left, show_right],
+        'dependencies': {left: [setup], right: [setup], show_left: [left], show_right: [right]},
+        'block': True,
+    }))
+    elapsed = time.perf_counter() - start
+    run = json.loads(response.body)
+
+    assert run['status'] == 'finished'
+    assert run['kernel_ids'] == [kernel_id, other_kernel_id]
+    # both sleeps at once
+    assert elapsed < 2
+    cells = {cell['cell_id']: cell for cell in run['cells']}
+    assert cells[show_left]['outputs'][0]['text'] == '11\n'
+    assert cells[show_right]['outputs'][0]['text'] == '12\n'
+    assert {cells[left]['kernel_id'], cells[right]['kernel_id']} == {kernel_id, other_kernel_id}
+
+    response = await jp_fetch('api', 'kernels', other_kernel_id, 'runs', run['run_id'])
+    assert json.loads(response.body)['run_id'] == run['run_id']
+
+    for _ in range(10):
+        await asyncio.sleep(0.5)
+        with open(filepath) as f:
+            written = nbformat.read(f, as_version=nbformat.NO_CONVERT)['cells']
+        if written[4]['outputs']:
+            break
+    assert written[4]['outputs'][0]['text'] == '12\n'
+
+
+async def test_parallel_run_join(jp_fetch, notebook):
+    path, (setup, left, right, show_left, show_right, total), _ = notebook
+    kernel_id = await start_kernel(jp_fetch)
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'runs', method='POST', body=json.dumps({
+        'path': path,
+        'parallel': True,
+        'kernel_ids': [await start_kernel(jp_fetch)],
+        'setup_cell_id': setup,
+        'cell_ids': [left, right, total],
+        'block': True,
+        'not_write': True,
+    }))
+    run = json.loads(response.body)
+    assert run['status'] == 'finished'
+    assert [cell['status'] for cell in run['cells']] == ['finished'] * 4
+    # branches joined on one kernel, replaying the other there
+    assert run['cells'][-1]['outputs'][0]['text'] == '23\n'
+
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('api', 'kernels', kernel_id, 'runs', method='POST', body=json.dumps({
+            'path': path,
+            'parallel': True,
+            'cell_ids': [show_left, total],
+        }))
+    assert e.value.code == 400
+
+
+async def test_parallel_replay_fails(jp_fetch, jp_root_dir):
+    # each branch runs once only, replaying it on the other kernel fails
+    cells = [
+        nbformat.v4.new_code_cell(
+            f"import os\nmarker = {str(Path(jp_root_dir) / name)!r}\n"
+            f"assert not os.path.exists(marker)\nopen(marker, 'w').close()\n{name} = 1"
+        ) for name in ('left', 'right')
+    ] + [nbformat.v4.new_code_cell("print(left + right)")]
+    left, right, total = [cell['id'] for cell in cells]
+    cells[2]['metadata']['kernel_executor'] = {'depends_on': [left, right]}
+    write_notebook(jp_root_dir, 'once.ipynb', cells)
+    kernel_id = await start_kernel(jp_fetch)
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'runs', method='POST', body=json.dumps({
+        'path': 'once.ipynb',
+        'parallel': True,
+        'kernel_ids': [await start_kernel(jp_fetch)],
+        'cell_ids': [left, right, total],
+        'block': True,
+    }))
+    run = json.loads(response.body)
+    assert run['status'] == 'error'
+    assert [cell['status'] for cell in run['cells']] == ['finished', 'finished', 'skipped']
+    assert 'ended with error' in run['cells'][2]['error']
+    # not written with the replayed cell's error
+    assert run['cells'][2]['outputs'] == []
+    with open(Path(jp_root_dir) / 'once.ipynb') as f:
+        assert nbformat.read(f, as_version=4)['cells'][2]['outputs'] == []
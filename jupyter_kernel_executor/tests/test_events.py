@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import pytest
+from tornado.httpclient import HTTPClientError
+from tornado.iostream import StreamClosedError
+
+from jupyter_kernel_executor.handlers import BaseExecuteHandler
+from .utils import start_kernel, write_notebook
+
+
+@pytest.fixture
+def notebook(jp_root_dir):
+    path, (cell_id,), _ = write_notebook(jp_root_dir, 'events.ipynb', ["import time\ntime.sleep(1)\nprint('done')"])
+    yield path, cell_id
+
+
+async def wait(jp_fetch, kernel_id, path, cell_id, timeout):
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', 'wait', method='GET', params={
+        'path': path,
+        'cell_id': cell_id,
+        'timeout': timeout,
+    })
+    return json.loads(response.body)
+
+
+async def test_wait_for_cell(jp_fetch, notebook):
+    path, cell_id = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        'path': path,
+        'cell_id': cell_id,
+    }))
+
+    assert await wait(jp_fetch, kernel_id, path, cell_id, timeout=0.1) == {
+        'path': path, 'cell_id': cell_id, 'finished': False
+    }
+    assert await wait(jp_fetch, kernel_id, path, cell_id, timeout=10) == {
+        'path': path, 'cell_id': cell_id, 'finished': True
+    }
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='GET')
+    assert json.loads(response.body) == []
+
+
+async def test_wait_for_cell_abspath(jp_fetch, notebook):
+    path, cell_id = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        'path': path,
+        'cell_id': cell_id,
+    }))
+
+    assert not (await wait(jp_fetch, kernel_id, '/' + path, cell_id, timeout=0.1))['finished']
+    assert (await wait(jp_fetch, kernel_id, '/' + path, cell_id, timeout=10))['finished']
+
+
+async def test_wait_for_idle_cell(jp_fetch, notebook):
+    path, cell_id = notebook
+    kernel_id = await start_kernel(jp_fetch)
+
+    assert (await wait(jp_fetch, kernel_id, path, cell_id, timeout=10))['finished']
+
+
+async def test_wait_after_disconnect(jp_fetch, notebook, monkeypatch):
+    path, cell_id = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    finish = BaseExecuteHandler.finish
+    disconnected = []
+
+    def finish_or_disconnect(self, *args, **kwargs):
+        if self.request.method == 'POST' and not disconnected:
+            disconnected.append(self)
+            raise StreamClosedError()
+        return finish(self, *args, **kwargs)
+
+    monkeypatch.setattr(BaseExecuteHandler, 'finish', finish_or_disconnect)
+    with pytest.raises(HTTPClientError):
+        await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+            'path': path,
+            'cell_id': cell_id,
+        }))
+
+    # not left executing
+    assert disconnected
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='GET')
+    assert json.loads(response.body) == []
+    assert (await wait(jp_fetch, kernel_id, path, cell_id, timeout=10))['finished']
+
+
+async def test_wait_methods(jp_fetch, notebook):
+    path, cell_id = notebook
+    kernel_id = await start_kernel(jp_fetch)
+
+    # waiting doesn't execute or cancel
+    for method, kwargs in (('POST', {'body': json.dumps({'path': path, 'cell_id': cell_id})}),
+                           ('DELETE', {'params': {'path': path, 'cell_id': cell_id}})):
+        with pytest.raises(HTTPClientError) as e:
+            await jp_fetch('api', 'kernels', kernel_id, 'execute', 'wait', method=method, **kwargs)
+        assert e.value.code == 405
+
+
+async def test_event_stream(jp_fetch, notebook):
+    path, cell_id = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    chunks = []
+
+    async def execute():
+        # wait for subscription
+        while not chunks:
+            await asyncio.sleep(0.1)
+        await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+            'path': path,
+            'cell_id': cell_id,
+            'block': True,
+        }))
+
+    async def listen():
+        with pytest.raises(HTTPClientError):
+            await jp_fetch('api', 'kernel_executor', 'events', method='GET', params={'kernel_id': kernel_id},
+                           streaming_callback=chunks.append, request_timeout=3)
+
+    await asyncio.gather(listen(), execute())
+
+    events = [
+        json.loads(event.split('data: ', 1)[1])
+        for event in b''.join(chunks).decode().split('\n\n') if event.startswith('event: ')
+    ]
+    assert events == [
+        {'event': 'start', 'kernel_id': kernel_id, 'cell_id': cell_id, 'path': path},
+        {'event': 'finish', 'kernel_id': kernel_id, 'cell_id': cell_id, 'path': path},
+    ]
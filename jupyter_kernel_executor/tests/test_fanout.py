@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import nbformat
+import pytest
+from tornado.httpclient import HTTPClientError
+
+from .utils import start_kernel, write_notebook
+
+
+@pytest.fixture
+def notebook(jp_root_dir):
+    yield write_notebook(jp_root_dir, 'sweep.ipynb', ["print(alpha * 2)", "", ""])
+
+
+async def fan_out(jp_fetch, body, **kwargs):
+    return await jp_fetch('api', 'kernel_executor', 'execute', method='POST', body=json.dumps(body), **kwargs)
+
+
+def stdout(text):
+    return [{'output_type': 'stream', 'name': 'stdout', 'text': text}]
+
+
+async def test_fan_out_cell(jp_fetch, notebook):
+    path, (cell_id, first_target, second_target), filepath = notebook
+    kernel_ids = [await start_kernel(jp_fetch) for _ in range(3)]
+
+    response = await fan_out(jp_fetch, {
+        'kernel_ids': kernel_ids,
+        'path': path,
+        'cell_id': cell_id,
+        'parameters': {kernel_id: f'alpha = {i}' for i, kernel_id in enumerate(kernel_ids)},
+        'targets': {
+            kernel_ids[0]: {'path': path, 'cell_id': first_target},
+            kernel_ids[1]: {'path': path, 'cell_id': second_target},
+        },
+        'concurrency': 2,
+    })
+    results = json.loads(response.body)['results']
+
+    assert [results[kernel_id]['outputs'] for kernel_id in kernel_ids] == [stdout('0\n'), stdout('2\n'), stdout('4\n')]
+    assert {result['status'] for result in results.values()} == {'ok'}
+
+    for _ in range(10):
+        await asyncio.sleep(0.5)
+        with open(filepath) as f:
+            cells = nbformat.read(f, as_version=nbformat.NO_CONVERT)['cells']
+        if cells[2]['outputs']:
+            break
+    assert [cell['outputs'] for cell in cells] == [[], stdout('0\n'), stdout('2\n')]
+
+
+async def test_fan_out_stream(jp_fetch):
+    kernel_ids = [await start_kernel(jp_fetch) for _ in range(2)]
+
+    response = await fan_out(jp_fetch, {
+        'kernel_ids': kernel_ids,
+        'code': 'print(alpha)',
+        'parameters': {kernel_ids[0]: 'alpha = 1'},
+        'stream': True,
+    })
+    records = [json.loads(line) for line in response.body.decode().splitlines()]
+
+    results = {record['kernel_id']: record for record in records[:-1]}
+    assert results[kernel_ids[0]]['outputs'] == stdout('1\n')
+    assert results[kernel_ids[1]]['status'] == 'error'
+    assert records[-1] == {'type': 'done', 'statuses': {'ok': 1, 'error': 1}}
+
+
+async def test_fan_out_missing_kernel(jp_fetch):
+    kernel_id = await start_kernel(jp_fetch)
+
+    with pytest.raises(HTTPClientError) as e:
+        await fan_out(jp_fetch, {'kernel_ids': [kernel_id, 'a-b-c-d-e'], 'code': '1'})
+    assert e.value.code == 404
+
+
+async def test_fan_out_missing_cell(jp_fetch, notebook):
+    path, (cell_id, _, _), _ = notebook
+    kernel_id = await start_kernel(jp_fetch)
+
+    for body in ({'path': 'missing.ipynb', 'cell_id': cell_id}, {'path': path, 'cell_id': 'missing'}):
+        with pytest.raises(HTTPClientError) as e:
+            await fan_out(jp_fetch, {'kernel_ids': [kernel_id], **body})
+        assert e.value.code == 404
+
+
+async def test_fan_out_unknown_target(jp_fetch, notebook):
+    path, (cell_id, target, _), _ = notebook
+    kernel_id, other_kernel_id = await start_kernel(jp_fetch), await start_kernel(jp_fetch)
+
+    with pytest.raises(HTTPClientError) as e:
+        await fan_out(jp_fetch, {
+            'kernel_ids': [kernel_id],
+            'path': path,
+            'cell_id': cell_id,
+            'targets': {other_kernel_id: {'path': path, 'cell_id': target}},
+        })
+    assert e.value.code == 400
+
+
+async def test_fan_out_methods(jp_fetch):
+    for method in ('GET', 'DELETE'):
+        with pytest.raises(HTTPClientError) as e:
+            await jp_fetch('api', 'kernel_executor', 'execute', method=method)
+        assert e.value.code == 405
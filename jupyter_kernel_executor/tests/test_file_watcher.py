@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import pytest
+from watchfiles import Change
+
+from jupyter_kernel_executor.file_watcher import FileWatcher
+from jupyter_kernel_executor.fileid import FileIDWrapper, FileIdCache
+from jupyter_kernel_executor.locks import KeyedLock
+
+
+def test_watch_filter():
+    watcher = FileWatcher()
+
+    assert watcher.watch_filter(Change.modified, '/root/a.ipynb')
+    assert not watcher.watch_filter(Change.modified, '/root/data.csv')
+    assert not watcher.watch_filter(Change.modified, '/root/.ipynb_checkpoints/a-checkpoint.ipynb')
+    assert not watcher.watch_filter(Change.added, '/root/.~a.ipynb')
+
+    watcher.ignore_globs = ['scratch*']
+    assert not watcher.watch_filter(Change.modified, '/root/scratch-1/a.ipynb')
+
+
+async def test_watch_roots_of_executing_documents(jp_serverapp, jp_root_dir, is_file_id_manager):
+    if not is_file_id_manager:
+        return pytest.skip('no file id manager, nothing to watch for')
+    watcher: FileWatcher = jp_serverapp.web_app.settings['kernel_executor_file_watcher']
+    watcher.file_id_manager = FileIDWrapper(jp_serverapp.web_app.settings['file_id_manager'], KeyedLock())
+    (Path(jp_root_dir) / 'sub').mkdir()
+    root, sub = str(jp_root_dir), str(Path(jp_root_dir) / 'sub')
+
+    watcher.watch(f'{root}/a.ipynb')
+    watcher.watch(f'{root}/b.ipynb')
+    watcher.watch(f'{sub}/c.ipynb')
+    assert watcher.roots == {root: 2, sub: 1}
+    assert watcher.watching == sorted([root, sub])
+
+    watcher.unwatch(f'{sub}/c.ipynb')
+    watcher.unwatch(f'{root}/a.ipynb')
+    assert watcher.watching == [root]
+
+    watcher.unwatch(f'{root}/b.ipynb')
+    assert watcher.roots == {}
+    assert watcher.task is None
+
+
+async def test_resolve_renames_in_batch(jp_serverapp, jp_root_dir, is_file_id_manager):
+    if not is_file_id_manager:
+        return pytest.skip('no file id manager, cannot process it')
+    file_id_manager = jp_serverapp.web_app.settings['file_id_manager']
+    watcher: FileWatcher = jp_serverapp.web_app.settings['kernel_executor_file_watcher']
+    watcher.file_id_manager = FileIDWrapper(file_id_manager, KeyedLock())
+    root = Path(jp_root_dir)
+    ids = dict()
+    for i in range(3):
+        (root / f'{i}.ipynb').write_text('{}')
+        ids[i] = file_id_manager.index(f'{i}.ipynb')
+
+    changes = set()
+    for i in range(3):
+        (root / f'{i}.ipynb').rename(root / f'moved-{i}.ipynb')
+        changes.add((Change.deleted, str(root / f'{i}.ipynb')))
+        changes.add((Change.added, str(root / f'moved-{i}.ipynb')))
+    # not a move, nothing recorded for it
+    (root / 'new.ipynb').write_text('{}')
+    changes.add((Change.added, str(root / 'new.ipynb')))
+    watcher.handle_changes(changes)
+
+    for i in range(3):
+        assert file_id_manager.get_path(ids[i]) == f'moved-{i}.ipynb'
+    assert file_id_manager.get_id('new.ipynb') is None
+
+
+async def test_resync_moved_out_of_watched(jp_serverapp, jp_root_dir, is_file_id_manager):
+    if not is_file_id_manager:
+        return pytest.skip('no file id manager, cannot process it')
+    file_id_manager = jp_serverapp.web_app.settings['file_id_manager']
+    watcher: FileWatcher = jp_serverapp.web_app.settings['kernel_executor_file_watcher']
+    watcher.file_id_manager = FileIDWrapper(file_id_manager, KeyedLock(), FileIdCache())
+    root = Path(jp_root_dir)
+    (root / 'elsewhere').mkdir()
+    (root / 'a.ipynb').write_text('{}')
+    file_id = file_id_manager.index('a.ipynb')
+
+    # only the deletion is seen, the directory it moved to is not watched
+    (root / 'a.ipynb').rename(root / 'elsewhere' / 'a.ipynb')
+    watcher.handle_changes({(Change.deleted, str(root / 'a.ipynb'))})
+
+    path, = file_id_manager.con.execute("SELECT path FROM Files WHERE id = ?", (file_id,)).fetchone()
+    assert path == watcher.file_id_manager.normalize_path('elsewhere/a.ipynb')
+    assert watcher.file_id_manager.cached_entry(file_id).path == path
@@ -0,0 +1,54 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from jupyter_kernel_executor.fileid import FileIDWrapper, FileIdCache
+from jupyter_kernel_executor.locks import KeyedLock
+
+
+@pytest.fixture
+def file_id_wrapper(jp_serverapp, is_file_id_manager):
+    if not is_file_id_manager:
+        return pytest.skip('no file id manager, nothing to cache')
+    return FileIDWrapper(jp_serverapp.web_app.settings['file_id_manager'], KeyedLock(), FileIdCache())
+
+
+async def test_cached_get_path(file_id_wrapper, jp_root_dir):
+    (Path(jp_root_dir) / 'a.ipynb').write_text('{}')
+    file_id = file_id_wrapper.index('a.ipynb')
+
+    assert await file_id_wrapper.get_path(file_id) == 'a.ipynb'
+    assert file_id_wrapper.index('a.ipynb') == file_id
+    assert file_id_wrapper.cache.stats()['hits'] == 2
+
+    file_id_wrapper.cache.ttl = 0.001
+    # replaced behind our back, inode checked once ttl elapsed
+    os.rename(Path(jp_root_dir) / 'a.ipynb', Path(jp_root_dir) / 'b.ipynb')
+    (Path(jp_root_dir) / 'a.ipynb').write_text('{}')
+    time.sleep(0.01)
+    assert file_id_wrapper.cached_entry(file_id) is None
+
+
+async def test_move_invalidates(file_id_wrapper, jp_root_dir):
+    (Path(jp_root_dir) / 'a.ipynb').write_text('{}')
+    file_id = file_id_wrapper.index('a.ipynb')
+    assert await file_id_wrapper.get_path(file_id) == 'a.ipynb'
+
+    os.rename(Path(jp_root_dir) / 'a.ipynb', Path(jp_root_dir) / 'b.ipynb')
+    file_id_wrapper.move('a.ipynb', 'b.ipynb')
+
+    assert await file_id_wrapper.get_path(file_id) == 'b.ipynb'
+
+
+async def test_get_paths(file_id_wrapper, jp_root_dir):
+    file_ids = dict()
+    for name in ('a.ipynb', 'b.ipynb', 'c.ipynb'):
+        (Path(jp_root_dir) / name).write_text('{}')
+        file_ids[file_id_wrapper.file_id_manager.index(name)] = name
+    # one of them cached already
+    await file_id_wrapper.get_path(next(iter(file_ids)))
+
+    assert await file_id_wrapper.get_paths(list(file_ids)) == file_ids
+    assert file_id_wrapper.cache.stats()['entries'] == 3
@@ -60,8 +60,8 @@ async def test_execute_cell(jp_fetch, ipynb):
     # wait for finished
     await wait_for_finished(jp_fetch, kernel_id, ipynb_path, cell_id)
 
-    outputs = [{'name': 'stdout', 'output_type': 'stream', 'text': 'hello\n'},
-               {'name': 'stdout', 'output_type': 'stream', 'text': 'world\n'}]
+    # consecutive stream messages are merged
+    outputs = [{'name': 'stdout', 'output_type': 'stream', 'text': 'hello\nworld\n'}]
     await assert_ipynb_cell_outputs(real_path, cell_id, outputs)
 
 
@@ -86,8 +86,8 @@ async def test_execute_cell_abspath(jp_fetch, ipynb):
     # wait for finished
     await wait_for_finished(jp_fetch, kernel_id, ipynb_path, cell_id)
 
-    outputs = [{'name': 'stdout', 'output_type': 'stream', 'text': 'hello\n'},
-               {'name': 'stdout', 'output_type': 'stream', 'text': 'world\n'}]
+    # consecutive stream messages are merged
+    outputs = [{'name': 'stdout', 'output_type': 'stream', 'text': 'hello\nworld\n'}]
     await assert_ipynb_cell_outputs(real_path, cell_id, outputs)
 
 
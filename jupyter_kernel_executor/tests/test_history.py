@@ -0,0 +1,114 @@
+import json
+import time
+
+import pytest
+
+from jupyter_kernel_executor.history import ExecutionHistory
+from .utils import start_kernel, write_notebook
+
+
+@pytest.fixture
+def notebook(jp_root_dir):
+    path, cell_ids, _ = write_notebook(jp_root_dir, 'history.ipynb', ["print('hello')", "1 / 0"])
+    yield path, cell_ids
+
+
+async def fetch_history(jp_fetch, *parts, **params):
+    response = await jp_fetch('api', 'kernel_executor', 'history', *parts, params=params)
+    return json.loads(response.body)
+
+
+def add(history, kernel_id, cell_id, seconds, finished, status='ok'):
+    history.add(kernel_id, 'doc', cell_id, 'a.ipynb', status, 1, finished - seconds - 1, finished - seconds, finished,
+                output_bytes=10)
+
+
+async def test_query_and_prune(tmp_path):
+    history = ExecutionHistory(db_path=str(tmp_path / 'history.db'), max_entries=4)
+    now = time.time()
+    for i in range(6):
+        add(history, 'k1' if i % 2 else 'k2', f'cell{i}', i, now - 60 + i)
+    # the 2 oldest are pruned
+    entries, before = history.query(limit=3)
+    assert [entry['cell_id'] for entry in entries] == ['cell5', 'cell4', 'cell3']
+    entries, before = history.query(before=before, limit=3)
+    assert [entry['cell_id'] for entry in entries] == ['cell2']
+    assert before is None
+    assert entries[0]['queue_seconds'] == 1
+    assert entries[0]['execute_seconds'] == 2
+    assert entries[0]['finished'].endswith('Z')
+
+    entries, _ = history.query(kernel_id='k1', min_seconds=4)
+    assert [entry['cell_id'] for entry in entries] == ['cell5']
+    entries, _ = history.query(until=now - 57)
+    assert [entry['cell_id'] for entry in entries] == ['cell2']
+
+    history.retention = 30
+    add(history, 'k1', 'cell6', 0, now)
+    assert [entry['cell_id'] for entry in history.query()[0]] == ['cell6']
+    assert history.stats()['pruned'] == 6
+    await history.close()
+
+
+async def test_summary(tmp_path):
+    history = ExecutionHistory(db_path=str(tmp_path / 'history.db'))
+    now = time.time()
+    add(history, 'k1', 'slow', 5, now)
+    add(history, 'k1', 'fast', 1, now, status='error')
+    add(history, 'k2', 'fast', 1, now)
+    add(history, 'k2', 'fast', 1, now)
+
+    slowest = history.summary(by='cell', order='max')
+    assert [group['cell_id'] for group in slowest] == ['slow', 'fast']
+    assert slowest[1]['executions'] == 3
+    assert slowest[1]['failures'] == 1
+    assert slowest[1]['path'] == 'a.ipynb'
+    kernels = history.summary(by='kernel', limit=1)
+    assert kernels == [{
+        'kernel_id': 'k1', 'executions': 2, 'failures': 1, 'execute_seconds': 6, 'mean_seconds': 3,
+        'max_seconds': 5, 'queue_seconds': 2, 'output_bytes': 20, 'last_finished': kernels[0]['last_finished'],
+    }]
+    await history.close()
+
+
+async def test_history_endpoints(jp_fetch, notebook):
+    path, (hello, failing) = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    for cell_id in (hello, failing, hello):
+        await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+            'path': path, 'cell_id': cell_id, 'block': True,
+        }))
+
+    page = await fetch_history(jp_fetch, path=path, limit=2)
+    assert [entry['cell_id'] for entry in page['executions']] == [hello, failing]
+    latest = page['executions'][0]
+    assert latest['kernel_id'] == kernel_id
+    assert latest['path'] == path
+    assert latest['status'] == 'ok'
+    assert latest['execution_count'] == 3
+    assert latest['output_bytes'] == len('hello\n')
+    assert page['executions'][1]['status'] == 'error'
+    page = await fetch_history(jp_fetch, path=path, before=page['next'])
+    assert [entry['cell_id'] for entry in page['executions']] == [hello]
+    assert page['next'] is None
+
+    assert (await fetch_history(jp_fetch, path='missing.ipynb')) == {'executions': [], 'next': None}
+    summary = await fetch_history(jp_fetch, 'summary', by='cell', order='count', kernel_id=kernel_id)
+    assert [(group['cell_id'], group['executions']) for group in summary] == [(hello, 2), (failing, 1)]
+
+
+async def test_invalid_arguments(jp_fetch):
+    for params in ({'since': 'yesterday'}, {'limit': 'all'}):
+        with pytest.raises(Exception) as e:
+            await jp_fetch('api', 'kernel_executor', 'history', params=params)
+        assert e.value.code == 400
+    with pytest.raises(Exception) as e:
+        await jp_fetch('api', 'kernel_executor', 'history', 'summary', params={'by': 'user'})
+    assert e.value.code == 400
+
+
+async def test_history_methods(jp_fetch):
+    for method, kwargs in (('POST', {'body': '{}'}), ('DELETE', {})):
+        with pytest.raises(Exception) as e:
+            await jp_fetch('api', 'kernel_executor', 'history', method=method, **kwargs)
+        assert e.value.code == 405
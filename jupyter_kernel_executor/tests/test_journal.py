@@ -0,0 +1,146 @@
+import json
+from pathlib import Path
+
+import nbformat
+import pytest
+
+from jupyter_kernel_executor.journal import ExecutionJournal
+from jupyter_kernel_executor.runs import Run
+from .utils import start_kernel, wait_until, write_notebook
+
+
+def result(text, execution_count=1):
+    return {'outputs': [nbformat.v4.new_output('stream', name='stdout', text=text)], 'execution_count': execution_count}
+
+
+@pytest.fixture
+def notebook(jp_root_dir):
+    yield write_notebook(jp_root_dir, 'journaled.ipynb', [
+        "print('done')",
+        "print('a')\nprint('b')\nimport time\ntime.sleep(100)",
+    ])
+
+
+@pytest.fixture
+def jp_server_config(jp_server_config, jp_root_dir, tmp_path, notebook):
+    """a journal left by a server stopped while executing, and a running server of another root"""
+    path, (done, cut_off), _ = notebook
+    db_path = str(tmp_path / 'journal.db')
+    other = ExecutionJournal(enabled=True, db_path=db_path, root_dir=str(tmp_path / 'other'))
+    other.record('other-id', path, done, result('other\n'))
+    other.save_run(Run('other-kernel', 'other-id', path, [done], run_id='other-run').to_model())
+    other.close()
+    journal = ExecutionJournal(enabled=True, db_path=db_path, root_dir=str(jp_root_dir))
+    journal.record('gone-id', path, done, result('done\n'))
+    entry_id = journal.start('old-kernel', 'gone-id', path, cut_off)
+    journal.output(entry_id, nbformat.v4.new_output('stream', name='stdout', text='a\n'))
+    journal.output(entry_id, nbformat.v4.new_output('stream', name='stdout', text='b\n'))
+    finished = Run('old-kernel', 'gone-id', path, [done], run_id='finished-run')
+    finished.finish('finished')
+    journal.save_run(finished.to_model())
+    journal.save_run(Run('old-kernel', 'gone-id', path, [cut_off], run_id='running-run').to_model())
+    journal.close()
+    return {**jp_server_config, 'ExecutionJournal': {'enabled': True, 'db_path': db_path}}
+
+
+@pytest.fixture
+def journal(jp_serverapp) -> ExecutionJournal:
+    return jp_serverapp.web_app.settings['kernel_executor_journal']
+
+
+async def test_record(tmp_path):
+    journal = ExecutionJournal(enabled=True, db_path=str(tmp_path / 'journal.db'))
+    entry_id = journal.start('k', 'doc', 'a.ipynb', 'cell', {'cell_id': 'cell'})
+    journal.output(entry_id, nbformat.v4.new_output('stream', name='stdout', text='partial\n'))
+    assert journal.unwritten()[0]['result']['outputs'][-1]['ename'] == 'ExecutionInterrupted'
+
+    assert journal.record('doc', 'a.ipynb', 'cell', result('1\n'), entry_id) == entry_id
+    # a newer result of the cell replaces it
+    newer = journal.record('doc', 'a.ipynb', 'cell', result('2\n', 2))
+    entries = journal.unwritten()
+    assert [entry['id'] for entry in entries] == [newer]
+    assert entries[0]['result'] == result('2\n', 2)
+
+    journal.written([newer])
+    assert journal.unwritten() == []
+    assert journal.stats()['unwritten'] == 0
+    journal.close()
+
+
+async def test_outputs_buffered(tmp_path):
+    journal = ExecutionJournal(enabled=True, db_path=str(tmp_path / 'journal.db'), max_pending=2)
+    entry_id = journal.start('k', 'doc', 'a.ipynb', 'cell')
+    journal.output(entry_id, nbformat.v4.new_output('stream', name='stdout', text='a\n'))
+    assert journal.stats()['pending_outputs'] == 1
+    # inserted together once max_pending are waiting
+    journal.output(entry_id, nbformat.v4.new_output('stream', name='stdout', text='b\n'))
+    await wait_until(lambda: not journal.pending)
+    assert journal.con.execute("SELECT COUNT(*) FROM outputs").fetchone()[0] == 2
+    journal.close()
+
+
+async def test_replay_on_start(jp_fetch, journal, notebook):
+    path, (done, cut_off), filepath = notebook
+
+    def written():
+        with open(filepath) as f:
+            return all(cell['outputs'] for cell in nbformat.read(f, as_version=nbformat.NO_CONVERT)['cells'])
+
+    await wait_until(written)
+    with open(filepath) as f:
+        cells = nbformat.read(f, as_version=nbformat.NO_CONVERT)['cells']
+    assert cells[0]['outputs'][0]['text'] == 'done\n'
+    assert cells[0]['execution_count'] == 1
+    # outputs so far, merged, then why it ended
+    assert cells[1]['outputs'][0]['text'] == 'a\nb\n'
+    assert cells[1]['outputs'][1]['ename'] == 'ExecutionInterrupted'
+    assert journal.unwritten() == []
+
+    response = await jp_fetch('api', 'kernel_executor', 'runs', 'finished-run')
+    assert json.loads(response.body)['status'] == 'finished'
+    response = await jp_fetch('api', 'kernel_executor', 'runs', 'running-run')
+    run = json.loads(response.body)
+    assert run['status'] == 'failed'
+    assert run['cells'][0]['status'] == 'skipped'
+
+    # the other server's result and run are left alone
+    other_root = str(Path(journal.db_path).parent / 'other')
+    other = ExecutionJournal(enabled=True, db_path=journal.db_path, root_dir=other_root)
+    assert [entry['document_id'] for entry in other.unwritten()] == ['other-id']
+    assert other.get_run('other-run')['status'] == 'pending'
+    other.close()
+
+
+async def test_journal_async_execution(jp_fetch, journal, notebook):
+    path, (done, cut_off), filepath = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    await wait_until(lambda: not journal.unwritten())
+
+    await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        'path': path,
+        'cell_id': cut_off,
+        'timeout': 3,
+    }))
+    # outputs are journaled while it runs
+    await wait_until(lambda: journal.unwritten() and len(journal.unwritten()[0]['result']['outputs']) == 2)
+    assert journal.unwritten()[0]['result']['outputs'][0]['text'] == 'a\nb\n'
+
+    # and dropped once saved
+    await wait_until(lambda: not journal.unwritten())
+    with open(filepath) as f:
+        outputs = nbformat.read(f, as_version=nbformat.NO_CONVERT)['cells'][1]['outputs']
+    assert outputs[-1]['ename'] == 'ExecutionTimeout'
+
+
+async def test_runs_journaled(jp_fetch, journal, notebook):
+    path, (done, cut_off), _ = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    response = await jp_fetch('api', 'kernels', kernel_id, 'runs', method='POST', body=json.dumps({
+        'path': path,
+        'cell_ids': [done],
+        'block': True,
+    }))
+    run = json.loads(response.body)
+    assert journal.get_run(run['run_id'])['status'] == 'finished'
+    response = await jp_fetch('api', 'kernel_executor', 'runs', run['run_id'])
+    assert json.loads(response.body)['cells'][0]['outputs'][0]['text'] == 'done\n'
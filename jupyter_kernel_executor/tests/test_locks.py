@@ -0,0 +1,31 @@
+import asyncio
+import json
+
+from jupyter_kernel_executor.locks import KeyedLock
+
+
+async def test_keyed_lock():
+    locks = KeyedLock()
+    events = []
+
+    async def hold(key, name):
+        async with locks(key):
+            events.append(f'{name} start')
+            await asyncio.sleep(0.1)
+            events.append(f'{name} end')
+
+    await asyncio.gather(hold('a.ipynb', 'a1'), hold('a.ipynb', 'a2'), hold('b.ipynb', 'b1'))
+
+    # same key in order, different key in parallel
+    assert events == ['a1 start', 'b1 start', 'a1 end', 'b1 end', 'a2 start', 'a2 end']
+    assert locks.locks == {}
+    assert locks.stats()['acquired'] == 3
+    assert locks.stats()['wait_seconds_max'] > 0
+
+
+async def test_stats(jp_fetch):
+    response = await jp_fetch('api', 'kernel_executor', 'stats', method='GET')
+
+    payload = json.loads(response.body)
+    assert payload['document_locks']['waiting'] == 0
+    assert payload['write_buffer']['pending'] == 0
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from jupyter_kernel_executor import metrics
+from .utils import start_kernel, write_notebook
+
+
+@pytest.fixture
+def notebook(jp_root_dir):
+    path, (cell_id,), _ = write_notebook(jp_root_dir, 'metrics.ipynb', ["print('hello')"])
+    yield path, cell_id
+
+
+def sample(name, **labels):
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_running():
+    with metrics.running('k'):
+        with metrics.running('k'):
+            assert sample('kernel_executor_running_executions', kernel_id='k') == 2
+        assert sample('kernel_executor_running_executions', kernel_id='k') == 1
+    # no series left behind for the kernel
+    assert metrics.REGISTRY.get_sample_value('kernel_executor_running_executions', {'kernel_id': 'k'}) is None
+
+
+async def test_phases_and_errors(jp_fetch, notebook):
+    path, cell_id = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    phases = ('notebook_read', 'path_resolution', 'kernel_execute', 'write_back')
+    before = {phase: sample('kernel_executor_phase_seconds_count', phase=phase) for phase in phases}
+    errors = sample('kernel_executor_errors_total', kind='error')
+
+    await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        'path': path, 'cell_id': cell_id, 'block': True,
+    }))
+    await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({'code': '1 / 0'}))
+
+    for phase in phases:
+        assert sample('kernel_executor_phase_seconds_count', phase=phase) > before[phase], phase
+    assert sample('kernel_executor_errors_total', kind='error') == errors + 1
+
+
+async def test_skipped_duplicates(jp_fetch, notebook):
+    path, cell_id = notebook
+    kernel_id = await start_kernel(jp_fetch)
+    skipped = sample('kernel_executor_skipped_duplicates_total')
+    # holds the kernel, so the cell stays queued
+    await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        'code': 'import time; time.sleep(1)', 'path': path, 'cell_id': 'other', 'not_write': True,
+    }))
+
+    for _ in range(2):
+        await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+            'path': path, 'cell_id': cell_id, 'not_write': True,
+        }))
+    assert sample('kernel_executor_skipped_duplicates_total') == skipped + 1
+
+
+async def test_endpoints(jp_fetch):
+    kernel_id = await start_kernel(jp_fetch)
+    await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({'code': 'pass'}))
+
+    response = await jp_fetch('api', 'kernel_executor', 'metrics')
+    assert response.headers['Content-Type'].startswith('text/plain')
+    text = response.body.decode()
+    assert 'kernel_executor_phase_seconds_bucket{' in text
+    assert 'kernel_executor_lock_waiters 0.0' in text
+    # the server's own metrics include them
+    response = await jp_fetch('metrics')
+    assert 'kernel_executor_phase_seconds_count{phase="kernel_execute"}' in response.body.decode()
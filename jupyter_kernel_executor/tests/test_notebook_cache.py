@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+import tornado.httpclient
+
+from jupyter_kernel_executor.notebook_cache import NotebookCache
+from .utils import write_notebook
+
+
+@pytest.fixture
+def contents_manager(jp_serverapp):
+    return jp_serverapp.contents_manager
+
+
+async def test_cache_hit(jp_root_dir, contents_manager):
+    cache = NotebookCache()
+    path, (cell_id,), _ = write_notebook(jp_root_dir, 'a.ipynb', ["print('hello')"])
+
+    first = await cache.get(path, path, contents_manager)
+    second = await cache.get(path, path, contents_manager)
+
+    assert first is second
+    assert second.cells[cell_id]['source'] == "print('hello')"
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+async def test_cache_miss_when_modified(jp_root_dir, contents_manager):
+    cache = NotebookCache()
+    path, (cell_id,), real_path = write_notebook(jp_root_dir, 'a.ipynb', ["print('hello')"])
+    await cache.get(path, path, contents_manager)
+
+    write_notebook(jp_root_dir, 'a.ipynb', ["print('world')"])
+    os.utime(real_path, ns=(0, 0))
+    notebook = await cache.get(path, path, contents_manager)
+
+    assert list(notebook.cells.values())[0]['source'] == "print('world')"
+    assert cache.stats()['misses'] == 2
+
+
+async def test_invalidate_path(jp_root_dir, contents_manager):
+    cache = NotebookCache()
+    path, _, real_path = write_notebook(jp_root_dir, 'a.ipynb', ["print('hello')"])
+    await cache.get(path, path, contents_manager)
+
+    cache.invalidate_path(real_path.as_posix())
+
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['bytes'] == 0
+
+
+async def test_memory_budget(jp_root_dir, contents_manager):
+    cache = NotebookCache()
+    path_a, _, real_path = write_notebook(jp_root_dir, 'a.ipynb', ["print('hello')"])
+    path_b, _, _ = write_notebook(jp_root_dir, 'b.ipynb', ["print('world')"])
+    cache.max_bytes = os.stat(real_path).st_size + 1
+
+    await cache.get(path_a, path_a, contents_manager)
+    await cache.get(path_b, path_b, contents_manager)
+
+    assert list(cache.entries) == [path_b]
+    assert cache.stats()['evictions'] == 1
+
+
+async def test_missing_notebook(jp_fetch):
+    kernel_response = await jp_fetch('api', 'kernels', method='POST', body=json.dumps({'name': 'python3'}))
+    kernel_id = json.loads(kernel_response.body)['id']
+
+    with pytest.raises(tornado.httpclient.HTTPClientError) as e:
+        await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+            'path': 'missing.ipynb', 'cell_id': 'cell',
+        }))
+    assert e.value.code == 404
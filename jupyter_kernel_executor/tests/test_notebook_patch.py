@@ -0,0 +1,120 @@
+import json
+import os
+import stat
+
+import nbformat
+import pytest
+from jupyter_server.services.contents.filemanager import FileContentsManager
+
+from jupyter_kernel_executor.blobs import BlobStore
+from jupyter_kernel_executor.notebook_patch import PatchError, local_os_path, patch_notebook, patch_text
+
+
+def new_notebook():
+    nb = nbformat.v4.new_notebook()
+    nb['cells'] = [
+        nbformat.v4.new_markdown_cell('# title'),
+        nbformat.v4.new_code_cell("print('a')", outputs=[
+            nbformat.v4.new_output('stream', name='stdout', text='old\n'),
+        ], execution_count=1),
+        nbformat.v4.new_code_cell("display(x)"),
+    ]
+    return nb
+
+
+def results():
+    return {
+        'stream': {
+            'outputs': [nbformat.v4.new_output('stream', name='stdout', text='new\nlines é\n')],
+            'execution_count': 2,
+        },
+        'display': {
+            'outputs': [nbformat.v4.new_output('display_data', data={'text/plain': 'x\ny', 'application/json': {'a': 1}})],
+            'execution_count': 3,
+        },
+    }
+
+
+def test_patch_as_nbformat_writes():
+    nb = new_notebook()
+    text = nbformat.writes(nb)
+    stream, display = nb['cells'][1]['id'], nb['cells'][2]['id']
+    updates = {stream: results()['stream'], display: results()['display']}
+
+    patched = patch_text(text, updates, BlobStore())
+
+    for cell_id, result in updates.items():
+        cell = next(cell for cell in nb['cells'] if cell['id'] == cell_id)
+        cell['outputs'] = result['outputs']
+        cell['execution_count'] = result['execution_count']
+    # byte for byte what saving the whole notebook writes
+    assert patched == nbformat.writes(nb)
+    # written again, nothing changes
+    assert patch_text(patched, updates, BlobStore()) is None
+
+
+def test_patch_compact_file():
+    nb = new_notebook()
+    text = json.dumps(nb)
+    stream = nb['cells'][1]['id']
+
+    patched = nbformat.reads(patch_text(text, {stream: results()['stream']}, BlobStore()), as_version=4)
+
+    assert patched['cells'][1]['outputs'][0]['text'] == 'new\nlines é\n'
+    assert patched['cells'][1]['execution_count'] == 2
+    assert patched['cells'][0] == nb['cells'][0]
+
+
+def test_cannot_patch():
+    nb = new_notebook()
+    text = nbformat.writes(nb)
+    # markdown cells have no outputs
+    for cell_id in (nb['cells'][0]['id'], 'missing'):
+        with pytest.raises(PatchError):
+            patch_text(text, {cell_id: results()['stream']}, BlobStore())
+    with pytest.raises(PatchError):
+        patch_text(text[:-10], {nb['cells'][1]['id']: results()['stream']}, BlobStore())
+
+
+def test_patch_notebook(tmp_path):
+    nb = new_notebook()
+    os_path = str(tmp_path / 'a.ipynb')
+    with open(os_path, 'w') as f:
+        nbformat.write(nb, f)
+    os.chmod(os_path, 0o640)
+    inode = os.stat(os_path).st_ino
+
+    assert patch_notebook(os_path, {nb['cells'][1]['id']: results()['stream']}, BlobStore())
+
+    with open(os_path) as f:
+        assert nbformat.read(f, as_version=4)['cells'][1]['execution_count'] == 2
+    assert stat.S_IMODE(os.stat(os_path).st_mode) == 0o640
+    # written in place, its file id is kept
+    assert os.stat(os_path).st_ino == inode
+    # no backup file left behind
+    assert os.listdir(tmp_path) == ['a.ipynb']
+
+
+def test_patch_symlink(tmp_path):
+    nb = new_notebook()
+    os_path = str(tmp_path / 'a.ipynb')
+    with open(os_path, 'w') as f:
+        nbformat.write(nb, f)
+    link = str(tmp_path / 'link.ipynb')
+    os.symlink(os_path, link)
+
+    assert patch_notebook(link, {nb['cells'][1]['id']: results()['stream']}, BlobStore())
+
+    assert os.path.islink(link)
+    with open(os_path) as f:
+        assert nbformat.read(f, as_version=4)['cells'][1]['execution_count'] == 2
+
+
+def test_local_os_path(tmp_path):
+    contents_manager = FileContentsManager(root_dir=str(tmp_path))
+    assert local_os_path(contents_manager, 'a.ipynb') == str(tmp_path / 'a.ipynb')
+    assert local_os_path(contents_manager, 'a.py') is None
+    assert local_os_path(contents_manager, '.hidden/a.ipynb') is None
+
+    contents_manager.register_post_save_hook(lambda **kwargs: None)
+    assert local_os_path(contents_manager, 'a.ipynb') is None
@@ -0,0 +1,114 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import nbformat
+import pytest
+
+from jupyter_kernel_executor.outputs import MARKER_KEY, OutputLimits
+from .utils import start_kernel
+
+
+@pytest.fixture
+def output_limits(jp_serverapp):
+    return jp_serverapp.web_app.settings['kernel_executor_output_limits']
+
+
+def stream(text, name='stdout'):
+    return nbformat.v4.new_output('stream', name=name, text=text)
+
+
+def test_merge_streams(tmp_path):
+    collector = OutputLimits(spill_dir=str(tmp_path)).collector()
+    shown = collector.add(stream('4'))
+    collector.add(stream('\n'))
+    collector.add(stream('oops\n', name='stderr'))
+    collector.add(stream('5\n'))
+
+    assert [output['text'] for output in collector.outputs] == ['4\n', 'oops\n', '5\n']
+    # what was shown stays as it was
+    assert shown == [stream('4')]
+
+
+def test_truncate_and_spill_stream(tmp_path):
+    limits = OutputLimits(max_stream_bytes=10, spill_dir=str(tmp_path))
+    collector = limits.collector()
+
+    assert collector.add(stream('0123456')) == [stream('0123456')]
+    shown = collector.add(stream('789abc'))
+    assert shown[0] == stream('789')
+    assert shown[1]['metadata'][MARKER_KEY]['truncated'] == 'stdout'
+    # marker shown once, kept updated
+    assert collector.add(stream('def')) == []
+    # stderr has its own cap
+    assert collector.add(stream('é', name='stderr')) == [stream('é', name='stderr')]
+
+    text, marker, _ = collector.outputs
+    assert text['text'] == '0123456789'
+    info = marker['metadata'][MARKER_KEY]
+    assert info['bytes'] == 6
+    assert marker['data']['text/plain'] == f"[stdout truncated, 6 more bytes kept in {info['spill']}]"
+    assert (tmp_path / info['spill']).read_text() == 'abcdef'
+    assert collector.spill_ids() == [info['spill']]
+    collector.close()
+    assert all(spill.file is None for spill in collector.spills.values())
+
+
+def test_spill_rich_outputs(tmp_path):
+    limits = OutputLimits(max_output_bytes=200, spill_dir=str(tmp_path))
+    collector = limits.collector(keep=False)
+    small = nbformat.v4.new_output('display_data', data={'text/plain': 'small'})
+    big = nbformat.v4.new_output('display_data', data={'text/plain': 'x' * 200})
+
+    assert collector.add(small) == [small]
+    marker, = collector.add(big)
+    assert collector.outputs == []
+
+    lines = (tmp_path / marker['metadata'][MARKER_KEY]['spill']).read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [big]
+
+
+def test_drop_without_spill(tmp_path):
+    limits = OutputLimits(max_stream_bytes=1, spill=False, spill_dir=str(tmp_path))
+    collector = limits.collector()
+    collector.add(stream('ab'))
+
+    marker = collector.outputs[-1]
+    assert marker['metadata'][MARKER_KEY]['spill'] is None
+    assert marker['data']['text/plain'] == '[stdout truncated, 1 more bytes dropped]'
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_prune_spills(tmp_path):
+    limits = OutputLimits(spill_dir=str(tmp_path), spill_retention=3600, max_spill_bytes=10)
+    now = time.time()
+    for name, age, size in (('expired', 7200, 1), ('old', 60, 6), ('new', 0, 6)):
+        (tmp_path / name).write_text('x' * size)
+        os.utime(tmp_path / name, (now - age, now - age))
+
+    # expired, then the oldest beyond max_spill_bytes
+    assert limits.prune() == ['expired', 'old']
+    assert [path.name for path in tmp_path.iterdir()] == ['new']
+    assert OutputLimits(spill_dir=str(tmp_path / 'missing')).prune() == []
+
+
+async def test_fetch_spilled_output(jp_fetch, output_limits, tmp_path):
+    output_limits.max_stream_bytes = 100
+    output_limits.spill_dir = str(tmp_path)
+    kernel_id = await start_kernel(jp_fetch)
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        'code': "print('x' * 1000)",
+    }))
+    text, marker = json.loads(response.body)['outputs']
+    assert text['text'] == 'x' * 100
+    info = marker['metadata'][MARKER_KEY]
+    assert info['bytes'] == 901
+
+    response = await jp_fetch('api', 'kernel_executor', 'outputs', info['spill'], headers={
+        'Range': 'bytes=895-',
+    })
+    assert response.code == 206
+    assert response.body == b'xxxxx\n'
+    assert Path(tmp_path / info['spill']).stat().st_size == 901
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+from jupyter_client import KernelManager
+from jupyter_client.asynchronous import AsyncKernelClient
+
+from jupyter_kernel_client.client import KernelWebsocketClient
+
+from jupyter_kernel_executor.pool import KernelConnection, ZMQKernelConnection
+from .utils import start_kernel
+
+
+@pytest.fixture
+def connection_pool(jp_serverapp):
+    return jp_serverapp.web_app.settings['kernel_executor_connection_pool']
+
+
+async def execute_code(jp_fetch, kernel_id, code):
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        "code": code
+    }))
+    assert response.code == 200
+    return json.loads(response.body)
+
+
+async def test_reuse_connection(jp_fetch, connection_pool):
+    kernel_id = await start_kernel(jp_fetch)
+
+    first = await execute_code(jp_fetch, kernel_id, "print('hello')")
+    connection = connection_pool.connections[kernel_id][0]
+    second = await execute_code(jp_fetch, kernel_id, "print('world')")
+
+    assert first['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': 'hello\n'}]
+    assert second['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': 'world\n'}]
+    assert connection_pool.connections[kernel_id] == [connection]
+
+
+async def test_multiplex_concurrent_execution(jp_fetch, connection_pool):
+    kernel_id = await start_kernel(jp_fetch)
+
+    payloads = await asyncio.gather(*[
+        execute_code(jp_fetch, kernel_id, f"print({i})") for i in range(5)
+    ])
+
+    for i, payload in enumerate(payloads):
+        assert payload['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': f'{i}\n'}]
+    assert len(connection_pool.connections[kernel_id]) == 1
+
+
+async def test_cull_shutdown_kernel(jp_fetch, connection_pool):
+    kernel_id = await start_kernel(jp_fetch)
+    await execute_code(jp_fetch, kernel_id, "print('hello')")
+    assert kernel_id in connection_pool.connections
+
+    await jp_fetch('api', 'kernels', kernel_id, method='DELETE')
+    await connection_pool.cull()
+
+    assert kernel_id not in connection_pool.connections
+
+
+async def test_release_on_kernel_shutdown(jp_fetch, connection_pool):
+    kernel_id = await start_kernel(jp_fetch)
+    await execute_code(jp_fetch, kernel_id, "print('hello')")
+    connection = connection_pool.connections[kernel_id][0]
+
+    await jp_fetch('api', 'kernels', kernel_id, method='DELETE')
+    # released on next use, without waiting for the culler
+    with pytest.raises(ConnectionError):
+        await connection_pool.acquire(KernelWebsocketClient(kernel_id=kernel_id))
+
+    assert kernel_id not in connection_pool.connections
+    assert not connection.is_healthy()
+
+
+def test_abstract_connection():
+    with pytest.raises(TypeError):
+        KernelConnection('kernel', None)
+
+
+async def test_disable_pool(jp_fetch, connection_pool):
+    connection_pool.enabled = False
+    kernel_id = await start_kernel(jp_fetch)
+
+    payload = await execute_code(jp_fetch, kernel_id, "print('hello')")
+
+    assert payload['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': 'hello\n'}]
+    assert kernel_id not in connection_pool.connections
+
+
+async def test_zmq_backend(jp_fetch, connection_pool):
+    connection_pool.backend = 'zmq'
+    kernel_id = await start_kernel(jp_fetch)
+
+    first = await execute_code(jp_fetch, kernel_id, "print('hello world')")
+    second = await execute_code(jp_fetch, kernel_id, "1 + 1")
+
+    assert first == {'code': "print('hello world')",
+                     'outputs': [{'output_type': 'stream', 'name': 'stdout', 'text': 'hello world\n'}],
+                     'execution_count': 1}
+    assert second == {'code': "1 + 1",
+                      'outputs': [{'output_type': 'execute_result', 'data': {'text/plain': '2'},
+                                   'metadata': {}, 'execution_count': 2}],
+                      'execution_count': 2}
+    assert isinstance(connection_pool.connections[kernel_id][0], ZMQKernelConnection)
+
+
+def test_zmq_async_client_of_blocking_manager():
+    kernel = KernelManager(shell_port=1234, iopub_port=1235)
+    assert not isinstance(kernel.client(), AsyncKernelClient)
+
+    client = ZMQKernelConnection('kernel', kernel, None).create_client()
+
+    assert isinstance(client, AsyncKernelClient)
+    assert (client.shell_port, client.iopub_port) == (1234, 1235)
+    assert client.session.key == kernel.session.key
@@ -0,0 +1,28 @@
+from jupyter_kernel_executor.registry import ExecutionRegistry
+
+
+def test_execution_registry():
+    executions = ExecutionRegistry()
+
+    record = executions.add('k1', 'd1', 'c1', path='a.ipynb')
+    assert record.metadata == {'path': 'a.ipynb'}
+    # same cell on same kernel is tracked once
+    assert executions.add('k1', 'd1', 'c1') is None
+    executions.add('k1', 'd2', 'c1')
+    executions.add('k2', 'd1', 'c1')
+
+    assert len(executions) == 3
+    assert executions.is_executing('k1', 'd1', 'c1')
+    assert [r.document_id for r in executions.on_kernel('k1')] == ['d1', 'd2']
+    assert [r.kernel_id for r in executions.on_document('d1')] == ['k1', 'k2']
+    assert [r.kernel_id for r in executions.on_cell('d1', 'c1')] == ['k1', 'k2']
+    assert executions.documents() == ['d1', 'd2']
+
+    assert executions.remove('k1', 'd1', 'c1') is record
+    assert executions.remove('k1', 'd1', 'c1') is None
+    executions.remove('k1', 'd2', 'c1')
+    executions.remove('k2', 'd1', 'c1')
+
+    # nothing left behind in indexes
+    assert len(executions) == 0
+    assert executions.by_kernel == executions.by_document == executions.by_cell == {}
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from jupyter_kernel_executor.result_cache import ResultCache
+from .utils import start_kernel
+
+
+@pytest.fixture
+def result_cache(jp_serverapp):
+    return jp_serverapp.web_app.settings['kernel_executor_result_cache']
+
+
+async def execute_code(jp_fetch, kernel_id, body):
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps(body))
+    return json.loads(response.body)
+
+
+def result(text):
+    return {'outputs': [{'output_type': 'stream', 'name': 'stdout', 'text': text}], 'execution_count': 1}
+
+
+def test_lru_budget():
+    cache = ResultCache(max_bytes=len(json.dumps(result('a'))) * 2)
+    state = cache.state('k', None)
+    a, b, c = (cache.key('k', state, code) for code in 'abc')
+    cache.put(a, result('a'))
+    cache.put(b, result('b'))
+    assert cache.get(a) == result('a')
+    cache.put(c, result('c'))
+
+    # b was the least recently used
+    assert cache.get(b) is None
+    assert cache.get(c) == result('c')
+    assert cache.stats()['evictions'] == 1
+
+
+def test_state():
+    cache = ResultCache()
+    state = cache.state('k', None)
+    assert cache.state('k', None) == state
+    cache.bump('k')
+    assert cache.state('k', None) != state
+    assert cache.state('k', None, token='v1') == cache.state('other', None, token='v1')
+
+
+async def test_cached_execution(jp_fetch, result_cache):
+    kernel_id = await start_kernel(jp_fetch)
+    await execute_code(jp_fetch, kernel_id, {'code': "x = 1"})
+    pure = {'code': "x += 1\nprint(x)", 'cache': True}
+
+    payload = await execute_code(jp_fetch, kernel_id, pure)
+    assert not payload['cached']
+    assert payload['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': '2\n'}]
+    # the kernel isn't asked again, although the code isn't that pure
+    payload = await execute_code(jp_fetch, kernel_id, pure)
+    assert payload['cached']
+    assert payload['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': '2\n'}]
+
+    # any other execution may change the state
+    await execute_code(jp_fetch, kernel_id, {'code': "x = 10"})
+    payload = await execute_code(jp_fetch, kernel_id, pure)
+    assert not payload['cached']
+    assert payload['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': '11\n'}]
+
+    # state told by the caller
+    payload = await execute_code(jp_fetch, kernel_id, {**pure, 'state': 'v1'})
+    assert not payload['cached']
+    await execute_code(jp_fetch, kernel_id, {'code': "x = 100"})
+    payload = await execute_code(jp_fetch, kernel_id, {**pure, 'state': 'v1'})
+    assert payload['cached']
+    assert payload['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': '12\n'}]
+
+
+async def test_errors_not_cached(jp_fetch, result_cache):
+    kernel_id = await start_kernel(jp_fetch)
+
+    for _ in range(2):
+        payload = await execute_code(jp_fetch, kernel_id, {'code': "1 / 0", 'cache': True})
+        assert not payload['cached']
+    assert result_cache.stats()['entries'] == 0
@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import nbformat
+import pytest
+from tornado.httpclient import HTTPClientError
+
+from .utils import start_kernel, write_notebook
+
+
+@pytest.fixture
+def notebook(jp_root_dir):
+    path, cell_ids, filepath = write_notebook(jp_root_dir, 'batch.ipynb', [
+        "a = 1\nprint(a)",
+        nbformat.v4.new_markdown_cell("# title"),
+        "print(a + 1)",
+        "raise ValueError('oops')",
+        "print('after error')",
+    ])
+    yield path, cell_ids, filepath.as_posix()
+
+
+def read_cells(real_path):
+    with open(real_path) as f:
+        nb = nbformat.read(f, as_version=nbformat.NO_CONVERT)
+    return nb['cells']
+
+
+async def test_run_cells_block(jp_fetch, notebook):
+    path, cell_ids, real_path = notebook
+    kernel_id = await start_kernel(jp_fetch)
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'runs', method='POST', body=json.dumps({
+        'path': path,
+        'cell_ids': [cell_ids[0], cell_ids[2]],
+        'block': True,
+    }))
+
+    run = json.loads(response.body)
+    assert run['status'] == 'finished'
+    assert [cell['status'] for cell in run['cells']] == ['finished', 'finished']
+    assert run['cells'][1]['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': '2\n'}]
+    cells = read_cells(real_path)
+    assert cells[0]['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': '1\n'}]
+    assert cells[2]['execution_count'] == 2
+
+
+async def test_run_all_stop_on_error(jp_fetch, notebook):
+    path, cell_ids, real_path = notebook
+    kernel_id = await start_kernel(jp_fetch)
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'runs', method='POST', body=json.dumps({
+        'path': path,
+        'cell_ids': 'all',
+    }))
+    run_id = json.loads(response.body)['run_id']
+
+    for _ in range(20):
+        response = await jp_fetch('api', 'kernels', kernel_id, 'runs', run_id, method='GET')
+        run = json.loads(response.body)
+        if run['finished']:
+            break
+        await asyncio.sleep(0.5)
+
+    assert run['status'] == 'error'
+    assert [cell['cell_id'] for cell in run['cells']] == [cell_ids[0], cell_ids[2], cell_ids[3], cell_ids[4]]
+    assert [cell['status'] for cell in run['cells']] == ['finished', 'finished', 'error', 'skipped']
+    assert read_cells(real_path)[3]['outputs'][0]['ename'] == 'ValueError'
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'runs', method='GET')
+    assert [run['run_id'] for run in json.loads(response.body)] == [run_id]
+
+
+async def test_run_unknown_cell(jp_fetch, notebook):
+    path, cell_ids, real_path = notebook
+    kernel_id = await start_kernel(jp_fetch)
+
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('api', 'kernels', kernel_id, 'runs', method='POST', body=json.dumps({
+            'path': path,
+            'cell_ids': ['not-exist'],
+        }))
+    assert e.value.code == 404
+
+
+async def test_run_invalid_cell_ids(jp_fetch, notebook):
+    path, cell_ids, real_path = notebook
+    kernel_id = await start_kernel(jp_fetch)
+
+    for invalid in ('some', cell_ids[0], [cell_ids[0], 1], {'cell_id': cell_ids[0]}, None):
+        with pytest.raises(HTTPClientError) as e:
+            await jp_fetch('api', 'kernels', kernel_id, 'runs', method='POST', body=json.dumps({
+                'path': path,
+                'cell_ids': invalid,
+            }))
+        assert e.value.code == 400
+
+
+async def test_run_methods(jp_fetch):
+    kernel_id = await start_kernel(jp_fetch)
+
+    # runs are not cancelled with DELETE, that is for cells of POST /execute
+    with pytest.raises(HTTPClientError) as e:
+        await jp_fetch('api', 'kernels', kernel_id, 'runs', method='DELETE', params={'path': 'a.ipynb', 'cell_id': 'a'})
+    assert e.value.code == 405
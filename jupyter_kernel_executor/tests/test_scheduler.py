@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import pytest
+from tornado.httpclient import HTTPClientError
+
+from jupyter_kernel_executor.scheduler import KernelScheduler, QueueFull
+from .utils import start_kernel, write_notebook
+
+
+@pytest.fixture
+def scheduler(jp_serverapp):
+    return jp_serverapp.web_app.settings['kernel_executor_scheduler']
+
+
+async def test_priority_then_fifo():
+    scheduler = KernelScheduler(max_queue_depth=3)
+    running = scheduler.enqueue('k')
+    low = scheduler.enqueue('k', document_id='d', cell_id='low')
+    high = scheduler.enqueue('k', priority=1, document_id='d', cell_id='high')
+    later = scheduler.enqueue('k', document_id='d', cell_id='later')
+
+    with pytest.raises(QueueFull):
+        scheduler.enqueue('k')
+    assert scheduler.positions('k') == {('d', 'high'): 1, ('d', 'low'): 2, ('d', 'later'): 3}
+
+    order = []
+
+    async def run(name, ticket):
+        await ticket.wait()
+        order.append(name)
+        ticket.release()
+
+    tasks = [asyncio.create_task(run(name, ticket)) for name, ticket in [
+        ('low', low), ('high', high), ('later', later)
+    ]]
+    await asyncio.sleep(0)
+    assert running.running and order == []
+    running.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ['high', 'low', 'later']
+    assert scheduler.queues == {}
+    assert scheduler.stats()['rejected'] == 1
+
+
+async def test_release_waiting_ticket():
+    scheduler = KernelScheduler()
+    running = scheduler.enqueue('k')
+    waiting = scheduler.enqueue('k')
+
+    waiting.release()
+    assert scheduler.depth('k') == 0
+    running.release()
+    assert scheduler.queues == {}
+
+
+async def test_queue_full_response(jp_fetch, jp_root_dir, scheduler):
+    scheduler.max_queue_depth = 1
+    kernel_id = await start_kernel(jp_fetch)
+    path, (cell_id,), _ = write_notebook(jp_root_dir, 'queued.ipynb', ["print('queued')"])
+
+    async def execute(body):
+        return await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps(body))
+
+    busy = asyncio.create_task(execute({'code': 'import time\ntime.sleep(2)'}))
+    await asyncio.sleep(0.5)
+    await execute({'path': path, 'cell_id': cell_id})
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='GET')
+    assert [record['queue_position'] for record in json.loads(response.body)] == [1]
+    with pytest.raises(HTTPClientError) as e:
+        await execute({'code': "print('refused')"})
+    assert e.value.code == 429
+
+    await busy
@@ -0,0 +1,46 @@
+import json
+
+from .utils import start_kernel
+
+
+code = '''
+import time
+print('hello', flush=True)
+time.sleep(0.5)
+print('world')
+'''
+
+
+async def test_stream_json_lines(jp_fetch):
+    kernel_id = await start_kernel(jp_fetch)
+    chunks = []
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        'code': code,
+        'stream': True,
+    }), streaming_callback=chunks.append)
+
+    assert response.headers['Content-Type'] == 'application/x-ndjson'
+    # first output arrives before the cell finished
+    assert len(chunks) >= 2
+    records = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+    assert records == [
+        {'type': 'output', 'output': {'output_type': 'stream', 'name': 'stdout', 'text': 'hello\n'}},
+        {'type': 'output', 'output': {'output_type': 'stream', 'name': 'stdout', 'text': 'world\n'}},
+        {'type': 'result', 'execution_count': 1, 'status': 'ok'},
+    ]
+
+
+async def test_stream_server_sent_events(jp_fetch):
+    kernel_id = await start_kernel(jp_fetch)
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        'code': "raise ValueError('oops')",
+        'stream': True,
+    }), headers={'Accept': 'text/event-stream'})
+
+    assert response.headers['Content-Type'] == 'text/event-stream'
+    events = response.body.decode().strip().split('\n\n')
+    assert events[0].startswith('event: output\ndata: ')
+    assert json.loads(events[0].split('data: ', 1)[1])['output']['ename'] == 'ValueError'
+    assert events[-1] == 'event: result\ndata: ' + json.dumps({'type': 'result', 'execution_count': 1, 'status': 'error'})
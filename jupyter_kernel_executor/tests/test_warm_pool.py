@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import pytest
+from jupyter_client import MultiKernelManager
+from tornado.httpclient import HTTPClientError
+
+from jupyter_kernel_executor.warm_pool import WarmKernelPool
+from .utils import wait_until
+
+
+@pytest.fixture
+def warm_pool(jp_serverapp):
+    pool = jp_serverapp.web_app.settings['kernel_executor_warm_pool']
+    pool.sizes = {'python3': 1}
+    pool.warmup_code = {'python3': "warmed = 'yes'"}
+    return pool
+
+
+async def wait_ready(warm_pool, kernel_name='python3'):
+    await wait_until(lambda: warm_pool.ready.get(kernel_name))
+    return warm_pool.ready[kernel_name][0]
+
+
+async def execute_on_kernelspec(jp_fetch, body, kernel_name='python3'):
+    response = await jp_fetch(
+        'api', 'kernel_executor', 'kernelspecs', kernel_name, 'execute', method='POST', body=json.dumps(body),
+    )
+    return json.loads(response.body)
+
+
+async def test_warm_kernel(jp_fetch, jp_serverapp, warm_pool):
+    warm_pool.start()
+    warm_kernel_id = await wait_ready(warm_pool)
+
+    payload = await execute_on_kernelspec(jp_fetch, {'code': 'print(warmed)'})
+
+    assert payload['warm'] and payload['kernel_id'] == warm_kernel_id
+    assert payload['outputs'] == [{'output_type': 'stream', 'name': 'stdout', 'text': 'yes\n'}]
+    # culled once done, replaced by another one
+    await wait_until(lambda: warm_kernel_id not in jp_serverapp.kernel_manager)
+    assert await wait_ready(warm_pool) != warm_kernel_id
+    assert warm_pool.stats()['hits'] == 1
+
+
+async def test_recycle_and_keep(jp_fetch, jp_serverapp, warm_pool):
+    warm_pool.start()
+    warm_kernel_id = await wait_ready(warm_pool)
+
+    await execute_on_kernelspec(jp_fetch, {'code': 'x = 1', 'after': 'recycle'})
+    await wait_until(lambda: warm_pool.ready['python3'] == [warm_kernel_id])
+
+    payload = await execute_on_kernelspec(jp_fetch, {'code': 'print(x)', 'after': 'keep'})
+    assert payload['kernel_id'] == warm_kernel_id
+    assert payload['outputs'][0]['text'] == '1\n'
+    assert warm_kernel_id in jp_serverapp.kernel_manager
+    assert warm_kernel_id not in warm_pool.ready['python3']
+
+
+async def test_cold_start(jp_fetch, jp_serverapp, warm_pool):
+    warm_pool.sizes = {}
+
+    payload = await execute_on_kernelspec(jp_fetch, {'code': '1 + 1'})
+    assert not payload['warm']
+    assert payload['outputs'][0]['data'] == {'text/plain': '2'}
+    await wait_until(lambda: payload['kernel_id'] not in jp_serverapp.kernel_manager)
+
+    with pytest.raises(HTTPClientError) as e:
+        await execute_on_kernelspec(jp_fetch, {'code': '1'}, kernel_name='nope')
+    assert e.value.code == 404
+
+
+async def test_kernelspec_execute_methods(jp_fetch):
+    for method in ('GET', 'DELETE'):
+        with pytest.raises(HTTPClientError) as e:
+            await jp_fetch('api', 'kernel_executor', 'kernelspecs', 'python3', 'execute', method=method)
+        assert e.value.code == 405
+
+
+async def test_warmup_keeps_event_loop_running():
+    # a sync kernel manager's kernels make blocking clients
+    kernel_manager = MultiKernelManager()
+    pool = WarmKernelPool(kernel_manager=kernel_manager, warmup_code={'python3': 'import time\ntime.sleep(1)'})
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(None)
+            await asyncio.sleep(0.05)
+
+    ticker = asyncio.ensure_future(tick())
+    try:
+        kernel_id = await pool.start_kernel('python3')
+    finally:
+        ticker.cancel()
+    try:
+        assert len(ticks) > 10
+    finally:
+        kernel_manager.shutdown_kernel(kernel_id, now=True)
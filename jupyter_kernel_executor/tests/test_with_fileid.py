@@ -69,8 +69,35 @@ async def test_move_file_when_execute(jp_fetch, ipynb, is_file_id_manager):
     # wait for finished
     await wait_for_finished(jp_fetch, kernel_id, ipynb_path, cell_id)
 
-    outputs = [{'name': 'stdout', 'output_type': 'stream', 'text': 'hello\n'},
-               {'name': 'stdout', 'output_type': 'stream', 'text': 'world\n'}]
+    # consecutive stream messages are merged
+    outputs = [{'name': 'stdout', 'output_type': 'stream', 'text': 'hello\nworld\n'}]
+    await assert_ipynb_cell_outputs(real_path, cell_id, outputs)
+
+
+async def test_move_file_to_other_directory_when_execute(jp_fetch, ipynb, is_file_id_manager):
+    if not is_file_id_manager:
+        return pytest.skip('no file id manager, cannot process it')
+
+    ipynb_path, cell_id, real_path = ipynb
+    kernel_response = await jp_fetch('api', 'kernels', method='POST', body=json.dumps({
+        'name': 'python3',
+        'path': ipynb_path
+    }))
+    kernel_id = json.loads(kernel_response.body)['id']
+
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='POST', body=json.dumps({
+        "path": ipynb_path,
+        "cell_id": cell_id,
+    }))
+    assert response.code == 200
+    # the directory it moves to is not watched
+    elsewhere = Path(real_path).parent / 'elsewhere'
+    elsewhere.mkdir()
+    real_path = Path(real_path).rename(elsewhere / 'moved.ipynb').as_posix()
+
+    await wait_for_finished(jp_fetch, kernel_id, ipynb_path, cell_id)
+
+    outputs = [{'name': 'stdout', 'output_type': 'stream', 'text': 'hello\nworld\n'}]
     await assert_ipynb_cell_outputs(real_path, cell_id, outputs)
 
 
@@ -102,8 +129,8 @@ async def test_modify_file_when_execute(jp_fetch, ipynb, is_file_id_manager):
     # wait for finished
     await wait_for_finished(jp_fetch, kernel_id, ipynb_path, cell_id)
 
-    outputs = [{'name': 'stdout', 'output_type': 'stream', 'text': 'hello\n'},
-               {'name': 'stdout', 'output_type': 'stream', 'text': 'world\n'}]
+    # consecutive stream messages are merged
+    outputs = [{'name': 'stdout', 'output_type': 'stream', 'text': 'hello\nworld\n'}]
     await assert_ipynb_cell_outputs(real_path, cell_id, outputs)
 
 
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from jupyter_kernel_executor.writer import WriteBehindBuffer
+
+
+class FakeDocument:
+    def __init__(self, fail=0):
+        self.saves = []
+        self.fail = fail
+
+    async def save(self, document_id, updates):
+        if self.fail:
+            self.fail -= 1
+            raise IOError('disk full')
+        self.saves.append((document_id, dict(updates)))
+
+
+def result(text):
+    return {'outputs': [{'output_type': 'stream', 'name': 'stdout', 'text': text}], 'execution_count': 1}
+
+
+async def test_coalesce_updates():
+    buffer = WriteBehindBuffer(flush_delay=0.1)
+    document = FakeDocument()
+
+    buffer.put('a.ipynb', 'cell-1', result('1'), document.save)
+    buffer.put('a.ipynb', 'cell-1', result('1\n2'), document.save)
+    saved = buffer.put('a.ipynb', 'cell-2', result('3'), document.save)
+    await saved
+
+    assert document.saves == [('a.ipynb', {'cell-1': result('1\n2'), 'cell-2': result('3')})]
+    assert buffer.stats()['coalesced'] == 1
+
+
+async def test_flush_at_max_pending():
+    buffer = WriteBehindBuffer(flush_delay=60, max_pending=2)
+    document = FakeDocument()
+
+    buffer.put('a.ipynb', 'cell-1', result('1'), document.save)
+    saved = buffer.put('a.ipynb', 'cell-2', result('2'), document.save)
+    await asyncio.wait_for(saved, 1)
+
+    assert len(document.saves) == 1
+
+
+async def test_keep_results_when_save_failed():
+    buffer = WriteBehindBuffer(flush_delay=60, retry_delay=0.1)
+    document = FakeDocument(fail=1)
+
+    saved = buffer.put('a.ipynb', 'cell-1', result('1'), document.save, flush_now=True)
+    with pytest.raises(IOError):
+        await saved
+    assert buffer.depth('a.ipynb') == 1
+
+    await asyncio.sleep(0.3)
+    assert document.saves == [('a.ipynb', {'cell-1': result('1')})]
+    assert buffer.stats()['failures'] == 1
+
+
+async def test_drop_results_after_max_attempts():
+    buffer = WriteBehindBuffer(flush_delay=60, retry_delay=0.1, retry_backoff=2, max_attempts=3)
+    document = FakeDocument(fail=10)
+
+    saved = buffer.put('a.ipynb', 'cell-1', result('1'), document.save, flush_now=True)
+    with pytest.raises(IOError):
+        await saved
+    # retried after 0.1 then 0.2 seconds, then dropped
+    await asyncio.sleep(0.2)
+    assert buffer.stats()['failures'] == 2
+    await asyncio.sleep(0.3)
+    assert buffer.stats()['failures'] == 3
+    assert buffer.stats()['dropped'] == 1
+    assert buffer.depth('a.ipynb') == 0
+    assert 'a.ipynb' not in buffer.pending
+    assert document.saves == []
+
+
+async def test_flush_on_close():
+    buffer = WriteBehindBuffer(flush_delay=60)
+    document = FakeDocument()
+
+    buffer.put('a.ipynb', 'cell-1', result('1'), document.save)
+    buffer.put('b.ipynb', 'cell-1', result('2'), document.save)
+    await buffer.close()
+
+    assert sorted(document.saves) == [('a.ipynb', {'cell-1': result('1')}), ('b.ipynb', {'cell-1': result('2')})]
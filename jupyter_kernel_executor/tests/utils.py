@@ -10,6 +10,31 @@ _here = Path(os.path.abspath(os.path.dirname(__file__)))
 INTERVAL = 1
 
 
+async def start_kernel(jp_fetch):
+    kernel_response = await jp_fetch('api', 'kernels', method='POST', body=json.dumps({
+        'name': 'python3',
+    }))
+    return json.loads(kernel_response.body)['id']
+
+
+def write_notebook(root_dir, name, cells):
+    """write a notebook of cells, given as nbformat cells or sources of code cells, return its path, cell ids and file"""
+    nb = nbformat.v4.new_notebook()
+    nb['cells'] = [nbformat.v4.new_code_cell(cell) if isinstance(cell, str) else cell for cell in cells]
+    filepath = Path(root_dir) / name
+    with open(filepath, 'w') as f:
+        nbformat.write(nb, f)
+    return name, [cell['id'] for cell in nb['cells']], filepath
+
+
+async def wait_until(condition, timeout=10):
+    for _ in range(int(timeout / 0.1)):
+        if condition():
+            return
+        await asyncio.sleep(0.1)
+    assert condition()
+
+
 async def assert_ipynb_cell_outputs(real_path, cell_id, outputs):
     cell_output = None
     for _ in range(5):
@@ -31,17 +56,13 @@ async def assert_ipynb_cell_outputs(real_path, cell_id, outputs):
 
 
 async def wait_for_finished(jp_fetch, kernel_id, path, cell_id):
-    body = {
+    response = await jp_fetch('api', 'kernels', kernel_id, 'execute', 'wait', method='GET', params={
         "path": path,
         "cell_id": cell_id,
-    }
-    for _ in range(10):
-        response = await jp_fetch('api', 'kernels', kernel_id, 'execute', method='GET')
-        payload = json.loads(response.body)
-        if body not in payload:
-            break
-        await asyncio.sleep(INTERVAL)
-    else:
+        "timeout": 10 * INTERVAL,
+    })
+    payload = json.loads(response.body)
+    if not payload['finished']:
         raise TimeoutError('execute code timeout')
 
 
@@ -0,0 +1,151 @@
+import asyncio
+from typing import Dict, List, Set, Tuple
+
+from jupyter_server.utils import ensure_async
+from traitlets import Dict as DictTrait, Enum, Float, Integer, Unicode
+from traitlets.config import LoggingConfigurable
+
+from jupyter_kernel_executor.pool import async_client
+
+AFTER_CULL = 'cull'
+AFTER_RECYCLE = 'recycle'
+AFTER_KEEP = 'keep'
+
+
+class WarmKernelPool(LoggingConfigurable):
+    """
+    Kernels started and warmed up ahead of requests, per kernelspec
+
+    A checked out kernel is replaced in the background, so starting a kernel leaves the request path.
+    Warm kernels are regular kernels of the kernel manager, keep the server's idle culler away from them.
+    """
+
+    sizes = DictTrait(
+        value_trait=Integer(), default_value={}, config=True,
+        help="kernelspec name -> number of warm kernels kept ready, e.g. {'python3': 2}"
+    )
+    warmup_code = DictTrait(
+        value_trait=Unicode(), default_value={}, config=True,
+        help="kernelspec name -> code executed on its kernels once started, e.g. heavy imports"
+    )
+    warmup_timeout = Float(
+        120, config=True,
+        help="Seconds for a kernel to be ready and run its warmup code"
+    )
+    after = Enum(
+        [AFTER_CULL, AFTER_RECYCLE, AFTER_KEEP], AFTER_CULL, config=True,
+        help="""What becomes of a kernel once its execution is done, unless the request tells.
+        cull: shut it down
+        recycle: give it back to the pool as it is, its state is seen by next executions
+        keep: leave it to the caller
+        """
+    )
+
+    def __init__(self, kernel_manager=None, **kwargs):
+        super().__init__(**kwargs)
+        self.kernel_manager = kernel_manager
+        self.ready: Dict[str, List[str]] = dict()
+        self.starting: Dict[str, Set[asyncio.Task]] = dict()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def start(self):
+        for kernel_name in self.sizes:
+            self.fill(kernel_name)
+
+    def fill(self, kernel_name):
+        ready = self.ready.setdefault(kernel_name, [])
+        starting = self.starting.setdefault(kernel_name, set())
+        for _ in range(self.sizes.get(kernel_name, 0) - len(ready) - len(starting)):
+            task = asyncio.ensure_future(self.start_warm_kernel(kernel_name))
+            starting.add(task)
+            task.add_done_callback(starting.discard)
+
+    async def start_warm_kernel(self, kernel_name):
+        try:
+            kernel_id = await self.start_kernel(kernel_name)
+        except Exception as e:
+            # not retried until next checkout, a broken kernelspec would loop
+            self.failures += 1
+            self.log.error(f'Exception when warming up a {kernel_name} kernel: {e}')
+            return
+        self.ready.setdefault(kernel_name, []).append(kernel_id)
+
+    async def start_kernel(self, kernel_name) -> str:
+        kernel_id = await ensure_async(self.kernel_manager.start_kernel(kernel_name=kernel_name))
+        code = self.warmup_code.get(kernel_name)
+        if not code:
+            return kernel_id
+        try:
+            # a blocking client of a sync kernel manager would stall the server while warming up
+            client = async_client(self.kernel_manager.get_kernel(kernel_id))
+            client.start_channels()
+            try:
+                await client.wait_for_ready(timeout=self.warmup_timeout)
+                reply = await client.execute_interactive(
+                    code, timeout=self.warmup_timeout, output_hook=lambda msg: None, allow_stdin=False,
+                )
+            finally:
+                client.stop_channels()
+            if reply['content']['status'] != 'ok':
+                raise RuntimeError(f"warmup code failed: {reply['content'].get('evalue')}")
+        except BaseException:
+            await ensure_async(self.kernel_manager.shutdown_kernel(kernel_id))
+            raise
+        return kernel_id
+
+    def is_alive(self, kernel_id):
+        return kernel_id in self.kernel_manager
+
+    async def checkout(self, kernel_name, after=None) -> Tuple[str, bool]:
+        """
+        a kernel of kernelspec kernel_name and whether it was warm, a cold one is started when none is ready
+
+        unless it's going to be recycled, another kernel is warmed up in its place right away
+        """
+        replace = (after or self.after) != AFTER_RECYCLE
+        ready = self.ready.get(kernel_name, [])
+        while ready:
+            kernel_id = ready.pop(0)
+            if self.is_alive(kernel_id):
+                self.hits += 1
+                if replace:
+                    self.fill(kernel_name)
+                return kernel_id, True
+        self.misses += 1
+        self.fill(kernel_name)
+        return await self.start_kernel(kernel_name), False
+
+    async def checkin(self, kernel_name, kernel_id, after=None):
+        after = after or self.after
+        if after == AFTER_KEEP:
+            return
+        alive = self.is_alive(kernel_id)
+        ready = self.ready.setdefault(kernel_name, [])
+        room = self.sizes.get(kernel_name, 0) - len(ready) - len(self.starting.get(kernel_name, ()))
+        if after == AFTER_RECYCLE and alive and room > 0:
+            ready.append(kernel_id)
+            return
+        if alive:
+            await ensure_async(self.kernel_manager.shutdown_kernel(kernel_id))
+        self.fill(kernel_name)
+
+    async def close(self):
+        for starting in self.starting.values():
+            for task in list(starting):
+                task.cancel()
+        for ready in self.ready.values():
+            for kernel_id in ready:
+                if self.is_alive(kernel_id):
+                    await ensure_async(self.kernel_manager.shutdown_kernel(kernel_id))
+            ready.clear()
+
+    def stats(self):
+        return {
+            "ready": {kernel_name: len(ready) for kernel_name, ready in self.ready.items()},
+            "starting": {kernel_name: len(starting) for kernel_name, starting in self.starting.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+        }
@@ -0,0 +1,219 @@
+import asyncio
+from typing import Dict, List, Optional, Callable, Awaitable, Any
+
+from jupyter_server.utils import ensure_async
+from traitlets import Bool, Float, Integer
+from traitlets.config import LoggingConfigurable
+
+from jupyter_kernel_executor import metrics
+from jupyter_kernel_executor.notebook_patch import PatchError, local_os_path, patch_notebook
+
+
+async def save_results(contents_manager, path, updates: Dict[str, Dict[str, Any]], blob_store, patch=True) -> bool:
+    """
+    write {cell_id: result} into the notebook at path, return whether it changed
+
+    with patch, a notebook on local disk has only the cells updated rewritten(see notebook_patch),
+    others go through the contents manager
+    """
+    os_path = local_os_path(contents_manager, path) if patch else None
+    if os_path:
+        try:
+            # reading and writing the file, off the event loop as the async contents manager does
+            return await asyncio.get_running_loop().run_in_executor(
+                None, patch_notebook, os_path, updates, blob_store,
+            )
+        except (PatchError, UnicodeDecodeError, OSError) as e:
+            contents_manager.log.debug(f'cannot patch {path}, saving it through the contents manager: {e}')
+    model = await ensure_async(contents_manager.get(path, content=True, type='notebook'))
+    nb = model['content']
+    updated = False
+    for cell in nb['cells']:
+        result = updates.get(cell['id'])
+        if not result:
+            continue
+        outputs = blob_store.offload(result['outputs'])
+        if outputs != cell["outputs"]:
+            cell["outputs"] = outputs
+            updated = True
+        if result['execution_count'] and cell['execution_count'] != int(result['execution_count']):
+            cell['execution_count'] = int(result['execution_count'])
+            updated = True
+    if updated:
+        await ensure_async(contents_manager.save(model, path))
+    return updated
+
+
+class PendingWrite:
+    def __init__(self):
+        # cell_id -> result, newer result of a cell replaces the older one
+        self.updates: Dict[str, Dict[str, Any]] = dict()
+        self.waiters: List[asyncio.Future] = []
+        self.save: Optional[Callable[[str, Dict[str, Dict[str, Any]]], Awaitable[None]]] = None
+        self.task: Optional[asyncio.Task] = None
+        self.flush_now = asyncio.Event()
+        # failed saves in a row
+        self.attempts = 0
+
+
+class WriteBehindBuffer(LoggingConfigurable):
+    """
+    Gather cell results per document and save them together
+
+    A document is saved once per `flush_delay` window instead of once per result,
+    right away when `max_pending` cells are waiting or a writer asks for it, and on shutdown.
+    When a save fails, its results are kept and retried after `retry_delay`, growing by `retry_backoff` after every
+    failure up to `max_retry_delay`. After `max_attempts` failures in a row they are dropped, journaled ones are
+    still replayed on next start.
+    """
+
+    flush_delay = Float(
+        0.5, config=True,
+        help="Seconds to gather cell results of a document before saving them in one write"
+    )
+    max_pending = Integer(
+        50, config=True,
+        help="Save a document right away once this many of its cells are waiting to be written"
+    )
+    retry_delay = Float(
+        5, config=True,
+        help="Seconds to wait before retrying a failed save"
+    )
+    retry_backoff = Float(
+        2, config=True,
+        help="Factor the delay before retrying grows by after every failed save"
+    )
+    max_retry_delay = Float(
+        300, config=True,
+        help="Most seconds to wait before retrying a failed save"
+    )
+    max_attempts = Integer(
+        10, config=True,
+        help="Failed saves in a row before the results of a document are dropped, 0 to retry until saved"
+    )
+    patch_local = Bool(
+        False, config=True,
+        help="Rewrite only the updated cells of notebooks on local disk instead of saving them through the contents "
+             "manager, which validates and serializes every cell. Notebooks are not signed again as trusted then"
+    )
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.pending: Dict[str, PendingWrite] = dict()
+        self.flushes = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def put(self, document_id, cell_id, result, save, flush_now=False) -> asyncio.Future:
+        """
+        buffer result of cell, return a future resolved when it's saved
+
+        save(document_id, updates) writes {cell_id: result} into the document
+        """
+        return self.put_many(document_id, {cell_id: result}, save, flush_now)
+
+    def put_many(self, document_id, updates, save, flush_now=False) -> asyncio.Future:
+        """buffer {cell_id: result} of a document, return a future resolved when they are saved"""
+        pending = self.pending.setdefault(document_id, PendingWrite())
+        for cell_id, result in updates.items():
+            if cell_id in pending.updates:
+                self.coalesced += 1
+            pending.updates[cell_id] = result
+        pending.save = save
+        waiter = asyncio.get_running_loop().create_future()
+        # writers may not wait for the save, its failure is logged anyway
+        waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+        pending.waiters.append(waiter)
+
+        if flush_now or len(pending.updates) >= self.max_pending:
+            pending.flush_now.set()
+        if not pending.task or pending.task.done():
+            pending.task = asyncio.create_task(self.run(document_id, pending))
+        return waiter
+
+    async def run(self, document_id, pending: PendingWrite):
+        delay = self.flush_delay
+        while pending.updates:
+            try:
+                await asyncio.wait_for(pending.flush_now.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            pending.flush_now.clear()
+            if await self.flush_pending(document_id, pending):
+                delay = self.flush_delay
+            else:
+                delay = min(self.retry_delay * self.retry_backoff ** (pending.attempts - 1), self.max_retry_delay)
+        if self.pending.get(document_id) is pending:
+            del self.pending[document_id]
+
+    async def flush_pending(self, document_id, pending: PendingWrite) -> bool:
+        updates, waiters = pending.updates, pending.waiters
+        pending.updates, pending.waiters = dict(), []
+        if not updates:
+            return True
+        try:
+            await pending.save(document_id, updates)
+        except asyncio.CancelledError:
+            self.restore(pending, updates, waiters)
+            raise
+        except Exception as e:
+            self.failures += 1
+            pending.attempts += 1
+            metrics.count_error('write')
+            if self.max_attempts and pending.attempts >= self.max_attempts:
+                self.dropped += len(updates)
+                self.log.error(
+                    f'Exception when writing {len(updates)} cell(s) to {document_id}, dropped after '
+                    f'{pending.attempts} attempts'
+                )
+                pending.attempts = 0
+            else:
+                self.log.error(f'Exception when writing {len(updates)} cell(s) to {document_id}, will retry')
+                self.restore(pending, updates, [])
+            self.log.exception(e)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return False
+
+        pending.attempts = 0
+        self.flushes += 1
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        return True
+
+    def restore(self, pending: PendingWrite, updates, waiters):
+        # keep results for next flush, unless newer ones arrived meanwhile
+        for cell_id, result in updates.items():
+            pending.updates.setdefault(cell_id, result)
+        pending.waiters.extend(waiters)
+
+    async def close(self):
+        """save everything still buffered, one attempt per document"""
+        for document_id, pending in list(self.pending.items()):
+            if pending.task:
+                pending.task.cancel()
+                try:
+                    await pending.task
+                except asyncio.CancelledError:
+                    pass
+            await self.flush_pending(document_id, pending)
+            for waiter in pending.waiters:
+                waiter.cancel()
+        self.pending.clear()
+
+    def depth(self, document_id):
+        pending = self.pending.get(document_id)
+        return len(pending.updates) if pending else 0
+
+    def stats(self):
+        return {
+            "documents": len(self.pending),
+            "pending": sum(len(pending.updates) for pending in self.pending.values()),
+            "flushes": self.flushes,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }